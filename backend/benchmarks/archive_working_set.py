@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""Benchmark: working-set size and query latency before/after archiving
+
+Seeds a scratch database with messages spread over several months, then
+measures the hot collection's data + index size and the latency of the
+queries routes/whatsapp_routes.py issues, before and after running the
+MessageArchiver. Prints a JSON report.
+
+    MONGODB_URI=mongodb://localhost:27017 python benchmarks/archive_working_set.py \\
+        --messages 200000 --months 24 --hot-days 90
+
+The scratch database (default `madio_erp_bench_archive`) is dropped first.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.archive import MessageArchiver, HOT_COLLECTION  # noqa: E402
+from database.migrations import MigrationRunner  # noqa: E402
+
+
+async def seed(db, messages: int, months: int, parties: int) -> None:
+    """Insert synthetic messages spread evenly over `months`"""
+    now = datetime.now()
+    span = timedelta(days=30 * months).total_seconds()
+    batch = []
+    for i in range(messages):
+        created_at = now - timedelta(seconds=random.uniform(0, span))
+        party = f"91987{random.randrange(parties):07d}"
+        batch.append({
+            "whatsapp_message_id": f"wamid.bench.{i}",
+            "other_party": party,
+            "from_phone": party,
+            "message_type": "text",
+            "message_body": "Site update: slab casting finished, photos to follow " * 3,
+            "direction": random.choice(["inbound", "outbound"]),
+            "status": "received",
+            "read": True,
+            "created_at": created_at
+        })
+        if len(batch) == 5000:
+            await db[HOT_COLLECTION].insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        await db[HOT_COLLECTION].insert_many(batch, ordered=False)
+
+
+async def working_set(db) -> dict:
+    """Hot collection data and index sizes in MB"""
+    stats = await db.command("collStats", HOT_COLLECTION)
+    return {
+        "documents": stats["count"],
+        "data_mb": round(stats["size"] / 1e6, 1),
+        "index_mb": round(stats["totalIndexSize"] / 1e6, 1),
+        "working_set_mb": round((stats["size"] + stats["totalIndexSize"]) / 1e6, 1)
+    }
+
+
+async def timed(coro_factory, rounds: int) -> dict:
+    """p50/p95 latency in ms for `rounds` runs"""
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        await coro_factory()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "p50_ms": round(statistics.median(samples), 2),
+        "p95_ms": round(samples[int(len(samples) * 0.95) - 1], 2)
+    }
+
+
+async def query_latency(db, archiver: MessageArchiver, parties: int, rounds: int) -> dict:
+    """Latency of the first conversation page and the 30-day stats breakdown"""
+    def party():
+        return f"91987{random.randrange(parties):07d}"
+
+    since = datetime.now() - timedelta(days=30)
+    return {
+        "conversation_page": await timed(
+            lambda: archiver.find_conversation_page(db, {"other_party": party()}, limit=50),
+            rounds
+        ),
+        "stats_30d": await timed(
+            lambda: db[HOT_COLLECTION].aggregate([
+                {"$match": {"created_at": {"$gte": since}}},
+                {"$group": {"_id": {"direction": "$direction", "type": "$message_type"}, "count": {"$sum": 1}}}
+            ]).to_list(None),
+            max(1, rounds // 10)
+        )
+    }
+
+
+async def main(args) -> dict:
+    client = AsyncIOMotorClient(os.getenv("MONGODB_URI", "mongodb://localhost:27017"))
+    await client.drop_database(args.database)
+    db = client[args.database]
+
+    await MigrationRunner(db).run()
+    await seed(db, args.messages, args.months, args.parties)
+
+    archiver = MessageArchiver(hot_window_days=args.hot_days, batch_size=5000, batch_pause=0)
+    report = {
+        "params": vars(args),
+        "before": {
+            "working_set": await working_set(db),
+            "latency": await query_latency(db, archiver, args.parties, args.rounds)
+        }
+    }
+
+    start = time.perf_counter()
+    moved = await archiver.archive_once(db)
+    report["archive_run"] = {"moved": moved, "seconds": round(time.perf_counter() - start, 1)}
+
+    report["after"] = {
+        "working_set": await working_set(db),
+        "latency": await query_latency(db, archiver, args.parties, args.rounds)
+    }
+
+    if not args.keep:
+        await client.drop_database(args.database)
+    client.close()
+    return report
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Archive working-set benchmark")
+    parser.add_argument("--database", default="madio_erp_bench_archive")
+    parser.add_argument("--messages", type=int, default=200000)
+    parser.add_argument("--months", type=int, default=24)
+    parser.add_argument("--parties", type=int, default=500)
+    parser.add_argument("--hot-days", type=int, default=90)
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--keep", action="store_true", help="keep the scratch database")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    print(json.dumps(asyncio.run(main(parse_args())), indent=2, default=str))
@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+"""Microbenchmarks for request hot paths, with stored baselines
+
+Times pure-Python code that runs on every request (token verification,
+webhook parsing and redelivery checks, message formatting, log
+formatting, middleware) in the style of pytest-benchmark: calibrated
+loops, several rounds with GC disabled, min/median/mean/stddev per call.
+Each benchmark also runs once more under tracemalloc for its peak
+allocation per call and what it leaves allocated.
+
+    # Record a baseline (on the machine that will run the comparisons)
+    python benchmarks/hot_paths.py run --save main
+
+    # Fail (exit 1) if any hot path got >15% slower or allocates >15% more
+    python benchmarks/hot_paths.py compare main --threshold 0.15
+
+Baselines are JSON files in benchmarks/baselines/. `reference.json` is
+a committed reference run (its machine is recorded in the file); timings
+only compare meaningfully on the same hardware, so save your own before
+gating on time. `rate_limiter` needs a Redis at REDIS_HOST/REDIS_PORT
+and is skipped when there is none.
+"""
+import argparse
+import fnmatch
+import gc
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from bson import ObjectId
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("JWT_SECRET_KEY", "benchmark-secret")
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+
+BENCHMARKS: Dict[str, Callable[[], Callable[[], Any]]] = {}
+
+
+class Skip(Exception):
+    """Benchmark can't run in this environment"""
+
+
+def benchmark(name: str):
+    """Register a setup function returning the zero-argument callable to time"""
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+def run_coroutine(coro) -> Any:
+    """Drive a coroutine that never suspends, without an event loop
+
+    Keeps loop scheduling overhead out of the measurement; fails loudly if
+    the code under test starts awaiting real I/O.
+    """
+    try:
+        coro.send(None)
+    except StopIteration as done:
+        return done.value
+    coro.close()
+    raise RuntimeError("Benchmarked coroutine suspended; it must not await I/O")
+
+
+# Hot paths
+
+@benchmark("jwt.decode")
+def bench_jwt_decode():
+    from jose import jwt
+    from auth.jwt_handler import ALGORITHM, SECRET_KEY
+
+    token = _access_token()
+    return lambda: jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+
+
+@benchmark("auth.verify_token")
+def bench_verify_token():
+    from auth.jwt_handler import verify_token
+
+    token = _access_token()
+    return lambda: run_coroutine(verify_token(token))
+
+
+@benchmark("webhook.process_incoming_message")
+def bench_process_incoming_message():
+    from services.whatsapp_service import WhatsAppService
+
+    service = WhatsAppService()
+    payload = {
+        "object": "whatsapp_business_account",
+        "entry": [{
+            "id": "102290129340398",
+            "changes": [{
+                "field": "messages",
+                "value": {
+                    "messaging_product": "whatsapp",
+                    "metadata": {"display_phone_number": "15550783881", "phone_number_id": "106540352242922"},
+                    "contacts": [{"profile": {"name": "Site Engineer"}, "wa_id": "919876543210"}],
+                    "messages": [{
+                        "from": "919876543210",
+                        "id": "wamid.HBgMOTE5ODc2NTQzMjEwFQIAEhggMzVGQjM1",
+                        "timestamp": str(int(time.time())),
+                        "type": "text",
+                        "text": {"body": "Slab casting finished, photos to follow"}
+                    }]
+                }
+            }]
+        }]
+    }
+    return lambda: run_coroutine(service.process_incoming_message(payload))
+
+
+@benchmark("webhook.dedup_redelivery")
+def bench_webhook_dedup():
+    from services.webhook_dedup import WebhookDeduplicator, webhook_message_id
+
+    # A redelivery answered by the in-process cache, before any Redis call
+    deduplicator = WebhookDeduplicator()
+    payload = {"entry": [{"changes": [{"value": {"messages": [{"id": "wamid.HBgMOTE5ODc2NTQzMjEwFQIAEhggMzVGQjM1"}]}}]}]}
+    deduplicator._remember(webhook_message_id(payload))
+    return lambda: run_coroutine(deduplicator.claim(webhook_message_id(payload)))
+
+
+@benchmark("conversation.format_messages")
+def bench_format_messages():
+    from routes.whatsapp_routes import _format_messages
+
+    now = datetime.now()
+    messages = [{
+        "_id": ObjectId(),
+        "message_type": "image" if i % 10 == 0 else "text",
+        "message_body": "Slab casting finished, photos to follow",
+        "direction": "inbound" if i % 2 else "outbound",
+        "status": "delivered",
+        "created_at": now - timedelta(minutes=i),
+        "media_url": "https://contoso.sharepoint.com/media/photo.jpg" if i % 10 == 0 else None,
+        "from_user_id": None if i % 2 else "u1"
+    } for i in range(1000)]
+    return lambda: _format_messages(messages)
+
+
+@benchmark("logging.add_fields")
+def bench_add_fields():
+    from utils.logging_config import CustomJsonFormatter
+
+    formatter = CustomJsonFormatter('%(timestamp)s %(level)s %(name)s %(message)s')
+    record = logging.LogRecord("routes.whatsapp_routes", logging.INFO, __file__, 1, "Message sent", None, None)
+    record.user_id = "u1"
+    record.request_id = "6f1c2b7e"
+
+    def add_fields():
+        formatter.add_fields({}, record, {})
+    return add_fields
+
+
+@benchmark("middleware.metrics")
+def bench_metrics_middleware():
+    from monitoring.metrics import metrics_middleware
+
+    request, call_next = _request_and_handler()
+    return lambda: run_coroutine(metrics_middleware(request, call_next))
+
+
+@benchmark("middleware.rate_limiter")
+def bench_rate_limiter():
+    from middleware.rate_limiter import RateLimiter, get_redis
+
+    try:
+        get_redis().ping()
+    except Exception as e:
+        raise Skip(f"no Redis: {e}")
+
+    # Window long enough that the counter never trips the limit mid-run
+    limiter = RateLimiter(requests=10 ** 9, window=3600)
+    request, call_next = _request_and_handler()
+    return lambda: run_coroutine(limiter(request, call_next))
+
+
+def _access_token() -> str:
+    from jose import jwt
+    from auth.jwt_handler import ALGORITHM, SECRET_KEY
+
+    return jwt.encode({
+        "sub": "65f1c0ffee0000000000beef",
+        "role": "staff",
+        "type": "access",
+        "exp": datetime.utcnow() + timedelta(days=1)
+    }, SECRET_KEY, algorithm=ALGORITHM)
+
+
+def _request_and_handler():
+    from starlette.requests import Request
+    from starlette.responses import Response
+
+    request = Request({
+        "type": "http",
+        "method": "GET",
+        "path": "/api/whatsapp/conversations",
+        "raw_path": b"/api/whatsapp/conversations",
+        "query_string": b"",
+        "headers": [(b"host", b"localhost"), (b"authorization", b"Bearer x")],
+        "client": ("10.0.0.7", 52000),
+        "server": ("localhost", 8000),
+        "scheme": "http",
+        "root_path": ""
+    })
+
+    async def call_next(request):
+        return Response(b"[]", media_type="application/json")
+    return request, call_next
+
+
+# Measurement
+
+def _time_loops(func: Callable[[], Any], loops: int) -> float:
+    start = time.perf_counter()
+    for _ in range(loops):
+        func()
+    return time.perf_counter() - start
+
+
+def measure(func: Callable[[], Any], rounds: int, min_round_time: float, alloc_calls: int) -> Dict[str, Any]:
+    """Timing statistics (microseconds per call) and tracemalloc allocation figures"""
+    func()  # warm caches and lazy imports
+
+    # Calibrate loops per round so each round lasts at least min_round_time
+    loops = 1
+    while _time_loops(func, loops) < min_round_time:
+        loops *= 2
+
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        samples = [_time_loops(func, loops) / loops * 1e6 for _ in range(rounds)]
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+    # Allocation profile; separate from timing because tracing is slow
+    gc.collect()
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        start_bytes = tracemalloc.get_traced_memory()[0]
+        func()
+        peak_bytes = tracemalloc.get_traced_memory()[1] - start_bytes
+
+        before = tracemalloc.take_snapshot()
+        for _ in range(alloc_calls):
+            func()
+        gc.collect()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    diff = [stat for stat in after.compare_to(before, "filename") if stat.traceback[0].filename != tracemalloc.__file__]
+    retained_bytes = sum(stat.size_diff for stat in diff)
+    retained_blocks = sum(stat.count_diff for stat in diff)
+
+    return {
+        "loops": loops,
+        "rounds": rounds,
+        "min_us": round(min(samples), 3),
+        "median_us": round(statistics.median(samples), 3),
+        "mean_us": round(statistics.fmean(samples), 3),
+        "stddev_us": round(statistics.stdev(samples), 3) if len(samples) > 1 else 0.0,
+        "ops_per_sec": round(1e6 / statistics.median(samples), 1),
+        "alloc_peak_bytes": peak_bytes,
+        "retained_bytes_per_call": round(retained_bytes / alloc_calls, 1),
+        "retained_blocks_per_call": round(retained_blocks / alloc_calls, 3)
+    }
+
+
+def run_all(pattern: str, rounds: int, min_round_time: float, alloc_calls: int) -> Dict[str, Any]:
+    # Keep log output from benchmarked code out of the report
+    logging.disable(logging.CRITICAL)
+    results: Dict[str, Any] = {}
+    for name, setup in BENCHMARKS.items():
+        if not fnmatch.fnmatch(name, pattern):
+            continue
+        try:
+            func = setup()
+        except Skip as e:
+            results[name] = {"skipped": str(e)}
+            continue
+        results[name] = measure(func, rounds, min_round_time, alloc_calls)
+    return {
+        "machine": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "processor": platform.processor() or platform.machine(),
+            "cpu_count": os.cpu_count()
+        },
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "benchmarks": results
+    }
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float, alloc_threshold: float) -> List[Dict[str, Any]]:
+    """Per-benchmark change against the baseline; `regressed` when beyond a threshold"""
+    rows = []
+    for name, now in current["benchmarks"].items():
+        then = baseline["benchmarks"].get(name)
+        if not then or "skipped" in then or "skipped" in now:
+            rows.append({"name": name, "status": "skipped" if "skipped" in now else "new"})
+            continue
+        time_change = now["median_us"] / then["median_us"] - 1
+        # Allow a few bytes of slack so tiny allocations don't flap
+        alloc_change = (now["alloc_peak_bytes"] - then["alloc_peak_bytes"]) / max(then["alloc_peak_bytes"], 64)
+        regressed = time_change > threshold or alloc_change > alloc_threshold
+        rows.append({
+            "name": name,
+            "status": "regressed" if regressed else "ok",
+            "baseline_median_us": then["median_us"],
+            "median_us": now["median_us"],
+            "time_change": round(time_change, 4),
+            "baseline_alloc_peak_bytes": then["alloc_peak_bytes"],
+            "alloc_peak_bytes": now["alloc_peak_bytes"],
+            "alloc_change": round(alloc_change, 4)
+        })
+    return rows
+
+
+def baseline_path(name: str) -> str:
+    return name if name.endswith(".json") else os.path.join(BASELINE_DIR, f"{name}.json")
+
+
+def print_table(rows: List[Dict[str, Any]]) -> None:
+    print(f"{'benchmark':36} {'baseline µs':>12} {'now µs':>10} {'time':>8} {'alloc':>8}  status", file=sys.stderr)
+    for row in rows:
+        if "median_us" not in row:
+            print(f"{row['name']:36} {'':>12} {'':>10} {'':>8} {'':>8}  {row['status']}", file=sys.stderr)
+            continue
+        print(
+            f"{row['name']:36} {row['baseline_median_us']:>12.2f} {row['median_us']:>10.2f} "
+            f"{row['time_change']:>+8.1%} {row['alloc_change']:>+8.1%}  {row['status']}",
+            file=sys.stderr
+        )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Hot path microbenchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("-k", "--filter", default="*", help="Only benchmarks matching this glob")
+    common.add_argument("--rounds", type=int, default=15)
+    common.add_argument("--min-round-time", type=float, default=0.02, help="Seconds per round (loops are calibrated)")
+    common.add_argument("--alloc-calls", type=int, default=200, help="Calls traced for retained allocations")
+
+    run_parser = subparsers.add_parser("run", parents=[common], help="Run and print (or save) results")
+    run_parser.add_argument("--save", metavar="NAME", help="Store results as benchmarks/baselines/NAME.json")
+
+    compare_parser = subparsers.add_parser("compare", parents=[common], help="Run and compare with a baseline")
+    compare_parser.add_argument("baseline", help="Baseline name or path to a results JSON file")
+    compare_parser.add_argument("--threshold", type=float, default=0.15, help="Allowed median time increase")
+    compare_parser.add_argument("--alloc-threshold", type=float, default=0.15, help="Allowed peak allocation increase")
+
+    subparsers.add_parser("list", help="List benchmarks")
+    args = parser.parse_args(argv)
+
+    if args.command == "list":
+        print("\n".join(BENCHMARKS))
+        return 0
+
+    if args.command == "compare":
+        with open(baseline_path(args.baseline)) as f:
+            baseline = json.load(f)
+
+    results = run_all(args.filter, args.rounds, args.min_round_time, args.alloc_calls)
+
+    if args.command == "run":
+        output = json.dumps(results, indent=2)
+        if args.save:
+            os.makedirs(BASELINE_DIR, exist_ok=True)
+            with open(baseline_path(args.save), "w") as f:
+                f.write(output + "\n")
+        print(output)
+        return 0
+
+    rows = compare(baseline, results, args.threshold, args.alloc_threshold)
+    print_table(rows)
+    print(json.dumps({"threshold": args.threshold, "alloc_threshold": args.alloc_threshold, "results": rows}, indent=2))
+    return 1 if any(row["status"] == "regressed" for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
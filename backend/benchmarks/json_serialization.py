@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""Benchmark: response serialization cost for message lists
+
+Builds synthetic payloads shaped like GET /conversation/{phone} (formatted
+messages with datetimes) and GET /conversations (documents with nested
+BSON datetimes and raw ObjectIds), then times rendering them the default
+way (jsonable_encoder + JSONResponse) against BSONJSONResponse. Prints a
+JSON report with the median of several runs per size.
+
+    python benchmarks/json_serialization.py --sizes 1000 10000 --runs 20
+
+No database is needed.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.json_response import BSONJSONResponse  # noqa: E402
+
+
+def conversation_payload(size: int) -> list:
+    """Formatted messages as returned by get_conversation_messages"""
+    now = datetime.now()
+    return [{
+        "id": str(ObjectId()),
+        "type": "text",
+        "body": "Site update: slab casting finished, photos to follow",
+        "direction": "inbound" if i % 2 else "outbound",
+        "status": "sent",
+        "timestamp": now - timedelta(minutes=i),
+        "media_url": None,
+        "thumbnail_url": None,
+        "preview_url": None,
+        "from_user": ObjectId() if i % 2 == 0 else None
+    } for i in range(size)]
+
+
+def conversations_payload(size: int) -> list:
+    """Aggregation output shaped like get_conversations"""
+    now = datetime.now()
+    return [{
+        "conversation_id": f"91987{i:07d}",
+        "other_party": f"91987{i:07d}",
+        "last_message": {
+            "id": ObjectId(),
+            "type": "text",
+            "text": "Quotation attached",
+            "timestamp": now - timedelta(minutes=i),
+            "direction": "outbound"
+        },
+        "created_at": now - timedelta(minutes=i),
+        "unread_count": i % 5
+    } for i in range(size)]
+
+
+def default_render(payload: list) -> bytes:
+    # jsonable_encoder has no ObjectId encoder; this mirrors what routes do today
+    return JSONResponse(content=jsonable_encoder(payload, custom_encoder={ObjectId: str})).body
+
+
+def orjson_render(payload: list) -> bytes:
+    return BSONJSONResponse(content=payload).body
+
+
+def time_render(render, payload: list, runs: int) -> dict:
+    durations = []
+    for _ in range(runs):
+        start_time = time.perf_counter()
+        body = render(payload)
+        durations.append((time.perf_counter() - start_time) * 1000)
+    return {
+        "median_ms": round(statistics.median(durations), 3),
+        "min_ms": round(min(durations), 3),
+        "bytes": len(body)
+    }
+
+
+def main(args) -> dict:
+    report = {}
+    for name, build in (("conversation_messages", conversation_payload), ("conversations", conversations_payload)):
+        for size in args.sizes:
+            payload = build(size)
+            default = time_render(default_render, payload, args.runs)
+            fast = time_render(orjson_render, payload, args.runs)
+            report[f"{name}_{size}"] = {
+                "jsonable_encoder": default,
+                "orjson": fast,
+                "speedup": round(default["median_ms"] / fast["median_ms"], 1)
+            }
+    return report
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="JSON serialization benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--runs", type=int, default=20)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    print(json.dumps(main(parse_args()), indent=2))
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""Local stand-ins for the WhatsApp Cloud API, Microsoft Graph and the MSAL authority
+
+One process serves two listeners:
+
+- HTTP: WhatsApp (`/{version}/...`) and Graph (`/graph/v1.0/...`) with
+  configurable latency, jitter, 429 rate and media sizes.
+- HTTPS: a minimal Azure AD authority (OIDC discovery + client
+  credentials token endpoint). msal only accepts https authorities, so a
+  self-signed certificate for localhost is generated; point the backend
+  at it with REQUESTS_CA_BUNDLE.
+
+Call counts per upstream route are served at GET /_stats.
+
+    python benchmarks/loadtest/fake_upstreams.py --port 9100 --authority-port 9443 \\
+        --cert-dir /tmp/loadtest --latency-ms 80 --throttle-rate 0.02
+"""
+import argparse
+import asyncio
+import datetime
+import io
+import ipaddress
+import itertools
+import os
+import random
+import signal
+from collections import Counter
+from typing import Tuple
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+CERT_FILE = "authority-cert.pem"
+KEY_FILE = "authority-key.pem"
+
+
+def generate_certificate(cert_dir: str) -> Tuple[str, str]:
+    """Self-signed certificate for localhost/127.0.0.1; returns (cert, key) paths"""
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from cryptography.x509.oid import NameOID
+
+    os.makedirs(cert_dir, exist_ok=True)
+    cert_path = os.path.join(cert_dir, CERT_FILE)
+    key_path = os.path.join(cert_dir, KEY_FILE)
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "localhost")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    certificate = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(minutes=5))
+        .not_valid_after(now + datetime.timedelta(days=7))
+        .add_extension(x509.SubjectAlternativeName([
+            x509.DNSName("localhost"),
+            x509.IPAddress(ipaddress.ip_address("127.0.0.1"))
+        ]), critical=False)
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+        .sign(key, hashes.SHA256())
+    )
+
+    with open(cert_path, "wb") as f:
+        f.write(certificate.public_bytes(serialization.Encoding.PEM))
+    with open(key_path, "wb") as f:
+        f.write(key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.TraditionalOpenSSL,
+            serialization.NoEncryption()
+        ))
+    return cert_path, key_path
+
+
+def build_media(image_edge: int, document_bytes: int) -> dict:
+    """Media bodies served for downloads: a real JPEG (if Pillow is available) and a document"""
+    media = {"document": os.urandom(document_bytes)}
+    try:
+        from PIL import Image
+        output = io.BytesIO()
+        Image.effect_noise((image_edge, image_edge * 3 // 4), 40).convert("RGB").save(output, "JPEG", quality=90)
+        media["image"] = output.getvalue()
+    except ImportError:
+        media["image"] = os.urandom(document_bytes)
+    return media
+
+
+class FakeUpstreams:
+    """Route handlers and behaviour knobs shared by both listeners"""
+
+    def __init__(self, args):
+        self.args = args
+        self.calls: Counter = Counter()
+        self.ids = itertools.count(1)
+        self.media = build_media(args.image_edge, args.media_bytes)
+        self.base_url = f"http://127.0.0.1:{args.port}"
+        self.authority_url = f"https://localhost:{args.authority_port}"
+
+    async def _simulate(self, name: str):
+        """Count the call, sleep for the configured latency and maybe throttle"""
+        self.calls[name] += 1
+        delay = max(0.0, random.gauss(self.args.latency_ms, self.args.jitter_ms)) / 1000
+        await asyncio.sleep(delay)
+        if random.random() < self.args.throttle_rate:
+            self.calls[f"{name}:throttled"] += 1
+            return JSONResponse(
+                {"error": {"code": 80007 if name.startswith("whatsapp") else "TooManyRequests", "message": "Rate limit hit"}},
+                status_code=429,
+                headers={"Retry-After": "1"}
+            )
+        return None
+
+    # WhatsApp Cloud API
+
+    async def whatsapp_messages(self, request: Request):
+        throttled = await self._simulate("whatsapp.messages")
+        if throttled:
+            return throttled
+        body = await request.json()
+        return JSONResponse({
+            "messaging_product": "whatsapp",
+            "contacts": [{"input": body.get("to"), "wa_id": body.get("to")}],
+            "messages": [{"id": f"wamid.fake.{next(self.ids)}"}]
+        })
+
+    async def whatsapp_media_upload(self, request: Request):
+        throttled = await self._simulate("whatsapp.media_upload")
+        if throttled:
+            return throttled
+        await request.body()
+        return JSONResponse({"id": f"media.fake.{next(self.ids)}"})
+
+    async def whatsapp_object(self, request: Request):
+        """GET /{version}/{id}: media metadata, or the phone number for health checks"""
+        object_id = request.path_params["object_id"]
+        throttled = await self._simulate("whatsapp.object")
+        if throttled:
+            return throttled
+        kind = "image" if object_id.startswith("img") else "document"
+        return JSONResponse({
+            "id": object_id,
+            "url": f"{self.base_url}/_media/{kind}/{object_id}",
+            "mime_type": "image/jpeg" if kind == "image" else "application/pdf",
+            "file_size": len(self.media[kind])
+        })
+
+    async def media_download(self, request: Request):
+        throttled = await self._simulate("whatsapp.media_download")
+        if throttled:
+            return throttled
+        return Response(self.media[request.path_params["kind"]], media_type="application/octet-stream")
+
+    # Microsoft Graph
+
+    async def graph_lookup(self, request: Request):
+        throttled = await self._simulate("graph.lookup")
+        if throttled:
+            return throttled
+        return JSONResponse({"id": f"folder-{abs(hash(request.path_params['path'])):x}"})
+
+    async def graph_create_folder(self, request: Request):
+        throttled = await self._simulate("graph.create_folder")
+        if throttled:
+            return throttled
+        body = await request.json()
+        return JSONResponse({"id": f"folder-{next(self.ids)}", "name": body.get("name")}, status_code=201)
+
+    async def graph_upload(self, request: Request):
+        throttled = await self._simulate("graph.upload")
+        if throttled:
+            return throttled
+        content = await request.body()
+        item_id = f"item-{next(self.ids)}"
+        name = request.path_params["rest"].split(":/")[1] if ":/" in request.path_params["rest"] else item_id
+        return JSONResponse({
+            "id": item_id,
+            "name": name,
+            "size": len(content),
+            "webUrl": f"{self.base_url}/sharepoint/{item_id}/{name}",
+            "createdDateTime": datetime.datetime.utcnow().isoformat() + "Z"
+        }, status_code=201)
+
+    async def graph_list_item(self, request: Request):
+        throttled = await self._simulate("graph.list_item")
+        if throttled:
+            return throttled
+        return JSONResponse({"id": str(next(self.ids))})
+
+    async def graph_fields(self, request: Request):
+        throttled = await self._simulate("graph.fields")
+        if throttled:
+            return throttled
+        return JSONResponse(await request.json())
+
+    # MSAL authority
+
+    async def openid_configuration(self, request: Request):
+        self.calls["authority.discovery"] += 1
+        tenant = request.path_params["tenant"]
+        return JSONResponse({
+            "issuer": f"{self.authority_url}/{tenant}/v2.0",
+            "authorization_endpoint": f"{self.authority_url}/{tenant}/oauth2/v2.0/authorize",
+            "token_endpoint": f"{self.authority_url}/{tenant}/oauth2/v2.0/token",
+            "token_endpoint_auth_methods_supported": ["client_secret_post"]
+        })
+
+    async def token(self, request: Request):
+        self.calls["authority.token"] += 1
+        await request.form()
+        return JSONResponse({
+            "token_type": "Bearer",
+            "expires_in": 3599,
+            "ext_expires_in": 3599,
+            "access_token": f"fake-graph-token-{next(self.ids)}"
+        })
+
+    async def stats(self, request: Request):
+        return JSONResponse(dict(self.calls))
+
+    def upstream_app(self) -> Starlette:
+        return Starlette(routes=[
+            Route("/_stats", self.stats),
+            Route("/_media/{kind}/{media_id}", self.media_download),
+            Route("/graph/v1.0/sites/{site}/drive/root:{path:path}", self.graph_lookup),
+            Route("/graph/v1.0/sites/{site}/drive/items/{item_id}/children", self.graph_create_folder, methods=["POST"]),
+            Route("/graph/v1.0/sites/{site}/drive/items/{item_id}/listItem", self.graph_list_item),
+            Route("/graph/v1.0/sites/{site}/drive/items/{rest:path}", self.graph_upload, methods=["PUT"]),
+            Route("/graph/v1.0/sites/{site}/lists/{list_name}/items/{item_id}/fields", self.graph_fields, methods=["PATCH"]),
+            Route("/{version}/{phone_id}/messages", self.whatsapp_messages, methods=["POST"]),
+            Route("/{version}/{phone_id}/media", self.whatsapp_media_upload, methods=["POST"]),
+            Route("/{version}/{object_id}", self.whatsapp_object),
+        ])
+
+    def authority_app(self) -> Starlette:
+        return Starlette(routes=[
+            Route("/{tenant}/v2.0/.well-known/openid-configuration", self.openid_configuration),
+            Route("/{tenant}/oauth2/v2.0/token", self.token, methods=["POST"]),
+        ])
+
+
+async def serve(args) -> None:
+    cert_path, key_path = generate_certificate(args.cert_dir)
+    upstreams = FakeUpstreams(args)
+    servers = [
+        uvicorn.Server(uvicorn.Config(
+            upstreams.upstream_app(), host="127.0.0.1", port=args.port,
+            log_level="warning", access_log=False
+        )),
+        uvicorn.Server(uvicorn.Config(
+            upstreams.authority_app(), host="127.0.0.1", port=args.authority_port,
+            ssl_certfile=cert_path, ssl_keyfile=key_path,
+            log_level="warning", access_log=False
+        ))
+    ]
+
+    # Each uvicorn server would claim SIGTERM for itself; stop both together
+    def stop():
+        for server in servers:
+            server.should_exit = True
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop)
+    for server in servers:
+        server.install_signal_handlers = lambda: None
+    await asyncio.gather(*(server.serve() for server in servers))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Fake WhatsApp, Graph and MSAL upstreams")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--authority-port", type=int, default=9443)
+    parser.add_argument("--cert-dir", default="/tmp/madio-loadtest")
+    parser.add_argument("--latency-ms", type=float, default=50, help="Mean upstream latency")
+    parser.add_argument("--jitter-ms", type=float, default=15, help="Latency standard deviation")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of calls answered 429")
+    parser.add_argument("--media-bytes", type=int, default=2 * 1024 * 1024, help="Document download size")
+    parser.add_argument("--image-edge", type=int, default=2400, help="Width of the downloadable JPEG")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    asyncio.run(serve(parse_args()))
@@ -0,0 +1,34 @@
+"""ASGI app served by gunicorn during load tests
+
+Mounts the production routers with the production middleware stack
+(metrics, optional adaptive concurrency limiting) and database
+lifecycle, so gunicorn.conf.py can serve it unchanged:
+
+    gunicorn -c gunicorn.conf.py --pythonpath benchmarks/loadtest loadtest_app:app
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from fastapi import FastAPI  # noqa: E402
+
+from database.connection import Database  # noqa: E402
+from middleware.concurrency_limiter import concurrency_limiter_from_env  # noqa: E402
+from monitoring.metrics import get_metrics, metrics_middleware  # noqa: E402
+from routes import health_routes, media_routes, whatsapp_routes  # noqa: E402
+
+app = FastAPI(title="Madio ERP (load test)")
+
+if os.getenv("CONCURRENCY_LIMIT_ENABLED", "true").lower() == "true":
+    app.middleware("http")(concurrency_limiter_from_env())
+app.middleware("http")(metrics_middleware)
+
+app.add_event_handler("startup", Database.connect_db)
+app.add_event_handler("shutdown", Database.close_db)
+
+app.include_router(whatsapp_routes.router)
+app.include_router(media_routes.router)
+app.include_router(health_routes.router)
+
+app.add_api_route("/metrics", get_metrics, include_in_schema=False)
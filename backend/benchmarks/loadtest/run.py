@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""Load test: the real gunicorn deployment against local fake upstreams
+
+Starts (unless URIs are given) a throwaway mongod and redis-server, the
+fake WhatsApp/Graph/MSAL upstreams from fake_upstreams.py, and gunicorn
+with gunicorn.conf.py serving loadtest_app:app. Then runs the selected
+scenarios and writes a JSON report: per-request throughput and latency
+percentiles, status counts, worker RSS, MongoDB opcounters and upstream
+call counts.
+
+    python benchmarks/loadtest/run.py --workers 4 --scenario webhook_burst --messages 2000 \\
+        --scenario polling --staff 50 --duration 60 --throttle-rate 0.02 --output report.json
+
+`mongod` and `redis-server` must be on PATH unless --mongodb-uri and
+--redis-url point at running instances (their data is not dropped, but
+the load test writes only to the `madio_erp_loadtest` database).
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+from urllib.parse import urlparse
+
+import httpx
+import psutil
+from pymongo import MongoClient
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import scenarios  # noqa: E402
+from fake_upstreams import CERT_FILE  # noqa: E402
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(os.path.dirname(HERE))
+DATABASE = "madio_erp_loadtest"
+PHONE_NUMBER_ID = "100000000000001"
+JWT_SECRET = "loadtest-secret"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with contextlib.suppress(OSError), socket.create_connection(("127.0.0.1", port), timeout=0.5):
+            return
+        time.sleep(0.1)
+    raise TimeoutError(f"Nothing listening on port {port} after {timeout}s")
+
+
+class Processes:
+    """Child processes started by the run, terminated in reverse order"""
+
+    def __init__(self, log_dir: str):
+        self.log_dir = log_dir
+        self.children: List[subprocess.Popen] = []
+
+    def start(self, name: str, args: List[str], **kwargs) -> subprocess.Popen:
+        log = open(os.path.join(self.log_dir, f"{name}.log"), "wb")
+        process = subprocess.Popen(args, stdout=log, stderr=subprocess.STDOUT, **kwargs)
+        self.children.append(process)
+        return process
+
+    def stop(self) -> None:
+        for process in reversed(self.children):
+            if process.poll() is None:
+                process.send_signal(signal.SIGTERM)
+                try:
+                    process.wait(timeout=30)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+
+
+def start_mongod(processes: Processes, work_dir: str) -> str:
+    if not shutil.which("mongod"):
+        raise SystemExit("mongod not found on PATH; pass --mongodb-uri")
+    port = free_port()
+    data_dir = os.path.join(work_dir, "mongo")
+    os.makedirs(data_dir)
+    processes.start("mongod", [
+        "mongod", "--dbpath", data_dir, "--port", str(port), "--bind_ip", "127.0.0.1",
+        "--wiredTigerCacheSizeGB", "0.5"
+    ])
+    wait_for_port(port)
+    return f"mongodb://127.0.0.1:{port}"
+
+
+def start_redis(processes: Processes) -> str:
+    if not shutil.which("redis-server"):
+        raise SystemExit("redis-server not found on PATH; pass --redis-url")
+    port = free_port()
+    processes.start("redis", ["redis-server", "--port", str(port), "--save", "", "--appendonly", "no"])
+    wait_for_port(port)
+    return f"redis://127.0.0.1:{port}"
+
+
+def backend_env(args, mongodb_uri: str, redis_url: str, upstream_port: int, authority_port: int, work_dir: str) -> Dict[str, str]:
+    """Environment for gunicorn: production settings pointed at local services"""
+    redis = urlparse(redis_url)
+    env = dict(os.environ)
+    env.update({
+        "MONGODB_URI": mongodb_uri,
+        "MONGODB_DATABASE": DATABASE,
+        "MONGODB_MIGRATE_ON_STARTUP": "true",
+        "REDIS_HOST": redis.hostname or "127.0.0.1",
+        "REDIS_PORT": str(redis.port or 6379),
+        "GUNICORN_WORKERS": str(args.workers),
+        "PORT": str(args.port),
+        "GUNICORN_ACCESS_LOG": os.path.join(work_dir, "access.log"),
+        "JWT_SECRET_KEY": JWT_SECRET,
+        "JWT_REFRESH_SECRET_KEY": JWT_SECRET + "-refresh",
+        "WHATSAPP_API_HOST": f"http://127.0.0.1:{upstream_port}",
+        "WHATSAPP_PHONE_NUMBER_ID": PHONE_NUMBER_ID,
+        "WHATSAPP_ACCESS_TOKEN": "loadtest-token",
+        "WHATSAPP_WEBHOOK_VERIFY_TOKEN": "loadtest-verify",
+        "GRAPH_API_URL": f"http://127.0.0.1:{upstream_port}/graph/v1.0",
+        "MSAL_AUTHORITY_HOST": f"https://localhost:{authority_port}",
+        "REQUESTS_CA_BUNDLE": os.path.join(work_dir, CERT_FILE),
+        "SHAREPOINT_TENANT_ID": "loadtest-tenant",
+        "SHAREPOINT_CLIENT_ID": "loadtest-client",
+        "SHAREPOINT_CLIENT_SECRET": "loadtest-secret",
+        "SHAREPOINT_SITE_ID": "loadtest-site",
+        "TEMP_MEDIA_DIR": os.path.join(work_dir, "temp-media"),
+        "API_BASE_URL": f"http://127.0.0.1:{args.port}"
+    })
+    return env
+
+
+def worker_rss(master: subprocess.Popen) -> Dict[str, Any]:
+    """Resident memory of the gunicorn master and each worker, in MB"""
+    try:
+        parent = psutil.Process(master.pid)
+        workers = parent.children(recursive=True)
+    except psutil.NoSuchProcess:
+        return {}
+    rss = []
+    for worker in workers:
+        with contextlib.suppress(psutil.NoSuchProcess):
+            rss.append(round(worker.memory_info().rss / 1024 / 1024, 1))
+    return {
+        "master_mb": round(parent.memory_info().rss / 1024 / 1024, 1),
+        "workers_mb": rss,
+        "total_mb": round(sum(rss), 1)
+    }
+
+
+async def sample_rss(master: subprocess.Popen, samples: List[Dict[str, Any]], interval: float, stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        samples.append(worker_rss(master))
+        with contextlib.suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(stop.wait(), interval)
+
+
+def opcounters(mongodb_uri: str) -> Dict[str, int]:
+    with MongoClient(mongodb_uri, serverSelectionTimeoutMS=5000) as client:
+        return dict(client.admin.command("serverStatus")["opcounters"])
+
+
+async def wait_healthy(base_url: str, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url, timeout=2) as client:
+        while time.monotonic() < deadline:
+            with contextlib.suppress(httpx.HTTPError):
+                if (await client.get("/health/")).status_code == 200:
+                    return
+            await asyncio.sleep(0.25)
+    raise TimeoutError(f"Backend not healthy after {timeout}s")
+
+
+async def run_scenarios(args, base_url: str, master: subprocess.Popen) -> Dict[str, Any]:
+    generator = scenarios.LoadGenerator(base_url, concurrency=args.concurrency)
+    token = scenarios.staff_token(JWT_SECRET, "loadtest-broadcaster")
+    rss_samples: List[Dict[str, Any]] = []
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(sample_rss(master, rss_samples, args.rss_interval, stop))
+
+    results = {}
+    try:
+        for name in args.scenario:
+            generator.latencies.clear()
+            generator.statuses.clear()
+            generator.started = time.monotonic()
+            if name == "webhook_burst":
+                await scenarios.webhook_burst(
+                    generator, PHONE_NUMBER_ID, args.messages,
+                    image_share=args.image_share, document_share=args.document_share
+                )
+            elif name == "broadcast":
+                attachment = os.urandom(256 * 1024)
+                if args.attachment:
+                    with open(args.attachment, "rb") as f:
+                        attachment = f.read()
+                await scenarios.broadcast(generator, token, args.recipients, attachment)
+            elif name == "polling":
+                await scenarios.polling(
+                    generator, JWT_SECRET, PHONE_NUMBER_ID, args.staff, args.duration,
+                    interval=args.poll_interval, webhook_rate=args.webhook_rate
+                )
+            results[name] = generator.summarise()
+    finally:
+        stop.set()
+        await sampler
+        await generator.close()
+
+    peak = max(rss_samples, key=lambda sample: sample.get("total_mb", 0), default={})
+    return {
+        "scenarios": results,
+        "worker_rss": {"final": worker_rss(master), "peak": peak}
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="End-to-end load test against fake upstreams")
+    parser.add_argument("--scenario", action="append", choices=sorted(scenarios.SCENARIOS),
+                        help="Scenario to run (repeatable, run in order; default: all)")
+    parser.add_argument("--workers", type=int, default=2, help="Gunicorn workers")
+    parser.add_argument("--port", type=int, default=0, help="Backend port (default: a free port)")
+    parser.add_argument("--concurrency", type=int, default=64, help="Client requests in flight")
+    parser.add_argument("--mongodb-uri", help="Use this MongoDB instead of starting mongod")
+    parser.add_argument("--redis-url", help="Use this Redis instead of starting redis-server")
+    parser.add_argument("--output", help="Write the JSON report here (default: stdout)")
+    parser.add_argument("--keep-logs", action="store_true", help="Keep the working directory with process logs")
+    parser.add_argument("--startup-timeout", type=float, default=60)
+    parser.add_argument("--rss-interval", type=float, default=1.0, help="Seconds between worker RSS samples")
+
+    upstream = parser.add_argument_group("fake upstreams")
+    upstream.add_argument("--latency-ms", type=float, default=50)
+    upstream.add_argument("--jitter-ms", type=float, default=15)
+    upstream.add_argument("--throttle-rate", type=float, default=0.0)
+    upstream.add_argument("--media-bytes", type=int, default=2 * 1024 * 1024)
+    upstream.add_argument("--image-edge", type=int, default=2400)
+
+    workload = parser.add_argument_group("workload")
+    workload.add_argument("--messages", type=int, default=1000, help="webhook_burst: webhooks delivered")
+    workload.add_argument("--image-share", type=float, default=0.15, help="webhook_burst: fraction with images")
+    workload.add_argument("--document-share", type=float, default=0.05, help="webhook_burst: fraction with documents")
+    workload.add_argument("--recipients", type=int, default=500, help="broadcast: recipients")
+    workload.add_argument("--attachment", help="broadcast: file to attach (default: 256 KB of random bytes)")
+    workload.add_argument("--staff", type=int, default=25, help="polling: concurrent staff clients")
+    workload.add_argument("--duration", type=float, default=30, help="polling: seconds")
+    workload.add_argument("--poll-interval", type=float, default=3.0, help="polling: seconds between polls")
+    workload.add_argument("--webhook-rate", type=float, default=2.0, help="polling: background webhooks per second")
+    args = parser.parse_args(argv)
+    args.scenario = args.scenario or list(scenarios.SCENARIOS)
+    args.port = args.port or free_port()
+
+    work_dir = tempfile.mkdtemp(prefix="madio-loadtest-")
+    processes = Processes(work_dir)
+    report: Dict[str, Any] = {}
+    try:
+        mongodb_uri = args.mongodb_uri or start_mongod(processes, work_dir)
+        redis_url = args.redis_url or start_redis(processes)
+
+        upstream_port, authority_port = free_port(), free_port()
+        upstream_proc = processes.start("upstreams", [
+            sys.executable, os.path.join(HERE, "fake_upstreams.py"),
+            "--port", str(upstream_port), "--authority-port", str(authority_port), "--cert-dir", work_dir,
+            "--latency-ms", str(args.latency_ms), "--jitter-ms", str(args.jitter_ms),
+            "--throttle-rate", str(args.throttle_rate), "--media-bytes", str(args.media_bytes),
+            "--image-edge", str(args.image_edge)
+        ])
+        wait_for_port(upstream_port)
+        wait_for_port(authority_port)
+
+        with MongoClient(mongodb_uri) as client:
+            client.drop_database(DATABASE)
+
+        master = processes.start("gunicorn", [
+            sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py",
+            "--pythonpath", HERE, "loadtest_app:app"
+        ], cwd=BACKEND_DIR, env=backend_env(args, mongodb_uri, redis_url, upstream_port, authority_port, work_dir))
+
+        base_url = f"http://127.0.0.1:{args.port}"
+        asyncio.run(wait_healthy(base_url, args.startup_timeout))
+
+        ops_before = opcounters(mongodb_uri)
+        report = asyncio.run(run_scenarios(args, base_url, master))
+        # Let batched writes flush before reading opcounters
+        time.sleep(1)
+        ops_after = opcounters(mongodb_uri)
+
+        report["mongo_opcounters"] = {op: ops_after[op] - ops_before.get(op, 0) for op in ops_after}
+        report["upstream_calls"] = httpx.get(f"http://127.0.0.1:{upstream_port}/_stats").json()
+        report["config"] = {
+            key: getattr(args, key) for key in (
+                "scenario", "workers", "concurrency", "latency_ms", "jitter_ms", "throttle_rate",
+                "media_bytes", "messages", "recipients", "staff", "duration"
+            )
+        }
+        if upstream_proc.poll() is not None:
+            report["warnings"] = ["fake upstreams exited during the run"]
+    finally:
+        processes.stop()
+        if args.keep_logs:
+            report["logs"] = work_dir
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
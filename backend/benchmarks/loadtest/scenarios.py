@@ -0,0 +1,266 @@
+"""Load-test scenarios driven against a running backend
+
+Each scenario is a coroutine taking a `LoadGenerator` and returning
+nothing; latencies and statuses are collected per request name by the
+generator and summarised with `summarise()`.
+
+- webhook_burst: Meta delivering a burst of inbound webhooks, a mix of
+  text, images and documents (media pulls the fake upstream's large
+  downloads through processing and SharePoint upload).
+- broadcast: staff sending the same text and one uploaded attachment to
+  many recipients via /send-message and /send-media, queued in the bulk
+  outbox lane.
+- polling: N staff clients polling /conversations every few seconds with
+  If-None-Match while a trickle of webhooks keeps invalidating the cache.
+"""
+import asyncio
+import itertools
+import random
+import statistics
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+from jose import jwt
+
+WEBHOOK_PATH = "/api/whatsapp/webhook"
+
+
+def staff_token(secret: str, user_id: str, minutes: int = 120) -> str:
+    """Access token accepted by auth.jwt_handler.verify_token"""
+    return jwt.encode({
+        "sub": user_id,
+        "role": "staff",
+        "type": "access",
+        "exp": datetime.utcnow() + timedelta(minutes=minutes)
+    }, secret, algorithm="HS256")
+
+
+def percentile(samples: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile"""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+class LoadGenerator:
+    """Bounded-concurrency HTTP client that records every request"""
+
+    def __init__(self, base_url: str, concurrency: int, timeout: float = 30.0):
+        """
+        Args:
+            base_url: Backend URL, e.g. http://127.0.0.1:8000
+            concurrency: Maximum requests in flight across all scenarios
+            timeout: Per-request timeout in seconds
+        """
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        )
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.started = time.monotonic()
+
+    async def request(self, name: str, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        """Send one request, recording its latency and status under `name`"""
+        async with self.semaphore:
+            start = time.monotonic()
+            try:
+                response = await self.client.request(method, url, **kwargs)
+                status = str(response.status_code)
+            except httpx.HTTPError as e:
+                response = None
+                status = type(e).__name__
+            self.latencies[name].append(time.monotonic() - start)
+            self.statuses[name][status] += 1
+            return response
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+    def summarise(self) -> Dict[str, Any]:
+        """Throughput, latency percentiles (ms) and status counts per request name"""
+        elapsed = time.monotonic() - self.started
+        report = {}
+        for name, samples in self.latencies.items():
+            errors = sum(count for status, count in self.statuses[name].items() if not status.startswith(("2", "3")))
+            report[name] = {
+                "requests": len(samples),
+                "throughput_rps": round(len(samples) / elapsed, 2) if elapsed else None,
+                "latency_ms": {
+                    "p50": _ms(percentile(samples, 50)),
+                    "p95": _ms(percentile(samples, 95)),
+                    "p99": _ms(percentile(samples, 99)),
+                    "max": _ms(max(samples)),
+                    "mean": _ms(statistics.fmean(samples))
+                },
+                "statuses": dict(self.statuses[name]),
+                "errors": errors
+            }
+        return {"elapsed_seconds": round(elapsed, 2), "requests": report}
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return round(seconds * 1000, 2) if seconds is not None else None
+
+
+_message_ids = itertools.count(1)
+
+
+def webhook_payload(phone_number_id: str, from_phone: str, kind: str) -> Dict[str, Any]:
+    """Inbound message webhook as delivered by the Cloud API"""
+    n = next(_message_ids)
+    message: Dict[str, Any] = {
+        "from": from_phone,
+        "id": f"wamid.loadtest.{time.time_ns()}.{n}",
+        "timestamp": str(int(time.time())),
+        "type": kind
+    }
+    if kind == "text":
+        message["text"] = {"body": f"Site update {n}: slab casting scheduled for tomorrow"}
+    elif kind == "image":
+        # The fake upstream serves its large JPEG for ids starting with "img"
+        message["image"] = {"id": f"img-{n}", "mime_type": "image/jpeg", "caption": f"Photo {n}"}
+    else:
+        message["document"] = {"id": f"doc-{n}", "mime_type": "application/pdf", "filename": f"invoice-{n}.pdf"}
+
+    return {
+        "object": "whatsapp_business_account",
+        "entry": [{
+            "id": "loadtest-waba",
+            "changes": [{
+                "field": "messages",
+                "value": {
+                    "messaging_product": "whatsapp",
+                    "metadata": {"display_phone_number": "15550000000", "phone_number_id": phone_number_id},
+                    "contacts": [{"profile": {"name": f"Contact {from_phone[-4:]}"}, "wa_id": from_phone}],
+                    "messages": [message]
+                }
+            }]
+        }]
+    }
+
+
+def contacts(count: int) -> List[str]:
+    return [f"91987{i:07d}" for i in range(count)]
+
+
+def pick_kind(image_share: float, document_share: float) -> str:
+    roll = random.random()
+    if roll < image_share:
+        return "image"
+    if roll < image_share + document_share:
+        return "document"
+    return "text"
+
+
+async def webhook_burst(
+    generator: LoadGenerator,
+    phone_number_id: str,
+    messages: int,
+    senders: int = 200,
+    image_share: float = 0.15,
+    document_share: float = 0.05
+) -> None:
+    """Deliver `messages` webhooks as fast as the concurrency limit allows"""
+    parties = contacts(senders)
+    await asyncio.gather(*[
+        generator.request(
+            f"webhook:{kind}", "POST", WEBHOOK_PATH,
+            json=webhook_payload(phone_number_id, random.choice(parties), kind)
+        )
+        for kind in (pick_kind(image_share, document_share) for _ in range(messages))
+    ])
+
+
+async def broadcast(
+    generator: LoadGenerator,
+    token: str,
+    recipients: int,
+    attachment: bytes,
+    media_every: int = 5
+) -> None:
+    """Send a text to every recipient, plus an attachment to every `media_every`th"""
+    headers = {"Authorization": f"Bearer {token}"}
+    upload = await generator.request(
+        "upload-temp", "POST", "/api/whatsapp/upload-temp",
+        headers=headers,
+        files={"file": ("site-plan.jpg", attachment, "image/jpeg")}
+    )
+    media_url = upload.json()["url"] if upload is not None and upload.status_code == 200 else None
+
+    campaign = f"broadcast-{time.time_ns()}"
+    sends: List[Awaitable] = []
+    for i, phone in enumerate(contacts(recipients)):
+        sends.append(generator.request(
+            "send-message", "POST", "/api/whatsapp/send-message",
+            headers={**headers, "Idempotency-Key": f"{campaign}-text-{i}"},
+            json={"to_phone": phone, "message": f"Site visit confirmed for tomorrow ({i})", "priority": "bulk"}
+        ))
+        if media_url and i % media_every == 0:
+            sends.append(generator.request(
+                "send-media", "POST", "/api/whatsapp/send-media",
+                headers={**headers, "Idempotency-Key": f"{campaign}-media-{i}"},
+                json={
+                    "to_phone": phone, "media_url": media_url, "media_type": "image",
+                    "caption": "Site plan", "priority": "bulk"
+                }
+            ))
+    await asyncio.gather(*sends)
+
+
+async def _poll_conversations(generator: LoadGenerator, token: str, interval: float, deadline: float) -> None:
+    etag = None
+    # Spread the first polls so clients don't move in lockstep
+    await asyncio.sleep(random.uniform(0, interval))
+    while time.monotonic() < deadline:
+        headers = {"Authorization": f"Bearer {token}"}
+        if etag:
+            headers["If-None-Match"] = etag
+        response = await generator.request("conversations", "GET", "/api/whatsapp/conversations", headers=headers)
+        if response is not None and response.status_code == 200:
+            etag = response.headers.get("etag")
+        await asyncio.sleep(interval)
+
+
+async def _webhook_trickle(generator: LoadGenerator, phone_number_id: str, rate: float, deadline: float) -> None:
+    parties = contacts(50)
+    while time.monotonic() < deadline:
+        await generator.request(
+            "webhook:text", "POST", WEBHOOK_PATH,
+            json=webhook_payload(phone_number_id, random.choice(parties), "text")
+        )
+        await asyncio.sleep(random.expovariate(rate))
+
+
+async def polling(
+    generator: LoadGenerator,
+    secret: str,
+    phone_number_id: str,
+    staff: int,
+    duration: float,
+    interval: float = 3.0,
+    webhook_rate: float = 2.0
+) -> None:
+    """`staff` clients polling /conversations for `duration` seconds"""
+    deadline = time.monotonic() + duration
+    tasks = [
+        _poll_conversations(generator, staff_token(secret, f"staff-{i}"), interval, deadline)
+        for i in range(staff)
+    ]
+    if webhook_rate > 0:
+        tasks.append(_webhook_trickle(generator, phone_number_id, webhook_rate, deadline))
+    await asyncio.gather(*tasks)
+
+
+SCENARIOS: Dict[str, Callable[..., Awaitable[None]]] = {
+    "webhook_burst": webhook_burst,
+    "broadcast": broadcast,
+    "polling": polling
+}
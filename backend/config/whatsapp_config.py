@@ -1,7 +1,25 @@
 """WhatsApp Business API Configuration"""
+import json
 import os
+from typing import List
 from pydantic import BaseModel
 
+class WhatsAppNumber(BaseModel):
+    """A business phone number messages are sent from and received on"""
+    
+    name: str
+    phone_number_id: str
+    # Defaults to WHATSAPP_ACCESS_TOKEN
+    access_token: str = ""
+    # Sends addressed to a pool are spread across its numbers
+    pool: str = "default"
+    # The number's throughput tier, shared by all workers
+    messages_per_second: float = float(os.getenv("WHATSAPP_MESSAGES_PER_SECOND", 80))
+    # Outbound connections per worker (0: HTTP_MAX_CONNECTIONS)
+    max_connections: int = 0
+    # Defaults to SHAREPOINT_ROOT_FOLDER/{name}
+    sharepoint_folder: str = ""
+
 class WhatsAppConfig(BaseModel):
     """WhatsApp Business API Configuration"""
     
@@ -10,8 +28,13 @@ class WhatsAppConfig(BaseModel):
     BUSINESS_ACCOUNT_ID: str = os.getenv("WHATSAPP_BUSINESS_ACCOUNT_ID", "")
     ACCESS_TOKEN: str = os.getenv("WHATSAPP_ACCESS_TOKEN", "")
     WEBHOOK_VERIFY_TOKEN: str = os.getenv("WHATSAPP_WEBHOOK_VERIFY_TOKEN", "")
+    # More business numbers, as a JSON list of WhatsAppNumber fields;
+    # PHONE_NUMBER_ID above is the number named "default"
+    NUMBERS_JSON: str = os.getenv("WHATSAPP_NUMBERS", "")
     API_VERSION: str = "v21.0"
-    BASE_URL: str = f"https://graph.facebook.com/{API_VERSION}"
+    # Upstream hosts are overridable so load tests can run against local stand-ins
+    API_HOST: str = os.getenv("WHATSAPP_API_HOST", "https://graph.facebook.com")
+    BASE_URL: str = f"{API_HOST}/{API_VERSION}"
     
     # SharePoint configuration
     SHAREPOINT_TENANT_ID: str = os.getenv("SHAREPOINT_TENANT_ID", "")
@@ -19,6 +42,21 @@ class WhatsAppConfig(BaseModel):
     SHAREPOINT_CLIENT_SECRET: str = os.getenv("SHAREPOINT_CLIENT_SECRET", "")
     SHAREPOINT_SITE_ID: str = os.getenv("SHAREPOINT_SITE_ID", "")
     SHAREPOINT_ROOT_FOLDER: str = "/Madio ERP/WhatsApp Media"
+    GRAPH_API_URL: str = os.getenv("GRAPH_API_URL", "https://graph.microsoft.com/v1.0")
+    MSAL_AUTHORITY_HOST: str = os.getenv("MSAL_AUTHORITY_HOST", "https://login.microsoftonline.com")
+    # Outbound scheduling (utils/upstream_scheduler.py): in-flight calls per
+    # worker, container-wide rate (0: unpaced), retries and circuit breaking
+    GRAPH_MAX_CONCURRENCY: int = int(os.getenv("GRAPH_MAX_CONCURRENCY", 8))
+    GRAPH_REQUESTS_PER_SECOND: float = float(os.getenv("GRAPH_REQUESTS_PER_SECOND", 0))
+    WHATSAPP_MAX_CONCURRENCY: int = int(os.getenv("WHATSAPP_MAX_CONCURRENCY", 16))
+    UPSTREAM_MAX_RETRIES: int = int(os.getenv("UPSTREAM_MAX_RETRIES", 3))
+    UPSTREAM_FAILURE_THRESHOLD: int = int(os.getenv("UPSTREAM_FAILURE_THRESHOLD", 5))
+    UPSTREAM_RESET_TIMEOUT: float = float(os.getenv("UPSTREAM_RESET_TIMEOUT", 30))
+    # Subfolder layout under the root; placeholders: {year} {month} {day}
+    # {contact} {entity_type} {entity_id}
+    SHAREPOINT_FOLDER_LAYOUT: str = os.getenv("SHAREPOINT_FOLDER_LAYOUT", "{year}/{month}")
+    # fail, replace or rename when a file name already exists
+    SHAREPOINT_CONFLICT_BEHAVIOR: str = os.getenv("SHAREPOINT_CONFLICT_BEHAVIOR", "rename")
     
     # Media settings
     MAX_IMAGE_SIZE_MB: int = 5
@@ -27,5 +65,49 @@ class WhatsAppConfig(BaseModel):
     ALLOWED_IMAGE_TYPES: list = [".jpg", ".jpeg", ".png", ".webp"]
     ALLOWED_VIDEO_TYPES: list = [".mp4", ".3gp"]
     ALLOWED_DOCUMENT_TYPES: list = [".pdf", ".doc", ".docx", ".xls", ".xlsx"]
+    
+    # Temporary media served to Meta from /temp-media
+    TEMP_MEDIA_DIR: str = os.getenv("TEMP_MEDIA_DIR", "/tmp/whatsapp-uploads")
+    TEMP_MEDIA_TTL_HOURS: int = int(os.getenv("TEMP_MEDIA_TTL_HOURS", 24))
+    TEMP_MEDIA_QUOTA_MB: int = int(os.getenv("TEMP_MEDIA_QUOTA_MB", 2048))
+    TEMP_MEDIA_SWEEP_INTERVAL: int = int(os.getenv("TEMP_MEDIA_SWEEP_INTERVAL", 300))
+    
+    # Uploaded media IDs are valid for 30 days; re-upload this long before expiry
+    MEDIA_ID_VALIDITY_DAYS: int = int(os.getenv("MEDIA_ID_VALIDITY_DAYS", 30))
+    MEDIA_ID_REFRESH_HOURS: int = int(os.getenv("MEDIA_ID_REFRESH_HOURS", 48))
+    
+    # Inbound media processing (thumbnails, web renditions, EXIF stripping)
+    MEDIA_PROCESSING_ENABLED: bool = os.getenv("MEDIA_PROCESSING_ENABLED", "true").lower() == "true"
+    MEDIA_PROCESS_WORKERS: int = int(os.getenv("MEDIA_PROCESS_WORKERS", 2))
+    MEDIA_PROCESS_TIMEOUT: int = int(os.getenv("MEDIA_PROCESS_TIMEOUT", 60))
+    MEDIA_STRIP_EXIF: bool = os.getenv("MEDIA_STRIP_EXIF", "true").lower() == "true"
+    MEDIA_THUMBNAIL_EDGE: int = int(os.getenv("MEDIA_THUMBNAIL_EDGE", 320))
+    MEDIA_WEB_EDGE: int = int(os.getenv("MEDIA_WEB_EDGE", 1600))
+    MEDIA_WEB_QUALITY: int = int(os.getenv("MEDIA_WEB_QUALITY", 82))
+    MEDIA_TRANSCODE_VIDEO: bool = os.getenv("MEDIA_TRANSCODE_VIDEO", "false").lower() == "true"
+    MEDIA_VIDEO_MAX_HEIGHT: int = int(os.getenv("MEDIA_VIDEO_MAX_HEIGHT", 720))
+    
+    def numbers(self) -> List[WhatsAppNumber]:
+        """Configured business numbers; the first is the default sender"""
+        specs = json.loads(self.NUMBERS_JSON or "[]")
+        numbers = []
+        if self.PHONE_NUMBER_ID or not specs:
+            numbers.append(WhatsAppNumber(
+                name="default",
+                phone_number_id=self.PHONE_NUMBER_ID,
+                sharepoint_folder=self.SHAREPOINT_ROOT_FOLDER
+            ))
+        
+        for spec in specs:
+            number = WhatsAppNumber(**spec)
+            numbers = [n for n in numbers if n.phone_number_id != number.phone_number_id]
+            if not number.sharepoint_folder:
+                number.sharepoint_folder = f"{self.SHAREPOINT_ROOT_FOLDER.rstrip('/')}/{number.name}"
+            numbers.append(number)
+        
+        for number in numbers:
+            if not number.access_token:
+                number.access_token = self.ACCESS_TOKEN
+        return numbers
 
 whatsapp_config = WhatsAppConfig()
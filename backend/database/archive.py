@@ -0,0 +1,295 @@
+"""Hot/Cold Tiering for WhatsApp Messages
+
+Recent messages live in the hot `whatsapp_messages` collection. A
+background archiver moves anything older than the hot window into
+monthly collections (`whatsapp_messages_archive_YYYY_MM`), recorded in
+`whatsapp_archive_months`. Reads page through the hot collection first and
+only touch archive collections once a cursor runs past the hot data.
+
+Each process caches the archive registry for a minute. Archival can run
+in another process (the job runner), so a read that comes up short
+re-reads the registry before concluding there is nothing older.
+"""
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from database.conversation_keys import message_conversation_key
+from database.locks import DistributedLock
+from database.migrations import ensure_indexes
+from monitoring.metrics import messages_archived_total, archive_reads_total
+
+logger = logging.getLogger(__name__)
+
+HOT_COLLECTION = "whatsapp_messages"
+ARCHIVE_PREFIX = "whatsapp_messages_archive_"
+ARCHIVE_REGISTRY = "whatsapp_archive_months"
+
+# Full-text index over message bodies, shared with the hot collection.
+# Language "none" skips English stemming and stop words, which mangle
+# transliterated Hindi and product codes.
+MESSAGE_TEXT_INDEX = {
+    "keys": [("message_body", "text")],
+    "name": "message_text",
+    "default_language": "none"
+}
+
+ARCHIVE_INDEXES = [
+    {"keys": [("whatsapp_message_id", 1)], "name": "whatsapp_message_id_1"},
+    {"keys": [("other_party", 1), ("created_at", -1)], "name": "conversation_messages"},
+    {"keys": [("conversation_key", 1), ("created_at", -1)], "name": "conversation_key_messages"},
+    {"keys": [("created_at", -1)], "name": "created_at_desc"},
+    MESSAGE_TEXT_INDEX
+]
+
+
+def archive_collection_name(created_at: datetime) -> str:
+    """Monthly archive collection for a message timestamp"""
+    return f"{ARCHIVE_PREFIX}{created_at:%Y_%m}"
+
+
+class MessageArchiver:
+    """Moves messages older than the hot window into monthly archives"""
+
+    def __init__(
+        self,
+        hot_window_days: int = 90,
+        batch_size: int = 1000,
+        interval: float = 3600,
+        batch_pause: float = 0.2
+    ):
+        """
+        Args:
+            hot_window_days: Age after which messages leave the hot collection
+            batch_size: Messages moved per batch
+            interval: Seconds between archive runs
+            batch_pause: Seconds to sleep between batches to limit load
+        """
+        self.hot_window_days = hot_window_days
+        self.batch_size = batch_size
+        self.interval = interval
+        self.batch_pause = batch_pause
+        self._indexed: set = set()
+        self._registry_cache: Optional[List[Dict[str, Any]]] = None
+        self._registry_cached_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def hot_cutoff(self) -> datetime:
+        """Oldest timestamp kept in the hot collection"""
+        return datetime.now() - timedelta(days=self.hot_window_days)
+
+    async def archive_once(self, db) -> int:
+        """Archive everything older than the hot window, returning the count moved
+
+        Copy-then-delete per batch; re-running after a crash is safe because
+        archive inserts ignore duplicates.
+        """
+        cutoff = self.hot_cutoff()
+        moved = 0
+        touched: Set[str] = set()
+
+        while True:
+            batch = await db[HOT_COLLECTION].find(
+                {"created_at": {"$lt": cutoff}}
+            ).sort("created_at", 1).limit(self.batch_size).to_list(self.batch_size)
+
+            if not batch:
+                break
+
+            by_month: Dict[str, List[Dict[str, Any]]] = {}
+            for doc in batch:
+                by_month.setdefault(archive_collection_name(doc["created_at"]), []).append(doc)
+
+            for collection, docs in by_month.items():
+                await self._copy_to_archive(db, collection, docs)
+                touched.add(collection)
+
+            await db[HOT_COLLECTION].delete_many({"_id": {"$in": [doc["_id"] for doc in batch]}})
+            moved += len(batch)
+            messages_archived_total.inc(len(batch))
+
+            await asyncio.sleep(self.batch_pause)
+
+        # Counted rather than incremented, so duplicates skipped on a rerun aren't counted twice
+        for collection in touched:
+            await db[ARCHIVE_REGISTRY].update_one(
+                {"_id": collection},
+                {"$set": {"count": await db[collection].count_documents({})}}
+            )
+
+        if moved:
+            self._registry_cache = None
+            logger.info(f"✓ Archived {moved} messages older than {cutoff:%Y-%m-%d}")
+        return moved
+
+    async def _copy_to_archive(self, db, collection: str, docs: List[Dict[str, Any]]) -> None:
+        if collection not in self._indexed:
+            await ensure_indexes(db, collection, ARCHIVE_INDEXES)
+            self._indexed.add(collection)
+
+        for doc in docs:
+            # Archived ahead of the conversation key backfill
+            if not doc.get("conversation_key"):
+                doc["conversation_key"] = message_conversation_key(doc)
+                doc.setdefault("other_party", doc["conversation_key"])
+        try:
+            await db[collection].insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            # Duplicates are left over from an interrupted earlier run
+            if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                raise
+
+        await db[ARCHIVE_REGISTRY].bulk_write([UpdateOne(
+            {"_id": collection},
+            {
+                "$min": {"oldest": docs[0]["created_at"]},
+                "$max": {"newest": docs[-1]["created_at"]}
+            },
+            upsert=True
+        )])
+
+    async def archive_collections(
+        self,
+        db,
+        before: Optional[datetime] = None,
+        after: Optional[datetime] = None,
+        refresh: bool = False
+    ) -> List[str]:
+        """Archive collections holding messages between `after` and `before`, newest first
+
+        Args:
+            db: Database handle
+            before: Only collections with messages older than this
+            after: Only collections with messages at or after this
+            refresh: Re-read the registry instead of using the cached copy
+        """
+        if refresh or self._registry_cache is None or time.monotonic() - self._registry_cached_at > 60:
+            self._registry_cache = await db[ARCHIVE_REGISTRY].find().sort("newest", -1).to_list(None)
+            self._registry_cached_at = time.monotonic()
+
+        return [
+            entry["_id"] for entry in self._registry_cache
+            if (before is None or entry["oldest"] < before)
+            and (after is None or entry["newest"] >= after)
+        ]
+
+    async def find_conversation_page(
+        self,
+        db,
+        query: Dict[str, Any],
+        limit: int,
+        before: Optional[datetime] = None
+    ) -> List[Dict[str, Any]]:
+        """Newest-first page of messages matching `query`, older than `before`
+
+        Falls through to archive collections only when the hot collection
+        cannot fill the page.
+        """
+        def page_filter(upper: Optional[datetime]) -> Dict[str, Any]:
+            if upper is None:
+                return query
+            return {**query, "created_at": {"$lt": upper}}
+
+        messages = await db[HOT_COLLECTION].find(page_filter(before)).sort(
+            "created_at", -1
+        ).limit(limit).to_list(limit)
+
+        if len(messages) >= limit:
+            return messages
+
+        upper = messages[-1]["created_at"] if messages else before
+        collections = await self.archive_collections(db, before=upper)
+        page = messages + await self._read_archives(db, collections, page_filter, upper, limit - len(messages))
+        if len(page) < limit:
+            # Months archived by another process since the registry was cached
+            fresh = await self.archive_collections(db, before=upper, refresh=True)
+            if fresh != collections:
+                page = messages + await self._read_archives(db, fresh, page_filter, upper, limit - len(messages))
+        return page
+
+    async def _read_archives(self, db, collections: List[str], page_filter, upper: Optional[datetime], limit: int) -> List[Dict[str, Any]]:
+        messages: List[Dict[str, Any]] = []
+        for collection in collections:
+            archive_reads_total.labels(query="conversation").inc()
+            older = await db[collection].find(page_filter(upper)).sort(
+                "created_at", -1
+            ).limit(limit - len(messages)).to_list(limit - len(messages))
+            messages.extend(older)
+            if len(messages) >= limit:
+                break
+            if older:
+                upper = older[-1]["created_at"]
+        return messages
+
+    async def find_by_message_ids(
+        self,
+        db,
+        message_ids: List[str],
+        max_time_ms: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Messages by WhatsApp ID, looking in archives only for IDs not found hot"""
+        messages = await db[HOT_COLLECTION].find(
+            {"whatsapp_message_id": {"$in": message_ids}}
+        ).max_time_ms(max_time_ms).to_list(len(message_ids) or 1)
+
+        missing = set(message_ids) - {msg.get("whatsapp_message_id") for msg in messages}
+        searched = set()
+        for refresh in (False, True):
+            # Second pass: months archived by another process since the registry was cached
+            for collection in (await self.archive_collections(db, refresh=refresh)) if missing else []:
+                if collection in searched:
+                    continue
+                searched.add(collection)
+                archive_reads_total.labels(query="entity").inc()
+                found = await db[collection].find(
+                    {"whatsapp_message_id": {"$in": list(missing)}}
+                ).max_time_ms(max_time_ms).to_list(len(missing))
+                messages.extend(found)
+                missing -= {msg.get("whatsapp_message_id") for msg in found}
+                if not missing:
+                    break
+
+        messages.sort(key=lambda msg: msg["created_at"], reverse=True)
+        return messages
+
+    async def start(self) -> None:
+        """Start the background archive loop if enabled"""
+        if os.getenv("MESSAGE_ARCHIVE_ENABLED", "false").lower() != "true":
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background archive loop"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        from database.connection import Database
+
+        lock = None
+        while True:
+            try:
+                db = Database.get_db()
+                # One archiver across all workers and pods
+                lock = lock or DistributedLock(db, "message_archiver", ttl=int(self.interval * 2))
+                if await lock.acquire():
+                    await self.archive_once(db)
+            except Exception as e:
+                logger.error(f"Message archiver error: {e}")
+            await asyncio.sleep(self.interval)
+
+
+message_archiver = MessageArchiver(
+    hot_window_days=int(os.getenv("MESSAGE_HOT_WINDOW_DAYS", 90)),
+    batch_size=int(os.getenv("MESSAGE_ARCHIVE_BATCH_SIZE", 1000)),
+    interval=float(os.getenv("MESSAGE_ARCHIVE_INTERVAL", 3600))
+)
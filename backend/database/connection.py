@@ -1,51 +1,154 @@
 """Database Connection with Pooling"""
 import os
 import logging
+from typing import Dict, Optional
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
 from pymongo.server_api import ServerApi
 from pymongo.errors import ConnectionFailure
 
+from monitoring.metrics import database_commands_total, database_command_duration
+from utils.lifecycle import after_fork
+
 logger = logging.getLogger(__name__)
 
+DEFAULT_PROFILE = "default"
+ANALYTICS_PROFILE = "analytics"
+
+# Per-workload read profiles. Each profile gets its own client, and so its
+# own connection pool, read preference and server-side time limit.
+READ_PROFILES = {
+    DEFAULT_PROFILE: {
+        "readPreference": "primaryPreferred",
+        "maxPoolSize": int(os.getenv("MONGODB_MAX_POOL_SIZE", 50)),
+        "minPoolSize": int(os.getenv("MONGODB_MIN_POOL_SIZE", 10)),
+        "socketTimeoutMS": 45000,
+        "max_time_ms": None
+    },
+    ANALYTICS_PROFILE: {
+        "readPreference": "secondaryPreferred",
+        "maxStalenessSeconds": int(os.getenv("MONGODB_ANALYTICS_MAX_STALENESS_SECONDS", 120)),
+        "maxPoolSize": int(os.getenv("MONGODB_ANALYTICS_MAX_POOL_SIZE", 10)),
+        "minPoolSize": 0,
+        "socketTimeoutMS": 120000,
+        "max_time_ms": int(os.getenv("MONGODB_ANALYTICS_MAX_TIME_MS", 15000))
+    }
+}
+
+
+class ProfileCommandListener(monitoring.CommandListener):
+    """Records which read profile served each database command"""
+    
+    def __init__(self, profile: str):
+        self.profile = profile
+    
+    def started(self, event):
+        pass
+    
+    def succeeded(self, event):
+        self._record(event, "success")
+    
+    def failed(self, event):
+        self._record(event, "failure")
+    
+    def _record(self, event, outcome: str):
+        database_commands_total.labels(
+            profile=self.profile,
+            command=event.command_name,
+            outcome=outcome
+        ).inc()
+        database_command_duration.labels(
+            profile=self.profile,
+            command=event.command_name
+        ).observe(event.duration_micros / 1_000_000)
+
+
 class Database:
     """MongoDB Database Connection Manager"""
     
     client: AsyncIOMotorClient = None
+    profile_clients: Dict[str, AsyncIOMotorClient] = {}
+    
+    @classmethod
+    def _create_client(cls, profile: str) -> AsyncIOMotorClient:
+        """Create a pooled client for a read profile"""
+        settings = {k: v for k, v in READ_PROFILES[profile].items() if k != "max_time_ms"}
+        
+        return AsyncIOMotorClient(
+            os.getenv("MONGODB_URI"),
+            server_api=ServerApi('1'),
+            maxIdleTimeMS=45000,
+            waitQueueTimeoutMS=5000,
+            connectTimeoutMS=10000,
+            retryWrites=True,
+            w='majority',
+            event_listeners=[ProfileCommandListener(profile)],
+            appname=f"madio-erp-{profile}",
+            **settings
+        )
     
     @classmethod
     async def connect_db(cls):
-        """Initialize database connection with pooling"""
+        """Initialize database connections with pooling"""
         try:
-            cls.client = AsyncIOMotorClient(
-                os.getenv("MONGODB_URI"),
-                server_api=ServerApi('1'),
-                maxPoolSize=int(os.getenv("MONGODB_MAX_POOL_SIZE", 50)),
-                minPoolSize=int(os.getenv("MONGODB_MIN_POOL_SIZE", 10)),
-                maxIdleTimeMS=45000,
-                waitQueueTimeoutMS=5000,
-                connectTimeoutMS=10000,
-                socketTimeoutMS=45000,
-                retryWrites=True,
-                w='majority',
-                readPreference='primaryPreferred'
-            )
+            cls.client = cls._create_client(DEFAULT_PROFILE)
+            cls.profile_clients = {DEFAULT_PROFILE: cls.client}
             
             # Test connection
             await cls.client.admin.command('ping')
             logger.info("✓ MongoDB connection established with pooling")
             
+            # Analytics pool connects lazily on first use
+            for profile in READ_PROFILES:
+                if profile not in cls.profile_clients:
+                    cls.profile_clients[profile] = cls._create_client(profile)
+            
+            await cls._run_startup_migrations()
+        
         except ConnectionFailure as e:
             logger.error(f"✗ MongoDB connection failed: {e}")
             raise
     
+    @classmethod
+    async def _run_startup_migrations(cls):
+        """Apply pending migrations and verify query plans if enabled"""
+        from database.migrations import MigrationRunner
+        from database.index_advisor import check_query_plans, MODE_OFF
+        
+        db = cls.get_db()
+        
+        if os.getenv("MONGODB_MIGRATE_ON_STARTUP", "false").lower() == "true":
+            await MigrationRunner(db).run()
+        
+        advisor_mode = os.getenv("INDEX_ADVISOR_MODE", MODE_OFF)
+        if advisor_mode != MODE_OFF:
+            await check_query_plans(db, mode=advisor_mode)
+    
     @classmethod
     async def close_db(cls):
-        """Close database connection"""
+        """Flush buffered writes, then close database connections"""
+        from database.write_buffer import write_buffer
+        
         if cls.client:
-            cls.client.close()
+            await write_buffer.stop()
+            for client in cls.profile_clients.values():
+                client.close()
             logger.info("✓ MongoDB connection closed")
     
     @classmethod
-    def get_db(cls):
-        """Get database instance"""
-        return cls.client[os.getenv("MONGODB_DATABASE", "madio_erp")]
+    def get_db(cls, profile: str = DEFAULT_PROFILE):
+        """Get database instance for a read profile"""
+        client = cls.profile_clients.get(profile, cls.client)
+        return client[os.getenv("MONGODB_DATABASE", "madio_erp")]
+    
+    @classmethod
+    def max_time_ms(cls, profile: str = DEFAULT_PROFILE) -> Optional[int]:
+        """Server-side time limit for queries issued under a profile"""
+        return READ_PROFILES.get(profile, {}).get("max_time_ms")
+
+
+@after_fork
+def _forget_clients() -> None:
+    """MongoDB clients are not fork-safe; each worker connects in its own startup"""
+    Database.client = None
+    Database.profile_clients = {}
@@ -0,0 +1,175 @@
+"""Conversation Key Backfill
+
+Messages and entity links are stored with a `conversation_key`, the
+contact's normalized number (utils/phone.py), computed once at write time
+for both directions. Documents written before that are filled in online:
+one worker across all pods walks each collection in `_id` order, a batch
+at a time with a pause in between, and checkpoints its position in
+`whatsapp_backfills`, so a restart resumes where it stopped.
+
+Until the backfill has completed, conversation queries stay on the legacy
+`other_party` field (set on inbound messages only). Every worker switches
+`conversation_keys.field` over once it sees the backfill marked complete.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from pymongo import UpdateOne
+
+from database.locks import DistributedLock
+from monitoring.metrics import conversation_keys_backfilled_total
+from utils.phone import conversation_key
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_COLLECTION = "whatsapp_backfills"
+BACKFILL_ID = "conversation_key"
+
+KEY_FIELD = "conversation_key"
+LEGACY_FIELD = "other_party"
+
+_PROJECTION = {KEY_FIELD: 1, "other_party": 1, "from_phone": 1, "to_phone": 1, "direction": 1}
+
+
+def message_conversation_key(doc: Dict[str, Any]) -> Optional[str]:
+    """Conversation key for a stored message or entity link, from its contact number"""
+    contact = doc.get("other_party")
+    if not contact:
+        contact = doc.get("from_phone") if doc.get("direction") == "inbound" else doc.get("to_phone")
+    return conversation_key(contact) if contact else None
+
+
+class ConversationKeyBackfill:
+    """Adds conversation keys to documents stored before they existed"""
+
+    def __init__(
+        self,
+        batch_size: int = 500,
+        batch_pause: float = 0.5,
+        interval: float = 60,
+        lock_ttl: int = 120
+    ):
+        """
+        Args:
+            batch_size: Documents read and updated per batch
+            batch_pause: Seconds to sleep between batches to limit load
+            interval: Seconds between checks for completion (and retries after errors)
+            lock_ttl: Leader lease length in seconds, renewed every batch
+        """
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause
+        self.interval = interval
+        self.lock_ttl = lock_ttl
+        self.field = LEGACY_FIELD
+        self._task: Optional[asyncio.Task] = None
+
+    async def refresh(self, db) -> bool:
+        """Switch queries to the key field once the backfill has completed"""
+        if self.field != KEY_FIELD:
+            state = await db[BACKFILL_COLLECTION].find_one({"_id": BACKFILL_ID}, {"completed_at": 1})
+            if state and state.get("completed_at"):
+                self.field = KEY_FIELD
+                logger.info("Conversation queries now use conversation_key")
+        return self.field == KEY_FIELD
+
+    async def backfill_once(self, db, lock: Optional[DistributedLock] = None) -> int:
+        """Resume the backfill and run it to completion, returning the documents updated
+
+        Stops early, without marking completion, if `lock` is lost.
+        """
+        from database.archive import HOT_COLLECTION, message_archiver
+
+        state = await db[BACKFILL_COLLECTION].find_one({"_id": BACKFILL_ID}) or {}
+        positions = state.get("positions", {})
+        collections = [HOT_COLLECTION, "whatsapp_entity_links", *await message_archiver.archive_collections(db)]
+
+        updated = 0
+        for collection in collections:
+            last_id = positions.get(collection)
+            while True:
+                if lock is not None and not await lock.acquire():
+                    logger.warning("Conversation key backfill lost its lease; stopping")
+                    return updated
+
+                batch = await db[collection].find(
+                    {"_id": {"$gt": last_id}} if last_id is not None else {},
+                    _PROJECTION
+                ).sort("_id", 1).limit(self.batch_size).to_list(self.batch_size)
+                if not batch:
+                    break
+
+                updated += await self._update_batch(db, collection, batch)
+                last_id = batch[-1]["_id"]
+                await db[BACKFILL_COLLECTION].update_one(
+                    {"_id": BACKFILL_ID},
+                    {"$set": {f"positions.{collection}": last_id, "updated_at": datetime.utcnow()}},
+                    upsert=True
+                )
+                await asyncio.sleep(self.batch_pause)
+
+        await db[BACKFILL_COLLECTION].update_one(
+            {"_id": BACKFILL_ID},
+            {"$set": {"completed_at": datetime.utcnow()}},
+            upsert=True
+        )
+        logger.info(f"✓ Conversation key backfill complete ({updated} documents updated in this run)")
+        return updated
+
+    async def _update_batch(self, db, collection: str, batch: List[Dict[str, Any]]) -> int:
+        operations = []
+        for doc in batch:
+            key = None if doc.get(KEY_FIELD) else message_conversation_key(doc)
+            if key is None:
+                continue
+            fields = {KEY_FIELD: key}
+            if not doc.get("other_party"):
+                # Outbound messages used to be stored without it
+                fields["other_party"] = key
+            operations.append(UpdateOne({"_id": doc["_id"], KEY_FIELD: {"$exists": False}}, {"$set": fields}))
+
+        if not operations:
+            return 0
+        result = await db[collection].bulk_write(operations, ordered=False)
+        conversation_keys_backfilled_total.labels(collection=collection).inc(result.modified_count)
+        return result.modified_count
+
+    async def start(self) -> None:
+        """Start watching for (and, if enabled, running) the backfill"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the backfill loop; it resumes from its checkpoint next start"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        from database.connection import Database
+
+        enabled = os.getenv("CONVERSATION_KEY_BACKFILL_ENABLED", "true").lower() == "true"
+        lock = None
+        while True:
+            try:
+                db = Database.get_db()
+                if not await self.refresh(db) and enabled:
+                    # One backfill across all workers and pods
+                    lock = lock or DistributedLock(db, "conversation_key_backfill", ttl=self.lock_ttl)
+                    if await lock.acquire():
+                        await self.backfill_once(db, lock)
+                        await self.refresh(db)
+                if self.field == KEY_FIELD:
+                    return
+            except Exception as e:
+                logger.error(f"Conversation key backfill error: {e}")
+            await asyncio.sleep(self.interval)
+
+
+conversation_keys = ConversationKeyBackfill(
+    batch_size=int(os.getenv("CONVERSATION_KEY_BACKFILL_BATCH_SIZE", 500)),
+    batch_pause=float(os.getenv("CONVERSATION_KEY_BACKFILL_PAUSE", 0.5))
+)
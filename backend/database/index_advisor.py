@@ -0,0 +1,206 @@
+"""Index Advisor: explain() every query shape the API issues
+
+Each shape mirrors a query in routes/ (filters use representative values).
+The advisor asks the server for the winning plan and reports collection
+scans and in-memory sorts. Keep build_query_shapes() in sync with the routes.
+"""
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+MODE_OFF = "off"
+MODE_WARN = "warn"
+MODE_FAIL = "fail"
+
+
+class IndexAdvisorError(Exception):
+    """Raised in fail mode when a query shape has a bad plan"""
+
+
+class QueryShape:
+    """A query issued by the API, in explainable form"""
+
+    def __init__(
+        self,
+        name: str,
+        collection: str,
+        command: Dict[str, Any],
+        allow_in_memory_sort: bool = False
+    ):
+        """
+        Args:
+            name: Identifier used in reports
+            collection: Target collection
+            command: Explainable command body (find, aggregate, update, count, distinct)
+            allow_in_memory_sort: Accept a blocking sort (e.g. over a small, bounded result)
+        """
+        self.name = name
+        self.collection = collection
+        self.command = command
+        self.allow_in_memory_sort = allow_in_memory_sort
+
+
+def build_query_shapes() -> List[QueryShape]:
+    """Query shapes issued by routes/, services/ and auth/jwt_handler.py
+
+    Archive collections share the hot collection's conversation and
+    message ID indexes, so only hot-tier shapes are listed. Conversation
+    shapes use `conversation_key`, which queries switch to once the
+    backfill in database/conversation_keys.py has completed.
+    """
+    phone = "919876543210"
+    since = datetime.utcnow() - timedelta(days=30)
+
+    return [
+        QueryShape("conversations", "whatsapp_messages", {
+            "aggregate": "whatsapp_messages",
+            "pipeline": [
+                {"$sort": {"conversation_key": 1, "created_at": -1}},
+                {"$group": {"_id": "$conversation_key", "last_message": {"$first": "$$ROOT"}}}
+            ],
+            "cursor": {}
+        }),
+        QueryShape("conversation_messages", "whatsapp_messages", {
+            "find": "whatsapp_messages",
+            "filter": {"conversation_key": phone, "created_at": {"$lt": datetime.now()}},
+            "sort": {"created_at": -1},
+            "limit": 1000
+        }),
+        QueryShape("conversation_unread_counts", "whatsapp_messages", {
+            "aggregate": "whatsapp_messages",
+            "pipeline": [
+                {"$match": {"direction": "inbound", "$or": [
+                    {"conversation_key": phone, "created_at": {"$gt": since}},
+                    {"conversation_key": "919800000000", "read": False}
+                ]}},
+                {"$group": {"_id": "$conversation_key", "count": {"$sum": 1}}}
+            ],
+            "cursor": {}
+        }),
+        QueryShape("read_watermarks", "whatsapp_read_state", {
+            "find": "whatsapp_read_state",
+            "filter": {"_id": {"$in": [phone]}}
+        }),
+        QueryShape("entity_links", "whatsapp_entity_links", {
+            "find": "whatsapp_entity_links",
+            "filter": {"entity_type": "project", "entity_id": "project_123"},
+            "limit": 1000
+        }),
+        # Sorting on textScore always happens in memory, over matched documents only
+        QueryShape("message_search", "whatsapp_messages", {
+            "aggregate": "whatsapp_messages",
+            "pipeline": [
+                {"$match": {"$text": {"$search": "quotation"}, "direction": "inbound"}},
+                {"$addFields": {"score": {"$meta": "textScore"}}},
+                {"$sort": {"score": -1, "created_at": -1, "_id": -1}},
+                {"$limit": 21}
+            ],
+            "cursor": {}
+        }, allow_in_memory_sort=True),
+        QueryShape("contact_entity_link", "whatsapp_entity_links", {
+            "find": "whatsapp_entity_links",
+            "filter": {"conversation_key": phone},
+            "sort": {"created_at": -1},
+            "limit": 1
+        }),
+        QueryShape("contact_last_inbound", "whatsapp_messages", {
+            "find": "whatsapp_messages",
+            "filter": {"conversation_key": phone, "direction": "inbound"},
+            "projection": {"to_phone": 1},
+            "sort": {"created_at": -1},
+            "limit": 1
+        }),
+        QueryShape("entity_messages", "whatsapp_messages", {
+            "find": "whatsapp_messages",
+            "filter": {"whatsapp_message_id": {"$in": ["wamid.1", "wamid.2"]}}
+        }),
+        QueryShape("stats_breakdown", "whatsapp_messages", {
+            "aggregate": "whatsapp_messages",
+            "pipeline": [
+                {"$match": {"created_at": {"$gte": since}}},
+                {"$group": {"_id": {"direction": "$direction", "type": "$message_type"}, "count": {"$sum": 1}}}
+            ],
+            "cursor": {}
+        }),
+        QueryShape("stats_conversations", "whatsapp_messages", {
+            "distinct": "whatsapp_messages",
+            "key": "conversation_key",
+            "query": {"created_at": {"$gte": since}}
+        }),
+        QueryShape("refresh_token_lookup", "refresh_tokens", {
+            "find": "refresh_tokens",
+            "filter": {"jti": "example", "revoked": False},
+            "limit": 1
+        }),
+    ]
+
+
+def _plan_stages(node: Any, stages: List[str]) -> None:
+    """Collect `stage` names from a (classic or SBE) plan tree"""
+    if isinstance(node, dict):
+        if "stage" in node:
+            stages.append(node["stage"])
+        for key, value in node.items():
+            if key not in ("rejectedPlans", "slotBasedPlan"):
+                _plan_stages(value, stages)
+    elif isinstance(node, list):
+        for item in node:
+            _plan_stages(item, stages)
+
+
+def _pipeline_sorts_before_group(explain: Dict[str, Any]) -> bool:
+    """Aggregation $sort that was not pushed into the query layer"""
+    for stage in explain.get("stages", []):
+        if "$group" in stage:
+            return False
+        if "$sort" in stage:
+            return True
+    return False
+
+
+def analyze_plan(shape: QueryShape, explain: Dict[str, Any]) -> List[str]:
+    """Problems found in an explain() result"""
+    stages: List[str] = []
+    _plan_stages(explain, stages)
+
+    problems = []
+    if "COLLSCAN" in stages:
+        problems.append("COLLSCAN")
+    if not shape.allow_in_memory_sort and (
+        "SORT" in stages or _pipeline_sorts_before_group(explain)
+    ):
+        problems.append("in-memory SORT")
+    return problems
+
+
+async def explain_shape(db, shape: QueryShape) -> Dict[str, Any]:
+    """Run explain() for a query shape"""
+    return await db.command({"explain": shape.command, "verbosity": "queryPlanner"})
+
+
+async def check_query_plans(db, mode: str = MODE_WARN, shapes: Optional[List[QueryShape]] = None) -> Dict[str, List[str]]:
+    """Explain every query shape and report bad plans
+
+    Returns a mapping of shape name to problems (empty when the plan is
+    fine). Raises IndexAdvisorError in fail mode if any shape has problems.
+    """
+    if mode == MODE_OFF:
+        return {}
+
+    report = {}
+    for shape in shapes or build_query_shapes():
+        explain = await explain_shape(db, shape)
+        report[shape.name] = analyze_plan(shape, explain)
+
+    bad = {name: problems for name, problems in report.items() if problems}
+    for name, problems in bad.items():
+        logger.warning(f"Index advisor: query shape '{name}' uses {', '.join(problems)}")
+
+    if bad and mode == MODE_FAIL:
+        raise IndexAdvisorError(f"Query shapes without index support: {bad}")
+
+    if not bad:
+        logger.info(f"✓ Index advisor: {len(report)} query shapes use indexes")
+    return report
@@ -0,0 +1,142 @@
+"""Leased Work Queues backed by MongoDB
+
+Shared by the outbox and the background job queue. Items move queued ->
+<active status> -> a final status. Claiming an item moves its due field
+to the lease expiry, so queued items and abandoned leases are found by
+the same index, and stamps it with a fresh lease token. The holder
+renews the lease while it works, and records the outcome only if the
+token is still its own: a holder that stalled past its lease cannot
+overwrite the outcome of whoever claimed the item after it.
+"""
+import asyncio
+import logging
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Dict, Optional
+
+from pymongo import ReturnDocument
+
+from database.connection import Database
+
+logger = logging.getLogger(__name__)
+
+STATUS_QUEUED = "queued"
+
+
+class LeasedQueue:
+    """Claim, renew and settle items of a Mongo collection under leases"""
+
+    def __init__(
+        self,
+        collection: str,
+        due_field: str,
+        active_status: str,
+        lease_seconds: float = 60.0,
+        retention_days: int = 7
+    ):
+        """
+        Args:
+            collection: Collection holding the items
+            due_field: Field holding when an item is due, or its lease expiry while claimed
+            active_status: Status of a claimed item
+            lease_seconds: Lease length; renewed every third of it while held
+            retention_days: Days finished items are kept
+        """
+        self.collection = collection
+        self.due_field = due_field
+        self.active_status = active_status
+        self.lease_seconds = lease_seconds
+        self.retention_days = retention_days
+
+    async def _claim_next(self, match: Dict[str, Any], **fields) -> Optional[Dict[str, Any]]:
+        """Lease the next due item matching `match`, counting an attempt
+
+        Args:
+            match: Extra filter (lane, job type)
+            **fields: Extra fields to set on the claimed item
+        """
+        now = datetime.now()
+        return await Database.get_db()[self.collection].find_one_and_update(
+            {
+                **match,
+                "status": {"$in": [STATUS_QUEUED, self.active_status]},
+                self.due_field: {"$lte": now}
+            },
+            {
+                "$set": {
+                    **fields,
+                    "status": self.active_status,
+                    self.due_field: now + timedelta(seconds=self.lease_seconds),
+                    "lease_token": uuid.uuid4().hex,
+                    "updated_at": now
+                },
+                "$inc": {"attempts": 1}
+            },
+            sort=[(self.due_field, 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    @asynccontextmanager
+    async def _hold(self, item: Dict[str, Any]) -> AsyncIterator[None]:
+        """Keep an item's lease renewed while the block runs"""
+        renewal = asyncio.create_task(self._renew(item))
+        try:
+            yield
+        finally:
+            renewal.cancel()
+            await asyncio.gather(renewal, return_exceptions=True)
+
+    async def _renew(self, item: Dict[str, Any]) -> None:
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                result = await Database.get_db()[self.collection].update_one(
+                    self._owned(item),
+                    {"$set": {self.due_field: datetime.now() + timedelta(seconds=self.lease_seconds)}}
+                )
+            except Exception as e:
+                logger.warning(f"Lease renewal for {self.collection} {item['_id']} failed: {e}")
+                continue
+            if not result.matched_count:
+                logger.warning(f"Lease on {self.collection} {item['_id']} was lost")
+                return
+
+    async def _requeue(self, item: Dict[str, Any], delay: float, **fields) -> bool:
+        """Put a held item back in the queue after `delay` seconds; False if the lease was lost"""
+        now = datetime.now()
+        result = await Database.get_db()[self.collection].update_one(
+            self._owned(item),
+            {"$set": {
+                **fields,
+                "status": STATUS_QUEUED,
+                self.due_field: now + timedelta(seconds=delay),
+                "updated_at": now
+            }}
+        )
+        return self._settled(item, result)
+
+    async def _complete(self, item: Dict[str, Any], status: str, **fields) -> bool:
+        """Record a held item's final status; False if the lease was lost"""
+        now = datetime.now()
+        result = await Database.get_db()[self.collection].update_one(
+            self._owned(item),
+            {"$set": {
+                **fields,
+                "status": status,
+                "completed_at": now,
+                "updated_at": now,
+                # TTL index removes finished items (and frees their keys)
+                "expire_at": now + timedelta(days=self.retention_days)
+            }}
+        )
+        return self._settled(item, result)
+
+    def _owned(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        return {"_id": item["_id"], "status": self.active_status, "lease_token": item["lease_token"]}
+
+    def _settled(self, item: Dict[str, Any], result) -> bool:
+        if result.matched_count:
+            return True
+        logger.warning(f"{self.collection} {item['_id']} was re-claimed after its lease expired; outcome dropped")
+        return False
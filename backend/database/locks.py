@@ -0,0 +1,72 @@
+"""Distributed Leader Lock backed by MongoDB"""
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+
+class DistributedLock:
+    """Lease-based lock shared by all workers and pods
+
+    The lock document's `_id` is the lock name. Acquisition either inserts
+    it or takes over an expired lease; a live lease held by another owner
+    makes the upsert collide on `_id` and fail.
+    """
+
+    def __init__(self, db, name: str, ttl: int = 300):
+        """
+        Args:
+            db: Motor database
+            name: Lock name
+            ttl: Lease length in seconds
+        """
+        self.collection = db.distributed_locks
+        self.name = name
+        self.ttl = ttl
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    async def acquire(self) -> bool:
+        """Try to take (or renew) the lease"""
+        now = datetime.utcnow()
+        try:
+            await self.collection.find_one_and_update(
+                {
+                    "_id": self.name,
+                    "$or": [
+                        {"expires_at": {"$lt": now}},
+                        {"owner": self.owner}
+                    ]
+                },
+                {
+                    "$set": {
+                        "owner": self.owner,
+                        "acquired_at": now,
+                        "expires_at": now + timedelta(seconds=self.ttl)
+                    }
+                },
+                upsert=True
+            )
+            return True
+        except DuplicateKeyError:
+            return False
+
+    async def release(self) -> None:
+        """Drop the lease if we still hold it"""
+        await self.collection.delete_one({"_id": self.name, "owner": self.owner})
+
+    async def wait_acquire(self, timeout: float, poll_interval: float = 2.0) -> bool:
+        """Retry acquisition until it succeeds or `timeout` seconds pass"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            if await self.acquire():
+                return True
+            if loop.time() >= deadline:
+                return False
+            await asyncio.sleep(poll_interval)
@@ -0,0 +1,256 @@
+"""Versioned Schema and Index Migrations
+
+Migrations run in version order, each exactly once per database, under a
+leader lock so only one worker or pod applies them. Every migration must
+be idempotent: a crash halfway through is fixed by running it again.
+"""
+import logging
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List
+
+from pymongo import IndexModel
+from pymongo.errors import CollectionInvalid, OperationFailure
+
+from database.locks import DistributedLock
+
+logger = logging.getLogger(__name__)
+
+# Server error codes for an index that exists under a different name/options
+INDEX_CONFLICT_CODES = {85, 86}
+
+
+class MigrationError(Exception):
+    """Raised when a migration cannot be applied"""
+
+
+class Migration:
+    """A single schema change"""
+
+    def __init__(self, version: int, description: str, apply: Callable[..., Awaitable[None]]):
+        """
+        Args:
+            version: Monotonic version number
+            description: Short human-readable summary
+            apply: Coroutine function taking the database
+        """
+        self.version = version
+        self.description = description
+        self.apply = apply
+
+
+async def ensure_collection(db, name: str, **options) -> None:
+    """Create a collection unless it already exists"""
+    try:
+        await db.create_collection(name, **options)
+        logger.info(f"Created collection {name}")
+    except CollectionInvalid:
+        pass
+
+
+async def ensure_indexes(db, collection: str, indexes: List[Dict]) -> None:
+    """Create indexes, failing loudly on conflicting definitions
+
+    Each spec is `{"keys": [...], "name": ..., **options}`. Re-creating an
+    identical index is a no-op on the server.
+    """
+    models = [
+        IndexModel(spec["keys"], name=spec["name"], **{
+            k: v for k, v in spec.items() if k not in ("keys", "name")
+        })
+        for spec in indexes
+    ]
+    try:
+        await db[collection].create_indexes(models)
+    except OperationFailure as e:
+        if e.code in INDEX_CONFLICT_CODES:
+            raise MigrationError(f"Index conflict on {collection}: {e.details.get('errmsg', e)}")
+        raise
+    logger.info(f"Ensured {len(models)} indexes on {collection}")
+
+
+async def _initial_schema(db) -> None:
+    """Collections and indexes previously created by scripts/init_whatsapp_db.py"""
+    for name in ("whatsapp_messages", "whatsapp_entity_links", "refresh_tokens"):
+        await ensure_collection(db, name)
+
+    await ensure_indexes(db, "whatsapp_messages", [
+        {"keys": [("whatsapp_message_id", 1)], "unique": True, "name": "whatsapp_message_id_1"},
+        {"keys": [("other_party", 1), ("created_at", -1)], "name": "conversation_messages"},
+        {"keys": [("direction", 1), ("status", 1)], "name": "message_status"},
+        {"keys": [("created_at", -1)], "name": "created_at_desc"},
+        {"keys": [("from_user_id", 1), ("created_at", -1)], "name": "user_messages"},
+        {"keys": [("read", 1), ("direction", 1)], "name": "unread_inbound"}
+    ])
+
+    await ensure_indexes(db, "whatsapp_entity_links", [
+        {"keys": [("message_id", 1)], "name": "message_id_1"},
+        {"keys": [("entity_type", 1), ("entity_id", 1)], "name": "entity_lookup"},
+        {"keys": [("entity_id", 1)], "name": "entity_id_1"}
+    ])
+
+    await ensure_indexes(db, "refresh_tokens", [
+        {"keys": [("jti", 1)], "unique": True, "name": "jti_unique"},
+        {"keys": [("user_id", 1), ("revoked", 1)], "name": "user_active_tokens"},
+        {"keys": [("expires_at", 1)], "expireAfterSeconds": 0, "name": "token_expiry"}
+    ])
+
+
+async def _conversation_read_indexes(db) -> None:
+    """Cover the mark-as-read update_many in get_conversation_messages"""
+    await ensure_indexes(db, "whatsapp_messages", [
+        {"keys": [("other_party", 1), ("direction", 1), ("read", 1)], "name": "conversation_unread"}
+    ])
+
+
+async def _lock_expiry_index(db) -> None:
+    """Let abandoned leader locks be cleaned up by the server"""
+    await ensure_indexes(db, "distributed_locks", [
+        {"keys": [("expires_at", 1)], "expireAfterSeconds": 3600, "name": "lock_expiry"}
+    ])
+
+
+async def _read_watermark_indexes(db) -> None:
+    """Count inbound messages after a conversation's read watermark"""
+    await ensure_collection(db, "whatsapp_read_state")
+    await ensure_indexes(db, "whatsapp_messages", [
+        {"keys": [("other_party", 1), ("direction", 1), ("created_at", -1)], "name": "conversation_inbound_recency"}
+    ])
+
+
+async def _media_registry(db) -> None:
+    """Uploaded media IDs, dropped by the server once expired"""
+    await ensure_collection(db, "whatsapp_media_registry")
+    await ensure_indexes(db, "whatsapp_media_registry", [
+        {"keys": [("expires_at", 1)], "expireAfterSeconds": 0, "name": "media_expiry"}
+    ])
+
+
+async def _entity_link_contact_index(db) -> None:
+    """Find a contact's latest entity link for SharePoint folder layout"""
+    await ensure_indexes(db, "whatsapp_entity_links", [
+        {"keys": [("other_party", 1), ("created_at", -1)], "name": "contact_entity_links"}
+    ])
+
+
+async def _message_text_index(db) -> None:
+    """Full-text search over message bodies in the hot and archive tiers"""
+    from database.archive import ARCHIVE_REGISTRY, MESSAGE_TEXT_INDEX
+
+    await ensure_indexes(db, "whatsapp_messages", [MESSAGE_TEXT_INDEX])
+    async for entry in db[ARCHIVE_REGISTRY].find({}, {"_id": 1}):
+        await ensure_indexes(db, entry["_id"], [MESSAGE_TEXT_INDEX])
+
+
+async def _outbox(db) -> None:
+    """Queued sends: unique idempotency keys, due-entry lookup per lane, expiry"""
+    await ensure_collection(db, "whatsapp_outbox")
+    await ensure_indexes(db, "whatsapp_outbox", [
+        {"keys": [("idempotency_key", 1)], "unique": True, "name": "idempotency_key_1"},
+        {"keys": [("lane", 1), ("status", 1), ("next_attempt_at", 1)], "name": "outbox_due"},
+        {"keys": [("expire_at", 1)], "expireAfterSeconds": 0, "name": "outbox_expiry"}
+    ])
+
+
+async def _conversation_key_indexes(db) -> None:
+    """Conversation queries on the canonical key, in the hot and archive tiers"""
+    from database.archive import ARCHIVE_REGISTRY, ARCHIVE_INDEXES
+
+    await ensure_collection(db, "whatsapp_backfills")
+    await ensure_indexes(db, "whatsapp_messages", [
+        {"keys": [("conversation_key", 1), ("created_at", -1)], "name": "conversation_key_messages"},
+        {"keys": [("conversation_key", 1), ("direction", 1), ("created_at", -1)], "name": "conversation_key_inbound"}
+    ])
+    await ensure_indexes(db, "whatsapp_entity_links", [
+        {"keys": [("conversation_key", 1), ("created_at", -1)], "name": "conversation_key_entity_links"}
+    ])
+    async for entry in db[ARCHIVE_REGISTRY].find({}, {"_id": 1}):
+        await ensure_indexes(db, entry["_id"], ARCHIVE_INDEXES)
+
+
+async def _background_jobs(db) -> None:
+    """Job queue: unique keys, due-job lookup per type, expiry"""
+    await ensure_collection(db, "background_jobs")
+    await ensure_indexes(db, "background_jobs", [
+        {"keys": [("key", 1)], "unique": True, "name": "key_1"},
+        {"keys": [("job_type", 1), ("status", 1), ("next_run_at", 1)], "name": "jobs_due"},
+        {"keys": [("expire_at", 1)], "expireAfterSeconds": 0, "name": "jobs_expiry"}
+    ])
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "Initial WhatsApp, entity link and refresh token schema", _initial_schema),
+    Migration(2, "Conversation unread index for mark-as-read", _conversation_read_indexes),
+    Migration(3, "TTL index on distributed locks", _lock_expiry_index),
+    Migration(4, "Read watermark state and unread-count index", _read_watermark_indexes),
+    Migration(5, "Media registry with expiry TTL", _media_registry),
+    Migration(6, "Contact index on entity links", _entity_link_contact_index),
+    Migration(7, "Text index on message bodies", _message_text_index),
+    Migration(8, "Outbound message outbox", _outbox),
+    Migration(9, "Conversation key indexes", _conversation_key_indexes),
+    Migration(10, "Background job queue", _background_jobs),
+]
+
+
+class MigrationRunner:
+    """Applies pending migrations under a leader lock"""
+
+    def __init__(self, db, migrations: List[Migration] = None, lock_ttl: int = 600):
+        """
+        Args:
+            db: Motor database
+            migrations: Migrations to apply (defaults to MIGRATIONS)
+            lock_ttl: Leader lease length in seconds
+        """
+        self.db = db
+        self.migrations = sorted(migrations or MIGRATIONS, key=lambda m: m.version)
+        self.lock = DistributedLock(db, "schema_migrations", ttl=lock_ttl)
+
+    async def applied_versions(self) -> List[int]:
+        """Versions already recorded in schema_migrations"""
+        docs = await self.db.schema_migrations.find({}, {"_id": 1}).to_list(None)
+        return sorted(doc["_id"] for doc in docs)
+
+    async def pending(self) -> List[Migration]:
+        """Migrations not yet applied"""
+        applied = set(await self.applied_versions())
+        return [m for m in self.migrations if m.version not in applied]
+
+    async def run(self, wait_timeout: float = 300) -> List[int]:
+        """Apply pending migrations, returning the versions applied here
+
+        Workers that lose the leader election wait until the leader has
+        finished (or `wait_timeout` passes) so they never serve traffic
+        against a half-migrated schema.
+        """
+        if not await self.pending():
+            return []
+
+        if not await self.lock.wait_acquire(timeout=wait_timeout):
+            raise MigrationError(f"Timed out after {wait_timeout}s waiting for migration lock")
+
+        applied = []
+        try:
+            for migration in await self.pending():
+                logger.info(f"Applying migration {migration.version}: {migration.description}")
+                start_time = time.monotonic()
+                try:
+                    await migration.apply(self.db)
+                except Exception as e:
+                    raise MigrationError(f"Migration {migration.version} failed: {e}") from e
+
+                await self.db.schema_migrations.insert_one({
+                    "_id": migration.version,
+                    "description": migration.description,
+                    "applied_at": datetime.utcnow(),
+                    "duration_ms": round((time.monotonic() - start_time) * 1000)
+                })
+                applied.append(migration.version)
+                # Keep the lease alive across long index builds
+                await self.lock.acquire()
+        finally:
+            await self.lock.release()
+
+        if applied:
+            logger.info(f"✓ Applied migrations {applied}")
+        return applied
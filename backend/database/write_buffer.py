@@ -0,0 +1,252 @@
+"""Write-Behind Insert Buffer
+
+Coalesces single-document inserts per collection into unordered
+`insert_many` batches, flushed when a batch fills up or ages out.
+
+Durability modes, chosen per call:
+    immediate: plain `insert_one`, awaited (bypasses the buffer)
+    batched:   buffered, caller waits until its batch is acknowledged
+    deferred:  buffered with w=1, caller returns as soon as it is queued
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from bson import ObjectId
+from pymongo import WriteConcern
+from pymongo.errors import BulkWriteError, DuplicateKeyError, WriteError
+
+from monitoring.metrics import (
+    database_query_duration,
+    write_buffer_pending,
+    write_buffer_batch_size,
+    write_buffer_failed_total,
+)
+
+logger = logging.getLogger(__name__)
+
+DURABILITY_IMMEDIATE = "immediate"
+DURABILITY_BATCHED = "batched"
+DURABILITY_DEFERRED = "deferred"
+
+
+class WriteBufferFull(Exception):
+    """Raised when Mongo cannot keep up and the buffer stays full"""
+
+
+class _PendingInsert:
+    __slots__ = ("document", "future", "queued_at")
+
+    def __init__(self, document: Dict[str, Any], future: Optional[asyncio.Future]):
+        self.document = document
+        self.future = future
+        self.queued_at = time.monotonic()
+
+
+class WriteBehindBuffer:
+    """Per-collection insert coalescing with backpressure"""
+
+    def __init__(
+        self,
+        max_batch_size: int = 500,
+        flush_interval: float = 0.05,
+        max_pending: int = 10000,
+        enqueue_timeout: float = 5.0
+    ):
+        """
+        Args:
+            max_batch_size: Documents per insert_many
+            flush_interval: Seconds a document may wait before its batch is flushed
+            max_pending: Queued plus in-flight documents before callers are blocked
+            enqueue_timeout: Seconds a caller waits for space before WriteBufferFull
+        """
+        self.max_batch_size = max_batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.enqueue_timeout = enqueue_timeout
+
+        self._queues: Dict[Tuple[str, str], List[_PendingInsert]] = {}
+        self._flush_locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+        self._flushing: Set[Tuple[str, str]] = set()
+        self._flush_tasks: Set[asyncio.Task] = set()
+        self._pending_count = 0
+        self._space: Optional[asyncio.Condition] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def insert(
+        self,
+        collection: str,
+        document: Dict[str, Any],
+        durability: str = DURABILITY_BATCHED
+    ) -> ObjectId:
+        """Insert a document, returning its _id"""
+        document.setdefault("_id", ObjectId())
+
+        if durability == DURABILITY_IMMEDIATE:
+            from database.connection import Database
+            await Database.get_db()[collection].insert_one(document)
+            return document["_id"]
+
+        if durability not in (DURABILITY_BATCHED, DURABILITY_DEFERRED):
+            raise ValueError(f"Unknown durability mode: {durability}")
+
+        self._ensure_started()
+        await self._wait_for_space()
+
+        future = asyncio.get_running_loop().create_future() if durability == DURABILITY_BATCHED else None
+        key = (collection, durability)
+        queue = self._queues.setdefault(key, [])
+        queue.append(_PendingInsert(document, future))
+        self._pending_count += 1
+        write_buffer_pending.labels(collection=collection).inc()
+
+        if len(queue) >= self.max_batch_size:
+            self._wakeup.set()
+
+        if future is not None:
+            await future
+        return document["_id"]
+
+    async def flush(self, collection: Optional[str] = None) -> None:
+        """Flush everything queued (optionally for one collection)"""
+        keys = [key for key in list(self._queues) if collection is None or key[0] == collection]
+        await asyncio.gather(*(self._flush_key(key, drain=True) for key in keys))
+
+    async def stop(self) -> None:
+        """Stop the flusher and write out everything still queued"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await asyncio.gather(*self._flush_tasks, return_exceptions=True)
+        await self.flush()
+        logger.info("✓ Write buffer flushed")
+
+    def _ensure_started(self) -> None:
+        if self._task is None or self._task.done():
+            self._space = asyncio.Condition()
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def _wait_for_space(self) -> None:
+        """Backpressure: block callers while too many documents are outstanding"""
+        if self._pending_count < self.max_pending:
+            return
+        async with self._space:
+            try:
+                await asyncio.wait_for(
+                    self._space.wait_for(lambda: self._pending_count < self.max_pending),
+                    timeout=self.enqueue_timeout
+                )
+            except asyncio.TimeoutError:
+                raise WriteBufferFull(
+                    f"Write buffer full ({self._pending_count} pending) for {self.enqueue_timeout}s"
+                )
+
+    async def _run(self) -> None:
+        """Flush batches that are full or older than flush_interval"""
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            now = time.monotonic()
+            due = [
+                key for key, queue in self._queues.items()
+                if queue and key not in self._flushing and (
+                    len(queue) >= self.max_batch_size
+                    or now - queue[0].queued_at >= self.flush_interval
+                )
+            ]
+            # Flushes run concurrently across collections, one at a time per collection
+            for key in due:
+                self._flushing.add(key)
+                task = asyncio.create_task(self._flush_key(key))
+                self._flush_tasks.add(task)
+                task.add_done_callback(lambda done, key=key: self._flush_done(done, key))
+
+    def _flush_done(self, task: asyncio.Task, key: Tuple[str, str]) -> None:
+        self._flush_tasks.discard(task)
+        self._flushing.discard(key)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Write buffer flush of {key[0]} failed: {task.exception()}")
+
+    async def _flush_key(self, key: Tuple[str, str], drain: bool = False) -> None:
+        lock = self._flush_locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            while self._queues.get(key):
+                queue = self._queues[key]
+                batch = queue[:self.max_batch_size]
+                del queue[:self.max_batch_size]
+                await self._write_batch(key, batch)
+                if not drain:
+                    break
+
+    async def _write_batch(self, key: Tuple[str, str], batch: List[_PendingInsert]) -> None:
+        from database.connection import Database
+        collection_name, durability = key
+
+        collection = Database.get_db()[collection_name]
+        if durability == DURABILITY_DEFERRED:
+            collection = collection.with_options(write_concern=WriteConcern(w=1))
+
+        # Callers fail unless the insert returns, so a cancelled flush still settles them
+        cancelled = WriteError("Insert was cancelled before it was acknowledged")
+        errors: Dict[int, Exception] = {index: cancelled for index in range(len(batch))}
+        start_time = time.monotonic()
+        try:
+            await collection.insert_many([item.document for item in batch], ordered=False)
+            errors = {}
+        except BulkWriteError as e:
+            errors = {}
+            for error in e.details.get("writeErrors", []):
+                error_class = DuplicateKeyError if error.get("code") == 11000 else WriteError
+                errors[error["index"]] = error_class(error.get("errmsg"), error.get("code"), error)
+        except Exception as e:
+            errors = {index: e for index in range(len(batch))}
+        finally:
+            database_query_duration.labels(
+                collection=collection_name,
+                operation="insert_many"
+            ).observe(time.monotonic() - start_time)
+            write_buffer_batch_size.labels(collection=collection_name).observe(len(batch))
+            await self._settle(collection_name, batch, errors)
+
+    async def _settle(
+        self,
+        collection_name: str,
+        batch: List[_PendingInsert],
+        errors: Dict[int, Exception]
+    ) -> None:
+        """Resolve a written batch's callers and release its space in the buffer"""
+        for index, item in enumerate(batch):
+            error = errors.get(index)
+            if item.future is not None and not item.future.done():
+                if error is not None:
+                    item.future.set_exception(error)
+                else:
+                    item.future.set_result(item.document["_id"])
+            elif error is not None:
+                logger.warning(f"Deferred insert into {collection_name} failed: {error}")
+
+        if errors:
+            write_buffer_failed_total.labels(collection=collection_name).inc(len(errors))
+
+        self._pending_count -= len(batch)
+        write_buffer_pending.labels(collection=collection_name).dec(len(batch))
+        if self._space is not None:
+            async with self._space:
+                self._space.notify_all()
+
+
+write_buffer = WriteBehindBuffer(
+    max_batch_size=int(os.getenv("WRITE_BUFFER_MAX_BATCH", 500)),
+    flush_interval=int(os.getenv("WRITE_BUFFER_FLUSH_MS", 50)) / 1000,
+    max_pending=int(os.getenv("WRITE_BUFFER_MAX_PENDING", 10000)),
+    enqueue_timeout=float(os.getenv("WRITE_BUFFER_ENQUEUE_TIMEOUT", 5))
+)
@@ -1,13 +1,26 @@
 """Gunicorn Production Configuration"""
-import multiprocessing
+import json
 import os
 
+from utils.lifecycle import run_after_fork, startup_report
+from utils.worker_sizing import apply_pool_sizes, plan_from_env
+
+# Time every import from here through the app preload
+startup_report.start_imports()
+
+# Allocates the worker recycle counter in the master, so workers share it
+# even with preload_app off
+import monitoring.metrics  # noqa: E402,F401
+
 # Server socket
 bind = f"0.0.0.0:{os.getenv('PORT', 8000)}"
 backlog = 2048
 
-# Worker processes
-workers = int(os.getenv("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+# Worker processes: GUNICORN_WORKERS=auto sizes from the cgroup CPU quota and
+# memory limit, and splits the connection budgets into per-worker pools
+sizing_plan = plan_from_env()
+apply_pool_sizes(sizing_plan)
+workers = sizing_plan["workers"]
 worker_class = "uvicorn.workers.UvicornWorker"
 worker_connections = 1000
 max_requests = 10000
@@ -33,3 +46,19 @@ limit_request_field_size = 8190
 # Server mechanics
 preload_app = True
 daemon = False
+
+# Lifecycle hooks
+def when_ready(server):
+    """Log the sizing plan and, with preload, the import breakdown"""
+    server.log.info(f"Worker sizing: {json.dumps(sizing_plan)}")
+    if preload_app:
+        startup_report.stop_imports()
+        server.log.info(f"App loaded: {json.dumps(startup_report.snapshot())}")
+
+def post_fork(server, worker):
+    """Drop clients and caches inherited from the master before the worker starts"""
+    from monitoring.worker_memory import worker_memory_guard
+
+    run_after_fork()
+    # The master replaces a worker that exits, so RSS recycling is safe here
+    worker_memory_guard.enable_recycling()
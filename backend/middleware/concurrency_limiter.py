@@ -0,0 +1,286 @@
+"""Adaptive Concurrency Limiting and Load Shedding Middleware
+
+Each worker keeps its own in-flight limit, adjusted from observed latency
+with a gradient rule: while recent latency stays close to the long-run
+baseline the limit grows, and as latency climbs above it the limit
+shrinks proportionally. Requests over the limit wait briefly in a
+priority queue; when that queue is full, or the wait runs out, they get
+503 with Retry-After instead of piling up until gunicorn's timeout.
+
+Webhooks and health checks are admitted ahead of everything else and
+may exceed the limit by a fixed headroom; analytics routes are shed
+first.
+
+Register it as the outermost HTTP middleware, ahead of RateLimiter:
+`app.middleware("http")(concurrency_limiter_from_env())`.
+"""
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import time
+from typing import Callable, List, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import JSONResponse
+
+from monitoring.metrics import (
+    concurrency_inflight,
+    concurrency_limit,
+    requests_shed_total
+)
+
+PRIORITY_CRITICAL = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+PRIORITY_NAMES = {
+    PRIORITY_CRITICAL: "critical",
+    PRIORITY_NORMAL: "normal",
+    PRIORITY_LOW: "low"
+}
+
+CRITICAL_PREFIXES = ("/api/whatsapp/webhook", "/health", "/ready", "/metrics")
+LOW_PRIORITY_PREFIXES = (
+    "/api/whatsapp/stats",
+    "/api/whatsapp/conversations",
+    "/api/whatsapp/entity-messages",
+    "/api/whatsapp/search"
+)
+
+
+def request_priority(path: str) -> int:
+    """Admission priority for a request path"""
+    if path.startswith(CRITICAL_PREFIXES):
+        return PRIORITY_CRITICAL
+    if path.startswith(LOW_PRIORITY_PREFIXES):
+        return PRIORITY_LOW
+    return PRIORITY_NORMAL
+
+
+class GradientLimit:
+    """Latency-gradient concurrency limit (after Netflix's Gradient2)
+
+    The baseline is the no-load latency: it follows drops immediately and
+    rises only slowly. The limit shrinks by the ratio of baseline to
+    recent latency once that exceeds `tolerance`, and otherwise grows by
+    roughly sqrt(limit) per window while the worker is busy.
+    """
+
+    def __init__(
+        self,
+        initial: int = 20,
+        min_limit: int = 4,
+        max_limit: int = 200,
+        tolerance: float = 1.5,
+        smoothing: float = 0.2,
+        window: float = 1.0,
+        long_window: int = 600
+    ):
+        """
+        Args:
+            initial: Starting in-flight limit
+            min_limit: Floor for the limit
+            max_limit: Ceiling for the limit
+            tolerance: Latency growth over the baseline tolerated before shrinking
+            smoothing: Weight of each new estimate in the limit
+            window: Seconds of samples per limit update
+            long_window: Windows over which the baseline drifts up to sustained latency
+        """
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self.window = window
+        self.long_decay = 1 / long_window
+
+        self.long_rtt: Optional[float] = None
+        self._last_short_rtt: Optional[float] = None
+        self._samples: List[float] = []
+        self._max_inflight = 0
+        self._window_start = time.monotonic()
+
+    @property
+    def short_rtt(self) -> Optional[float]:
+        """Average latency of the last completed window"""
+        return self._last_short_rtt or self.long_rtt
+
+    def on_sample(self, latency: float, inflight: int, dropped: bool = False) -> None:
+        """Record a completed request
+
+        Dropped requests (timeouts, 5xx) count as twice the baseline so a
+        failing dependency shrinks the limit even if it fails fast.
+        """
+        if dropped and self.long_rtt is not None:
+            latency = max(latency, self.long_rtt * 2)
+        self._samples.append(latency)
+        self._max_inflight = max(self._max_inflight, inflight)
+
+        now = time.monotonic()
+        if now - self._window_start >= self.window:
+            self._update()
+            self._window_start = now
+
+    def _update(self) -> None:
+        samples, self._samples = self._samples, []
+        max_inflight, self._max_inflight = self._max_inflight, 0
+        if not samples:
+            return
+
+        short_rtt = sum(samples) / len(samples)
+        self._last_short_rtt = short_rtt
+        if self.long_rtt is None:
+            self.long_rtt = short_rtt
+            return
+        if short_rtt < self.long_rtt:
+            # Faster than the baseline: that is the new no-load latency
+            self.long_rtt = short_rtt
+        else:
+            # Drift up slowly so a lasting change (new query, bigger payloads)
+            # is eventually accepted as normal rather than as overload
+            self.long_rtt += (short_rtt - self.long_rtt) * self.long_decay
+
+        # An idle worker has no evidence to grow on
+        if max_inflight < self.limit / 2:
+            return
+
+        gradient = max(0.5, min(1.0, self.tolerance * self.long_rtt / short_rtt))
+        queue_allowance = math.sqrt(self.limit)
+        estimate = self.limit * gradient + queue_allowance
+        self.limit = self.limit * (1 - self.smoothing) + estimate * self.smoothing
+        self.limit = max(self.min_limit, min(self.max_limit, self.limit))
+
+
+class AdaptiveConcurrencyLimiter:
+    """Per-worker adaptive concurrency limiting middleware"""
+
+    def __init__(
+        self,
+        limit: Optional[GradientLimit] = None,
+        queue_size: int = 50,
+        queue_timeout: float = 0.5,
+        critical_headroom: int = 20,
+        low_priority_share: float = 0.75
+    ):
+        """
+        Args:
+            limit: Limit algorithm (defaults to GradientLimit())
+            queue_size: Requests allowed to wait for a slot before shedding
+            queue_timeout: Seconds a queued request waits before shedding
+            critical_headroom: Slots above the limit reserved for critical routes
+            low_priority_share: Fraction of the limit analytics routes may use
+        """
+        self.limit = limit or GradientLimit()
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.critical_headroom = critical_headroom
+        self.low_priority_share = low_priority_share
+
+        self.inflight = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        concurrency_limit.set(self.limit.limit)
+
+    def _capacity(self, priority: int) -> float:
+        if priority == PRIORITY_CRITICAL:
+            return self.limit.limit + self.critical_headroom
+        if priority == PRIORITY_LOW:
+            return max(1, self.limit.limit * self.low_priority_share)
+        return self.limit.limit
+
+    def _retry_after(self) -> int:
+        """Seconds until the queue ahead should have drained"""
+        rtt = self.limit.short_rtt or 1.0
+        backlog = (self.inflight + len(self._waiters)) / max(self.limit.limit, 1)
+        return max(1, math.ceil(rtt * backlog))
+
+    async def _acquire(self, priority: int) -> Optional[str]:
+        """Take a slot; returns a shed reason if none could be had"""
+        queued_ahead = any(p <= priority for p, _, _ in self._waiters)
+        if not queued_ahead and self.inflight < self._capacity(priority):
+            self.inflight += 1
+            return None
+
+        if priority != PRIORITY_CRITICAL and len(self._waiters) >= self.queue_size:
+            return "queue_full"
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (priority, next(self._sequence), future)
+        heapq.heappush(self._waiters, entry)
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=self.queue_timeout)
+            return None
+        except asyncio.TimeoutError:
+            if future.done() and not future.cancelled():
+                # Granted just as the wait expired
+                return None
+            self._abandon(entry)
+            return "queue_timeout"
+        except BaseException:
+            # Client went away while queued; hand back a slot granted meanwhile
+            if future.done() and not future.cancelled():
+                self._release()
+            else:
+                self._abandon(entry)
+            raise
+
+    def _abandon(self, entry: Tuple[int, int, asyncio.Future]) -> None:
+        entry[2].cancel()
+        self._waiters.remove(entry)
+        heapq.heapify(self._waiters)
+
+    def _release(self) -> None:
+        self.inflight -= 1
+        while self._waiters:
+            priority, _, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            if self.inflight >= self._capacity(priority):
+                break
+            heapq.heappop(self._waiters)
+            self.inflight += 1
+            future.set_result(True)
+
+    async def __call__(self, request: Request, call_next: Callable):
+        """Admit, queue or shed a request"""
+        priority = request_priority(request.url.path)
+        reason = await self._acquire(priority)
+        if reason is not None:
+            requests_shed_total.labels(priority=PRIORITY_NAMES[priority], reason=reason).inc()
+            return JSONResponse(
+                status_code=503,
+                content={"detail": "Server is busy, please retry"},
+                headers={"Retry-After": str(self._retry_after())}
+            )
+
+        concurrency_inflight.set(self.inflight)
+        start_time = time.monotonic()
+        dropped = True
+        try:
+            response = await call_next(request)
+            dropped = response.status_code >= 500
+            return response
+        finally:
+            self.limit.on_sample(time.monotonic() - start_time, self.inflight, dropped=dropped)
+            self._release()
+            concurrency_limit.set(self.limit.limit)
+            concurrency_inflight.set(self.inflight)
+
+
+def concurrency_limiter_from_env() -> AdaptiveConcurrencyLimiter:
+    """Build the limiter from CONCURRENCY_* environment variables"""
+    return AdaptiveConcurrencyLimiter(
+        limit=GradientLimit(
+            initial=int(os.getenv("CONCURRENCY_INITIAL_LIMIT", 20)),
+            min_limit=int(os.getenv("CONCURRENCY_MIN_LIMIT", 4)),
+            max_limit=int(os.getenv("CONCURRENCY_MAX_LIMIT", 200)),
+            tolerance=float(os.getenv("CONCURRENCY_LATENCY_TOLERANCE", 1.5))
+        ),
+        queue_size=int(os.getenv("CONCURRENCY_QUEUE_SIZE", 50)),
+        queue_timeout=float(os.getenv("CONCURRENCY_QUEUE_TIMEOUT", 0.5)),
+        critical_headroom=int(os.getenv("CONCURRENCY_CRITICAL_HEADROOM", 20)),
+        low_priority_share=float(os.getenv("CONCURRENCY_LOW_PRIORITY_SHARE", 0.75))
+    )
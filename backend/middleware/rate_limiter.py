@@ -3,15 +3,53 @@ import os
 import time
 from fastapi import Request, HTTPException
 from redis import Redis
-from typing import Callable
+from redis.asyncio import Redis as AsyncRedis
+from typing import Callable, Optional
 
-redis_client = Redis(
-    host=os.getenv("REDIS_HOST", "localhost"),
-    port=int(os.getenv("REDIS_PORT", 6379)),
-    db=0,
-    decode_responses=True,
-    password=os.getenv("REDIS_PASSWORD", None)
-)
+from utils.lifecycle import after_fork
+
+_redis_client: Optional[Redis] = None
+_async_redis_client: Optional[AsyncRedis] = None
+
+def _redis_options() -> dict:
+    return {
+        "host": os.getenv("REDIS_HOST", "localhost"),
+        "port": int(os.getenv("REDIS_PORT", 6379)),
+        "db": 0,
+        "decode_responses": True,
+        "password": os.getenv("REDIS_PASSWORD", None)
+    }
+
+def get_redis() -> Redis:
+    """This process's Redis client, created on first use"""
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = Redis(**_redis_options())
+    return _redis_client
+
+def get_async_redis() -> AsyncRedis:
+    """This process's asyncio Redis client, for calls made on the event loop"""
+    global _async_redis_client
+    if _async_redis_client is None:
+        _async_redis_client = AsyncRedis(**_redis_options())
+    return _async_redis_client
+
+@after_fork
+def _forget_redis() -> None:
+    """Drop clients inherited from the parent without closing their sockets"""
+    global _redis_client, _async_redis_client
+    _redis_client = None
+    _async_redis_client = None
+
+async def close_redis() -> None:
+    """Close this process's Redis connections (lifespan shutdown)"""
+    global _redis_client, _async_redis_client
+    if _redis_client is not None:
+        _redis_client.close()
+        _redis_client = None
+    if _async_redis_client is not None:
+        await _async_redis_client.aclose()
+        _async_redis_client = None
 
 class RateLimiter:
     """Rate limiting middleware using sliding window"""
@@ -41,6 +79,7 @@ class RateLimiter:
         
         try:
             # Increment counter
+            redis_client = get_redis()
             current = redis_client.incr(key)
             
             if current == 1:
@@ -0,0 +1,207 @@
+"""Background Dependency Health Monitor
+
+Each worker checks its dependencies on independent, jittered intervals and
+keeps the latest result in memory, so readiness probes never call upstreams.
+"""
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+import httpx
+
+from config.whatsapp_config import whatsapp_config
+from monitoring.metrics import (
+    dependency_up,
+    dependency_check_duration_seconds,
+    dependency_circuit_state,
+)
+from utils.circuit_breaker import CircuitBreaker, CLOSED, STATE_VALUES
+
+logger = logging.getLogger(__name__)
+
+HEALTHY = "healthy"
+
+
+class DependencyCheck:
+    """Cached state of a single dependency check"""
+
+    def __init__(
+        self,
+        name: str,
+        check: Callable[[], Awaitable[None]],
+        interval: float,
+        timeout: float = 5.0,
+        max_age: Optional[float] = None
+    ):
+        """
+        Args:
+            name: Dependency name
+            check: Coroutine function raising on failure
+            interval: Seconds between checks
+            timeout: Seconds before a check counts as failed
+            max_age: Seconds after which a past success is considered stale
+        """
+        self.name = name
+        self.check = check
+        self.interval = interval
+        self.timeout = timeout
+        self.max_age = max_age or interval * 3
+        self.breaker = CircuitBreaker(name, reset_timeout=max(interval, 30.0))
+        self.status = "unknown"
+        self.last_success: Optional[float] = None
+        self.last_checked: Optional[float] = None
+        self.latency_ms: Optional[float] = None
+
+    def is_healthy(self) -> bool:
+        """Last check passed and is not stale"""
+        if self.status != HEALTHY or self.last_success is None:
+            return False
+        return time.monotonic() - self.last_success <= self.max_age
+
+    def snapshot(self) -> Dict:
+        """Serializable view of the cached result"""
+        now = time.monotonic()
+        status = self.status
+        if status == HEALTHY and not self.is_healthy():
+            status = "unhealthy: stale"
+
+        return {
+            "status": status,
+            "last_success_age_seconds": round(now - self.last_success, 1) if self.last_success else None,
+            "last_checked_age_seconds": round(now - self.last_checked, 1) if self.last_checked else None,
+            "latency_ms": self.latency_ms,
+            "circuit": self.breaker.state,
+            "consecutive_failures": self.breaker.consecutive_failures
+        }
+
+
+class HealthMonitor:
+    """Runs dependency checks in the background and caches the results"""
+
+    def __init__(self, jitter: float = 0.1):
+        """
+        Args:
+            jitter: Fraction of the interval to randomize sleeps by
+        """
+        self.jitter = jitter
+        self.checks: Dict[str, DependencyCheck] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def register(self, check: DependencyCheck) -> None:
+        """Add a dependency check"""
+        self.checks[check.name] = check
+
+    async def start(self) -> None:
+        """Start one check loop per dependency (idempotent)"""
+        for name, check in self.checks.items():
+            task = self._tasks.get(name)
+            if task is None or task.done():
+                self._tasks[name] = asyncio.create_task(self._run(check))
+        logger.info("✓ Health monitor started")
+
+    async def stop(self) -> None:
+        """Cancel all check loops"""
+        for task in self._tasks.values():
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        self._tasks.clear()
+
+    async def run_once(self, check: DependencyCheck) -> None:
+        """Run a single check, honoring its circuit breaker"""
+        if not check.breaker.allow():
+            check.status = "unhealthy: circuit open"
+            self._export(check)
+            return
+
+        start_time = time.monotonic()
+        try:
+            await asyncio.wait_for(check.check(), timeout=check.timeout)
+            check.status = HEALTHY
+            check.last_success = time.monotonic()
+            check.breaker.record_success()
+        except asyncio.TimeoutError:
+            check.status = f"unhealthy: timed out after {check.timeout}s"
+            check.breaker.record_failure()
+        except Exception as e:
+            check.status = f"unhealthy: {str(e)}"
+            check.breaker.record_failure()
+        finally:
+            check.last_checked = time.monotonic()
+            check.latency_ms = round((check.last_checked - start_time) * 1000, 1)
+            dependency_check_duration_seconds.labels(dependency=check.name).observe(
+                check.last_checked - start_time
+            )
+
+        self._export(check)
+
+    async def _run(self, check: DependencyCheck) -> None:
+        """Check loop for one dependency"""
+        while True:
+            try:
+                await self.run_once(check)
+            except Exception as e:
+                logger.error(f"Health check loop error for {check.name}: {e}")
+
+            delay = check.interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+            if check.breaker.state != CLOSED:
+                # Come back when the breaker allows a trial call
+                delay = min(delay, max(check.breaker.retry_after(), 1.0))
+            await asyncio.sleep(delay)
+
+    def _export(self, check: DependencyCheck) -> None:
+        """Publish check state to Prometheus"""
+        dependency_up.labels(dependency=check.name).set(1 if check.is_healthy() else 0)
+        dependency_circuit_state.labels(dependency=check.name).set(STATE_VALUES[check.breaker.state])
+
+    def is_ready(self) -> bool:
+        """All dependencies healthy"""
+        return all(check.is_healthy() for check in self.checks.values())
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Cached results for all dependencies"""
+        return {name: check.snapshot() for name, check in self.checks.items()}
+
+
+async def check_database() -> None:
+    """Ping MongoDB"""
+    from database.connection import Database
+    await Database.get_db().command('ping')
+
+
+async def check_redis() -> None:
+    """Ping Redis without blocking the event loop"""
+    from middleware.rate_limiter import get_redis
+    await asyncio.to_thread(get_redis().ping)
+
+
+async def check_sharepoint() -> None:
+    """Acquire (or reuse) a Microsoft Graph token"""
+    from services.whatsapp_service import get_whatsapp_service
+    # Shares the service's token cache, so probes don't force extra token requests
+    await get_whatsapp_service().sharepoint._get_access_token()
+
+
+async def check_whatsapp() -> None:
+    """Fetch the configured phone number from the Graph API"""
+    async with httpx.AsyncClient() as client:
+        response = await client.get(
+            f"{whatsapp_config.BASE_URL}/{whatsapp_config.PHONE_NUMBER_ID}",
+            headers={"Authorization": f"Bearer {whatsapp_config.ACCESS_TOKEN}"},
+            timeout=5.0
+        )
+        if response.status_code != 200:
+            raise Exception(f"status {response.status_code}")
+
+
+def _interval(name: str, default: float) -> float:
+    return float(os.getenv(f"HEALTH_CHECK_{name.upper()}_INTERVAL", default))
+
+
+health_monitor = HealthMonitor(jitter=float(os.getenv("HEALTH_CHECK_JITTER", 0.1)))
+health_monitor.register(DependencyCheck("database", check_database, _interval("database", 10)))
+health_monitor.register(DependencyCheck("redis", check_redis, _interval("redis", 10)))
+health_monitor.register(DependencyCheck("sharepoint", check_sharepoint, _interval("sharepoint", 300)))
+health_monitor.register(DependencyCheck("whatsapp", check_whatsapp, _interval("whatsapp", 120)))
@@ -1,7 +1,8 @@
 """Prometheus Metrics for Application Monitoring"""
-import psutil
+import multiprocessing
 from time import time
-from prometheus_client import Counter, Histogram, Gauge, generate_latest
+from prometheus_client import Counter, Histogram, Gauge, generate_latest, REGISTRY
+from prometheus_client.core import CounterMetricFamily
 from fastapi import Request, Response
 
 # HTTP Metrics
@@ -17,6 +18,22 @@ http_request_duration_seconds = Histogram(
     ['method', 'endpoint']
 )
 
+concurrency_limit = Gauge(
+    'concurrency_limit',
+    'Adaptive in-flight request limit of this worker'
+)
+
+concurrency_inflight = Gauge(
+    'concurrency_inflight',
+    'In-flight requests admitted by the concurrency limiter'
+)
+
+requests_shed_total = Counter(
+    'requests_shed_total',
+    'Requests rejected with 503 by the concurrency limiter',
+    ['priority', 'reason']
+)
+
 # Application Metrics
 active_users_gauge = Gauge(
     'active_users',
@@ -29,6 +46,65 @@ database_query_duration = Histogram(
     ['collection', 'operation']
 )
 
+database_commands_total = Counter(
+    'database_commands_total',
+    'Database commands by read profile',
+    ['profile', 'command', 'outcome']
+)
+
+database_command_duration = Histogram(
+    'database_command_duration_seconds',
+    'Database command duration by read profile',
+    ['profile', 'command']
+)
+
+write_buffer_pending = Gauge(
+    'write_buffer_pending',
+    'Documents queued or in flight in the write-behind buffer',
+    ['collection']
+)
+
+write_buffer_batch_size = Histogram(
+    'write_buffer_batch_size',
+    'Documents per write-behind insert_many',
+    ['collection'],
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000)
+)
+
+write_buffer_failed_total = Counter(
+    'write_buffer_failed_total',
+    'Buffered inserts rejected by MongoDB',
+    ['collection']
+)
+
+response_cache_requests_total = Counter(
+    'response_cache_requests_total',
+    'Cached endpoint requests by result (hit, miss, not_modified, bypass)',
+    ['route', 'result']
+)
+
+messages_archived_total = Counter(
+    'messages_archived_total',
+    'Messages moved from the hot collection to monthly archives'
+)
+
+archive_reads_total = Counter(
+    'archive_reads_total',
+    'Reads that fell through to an archive collection',
+    ['query']
+)
+
+conversation_keys_backfilled_total = Counter(
+    'conversation_keys_backfilled_total',
+    'Stored documents given a conversation key by the backfill',
+    ['collection']
+)
+
+read_state_flushes_total = Counter(
+    'read_state_flushes_total',
+    'Coalesced read watermark writes'
+)
+
 # WhatsApp Metrics
 whatsapp_messages_total = Counter(
     'whatsapp_messages_total',
@@ -36,12 +112,228 @@ whatsapp_messages_total = Counter(
     ['direction', 'type']
 )
 
+whatsapp_status_callbacks_total = Counter(
+    'whatsapp_status_callbacks_total',
+    'Delivery status callbacks received',
+    ['status']
+)
+
+whatsapp_status_flush_size = Histogram(
+    'whatsapp_status_flush_size',
+    'Coalesced status updates per bulk write',
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+)
+
+whatsapp_status_unmatched_total = Counter(
+    'whatsapp_status_unmatched_total',
+    'Coalesced status updates that matched no message at an earlier state'
+)
+
+webhook_dedup_checks_total = Counter(
+    'webhook_dedup_checks_total',
+    'Inbound webhook message ids checked for redelivery (new, duplicate_local, duplicate_redis, unavailable)',
+    ['result']
+)
+
+outbox_enqueued_total = Counter(
+    'outbox_enqueued_total',
+    'Sends written to the outbox',
+    ['lane']
+)
+
+outbox_dispatched_total = Counter(
+    'outbox_dispatched_total',
+    'Outbox send attempts by outcome (sent, retry, failed)',
+    ['lane', 'outcome']
+)
+
+outbox_queue_delay_seconds = Histogram(
+    'outbox_queue_delay_seconds',
+    'Time from enqueue until the Cloud API accepted the send',
+    ['lane'],
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900)
+)
+
 sharepoint_uploads_total = Counter(
     'sharepoint_uploads_total',
     'Total SharePoint uploads',
     ['status']
 )
 
+sharepoint_folders_created_total = Counter(
+    'sharepoint_folders_created_total',
+    'SharePoint folders created for media partitions'
+)
+
+# Background Job Metrics
+jobs_enqueued_total = Counter(
+    'jobs_enqueued_total',
+    'Background jobs queued',
+    ['job_type']
+)
+
+jobs_processed_total = Counter(
+    'jobs_processed_total',
+    'Background job runs by outcome (done, retry, failed)',
+    ['job_type', 'outcome']
+)
+
+jobs_running = Gauge(
+    'jobs_running',
+    'Background jobs running in this runner',
+    ['job_type']
+)
+
+job_duration_seconds = Histogram(
+    'job_duration_seconds',
+    'Background job run time',
+    ['job_type'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+)
+
+job_queue_delay_seconds = Histogram(
+    'job_queue_delay_seconds',
+    'Time from enqueue until a job first started',
+    ['job_type'],
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900)
+)
+
+# Dependency Health Metrics
+dependency_up = Gauge(
+    'dependency_up',
+    'Dependency health from background checks (1 = healthy)',
+    ['dependency']
+)
+
+dependency_check_duration_seconds = Histogram(
+    'dependency_check_duration_seconds',
+    'Background dependency check latency',
+    ['dependency']
+)
+
+dependency_circuit_state = Gauge(
+    'dependency_circuit_state',
+    'Dependency circuit breaker state (0 = closed, 1 = half-open, 2 = open)',
+    ['dependency']
+)
+
+upstream_queue_depth = Gauge(
+    'upstream_queue_depth',
+    'Outbound calls waiting for a concurrency slot',
+    ['upstream']
+)
+
+upstream_inflight = Gauge(
+    'upstream_inflight',
+    'Outbound calls in flight',
+    ['upstream']
+)
+
+upstream_requests_total = Counter(
+    'upstream_requests_total',
+    'Outbound call attempts by outcome (ok, throttled, error, rejected)',
+    ['upstream', 'outcome']
+)
+
+upstream_retries_total = Counter(
+    'upstream_retries_total',
+    'Outbound calls retried by the scheduler',
+    ['upstream', 'reason']
+)
+
+upstream_wait_seconds = Histogram(
+    'upstream_wait_seconds',
+    'Time outbound calls waited for a slot, Retry-After and pacing',
+    ['upstream'],
+    buckets=(0, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+
+upstream_circuit_state = Gauge(
+    'upstream_circuit_state',
+    'Request-path circuit breaker state (0 = closed, 1 = half-open, 2 = open)',
+    ['upstream']
+)
+
+temp_media_bytes = Gauge(
+    'temp_media_bytes',
+    'Bytes held in the temporary media directory'
+)
+
+temp_media_swept_total = Counter(
+    'temp_media_swept_total',
+    'Temporary media files removed by the sweeper',
+    ['reason']
+)
+
+media_registry_lookups_total = Counter(
+    'media_registry_lookups_total',
+    'Outbound media ID lookups by result',
+    ['result']
+)
+
+media_uploads_total = Counter(
+    'media_uploads_total',
+    'Outbound media uploads to the WhatsApp /media endpoint',
+    ['status']
+)
+
+media_processing_duration_seconds = Histogram(
+    'media_processing_duration_seconds',
+    'Time spent building media renditions',
+    ['media_type']
+)
+
+media_processing_bytes_total = Counter(
+    'media_processing_bytes_total',
+    'Inbound media bytes before and after processing',
+    ['media_type', 'stage']
+)
+
+media_processing_failures_total = Counter(
+    'media_processing_failures_total',
+    'Inbound media stored unprocessed after a processing error',
+    ['media_type']
+)
+
+# Process Metrics
+worker_startup_seconds = Gauge(
+    'worker_startup_seconds',
+    'Time from app import (or fork) until this worker was ready'
+)
+
+worker_sizing = Gauge(
+    'worker_sizing',
+    'Worker count and per-worker pool sizes chosen for this container',
+    ['setting']
+)
+
+worker_rss_bytes = Gauge(
+    'worker_rss_bytes',
+    'Resident memory of this worker'
+)
+
+worker_rss_limit_bytes = Gauge(
+    'worker_rss_limit_bytes',
+    'RSS above which this worker recycles itself'
+)
+
+# A recycling worker exits right after counting itself, so the count lives
+# in memory shared with the gunicorn master (allocated before the fork,
+# under preload) and every worker reports the same total
+worker_recycles = multiprocessing.Value('L', 0)
+
+class _WorkerRecyclesCollector:
+    def collect(self):
+        family = CounterMetricFamily(
+            'worker_recycles',
+            'Workers recycled for exceeding their RSS limit',
+            labels=['reason']
+        )
+        family.add_metric(['rss'], worker_recycles.value)
+        yield family
+
+REGISTRY.register(_WorkerRecyclesCollector())
+
 # System Metrics
 cpu_usage_percent = Gauge('system_cpu_usage_percent', 'CPU usage percentage')
 memory_usage_percent = Gauge('system_memory_usage_percent', 'Memory usage percentage')
@@ -73,6 +365,9 @@ async def metrics_middleware(request: Request, call_next):
 
 def update_system_metrics():
     """Update system resource metrics"""
+    # Imported on first scrape rather than at worker boot
+    import psutil
+    
     cpu_usage_percent.set(psutil.cpu_percent())
     memory_usage_percent.set(psutil.virtual_memory().percent)
     disk_usage_percent.set(psutil.disk_usage('/').percent)
@@ -0,0 +1,141 @@
+"""Worker Memory Guard: Graceful Recycling on RSS Growth
+
+`max_requests` recycles workers by request count whatever their memory
+use, while buffered media uploads and renditions can grow a worker long
+before that. Each worker samples its own RSS; past WORKER_MAX_RSS_MB
+(jittered per worker so they don't all restart together) it sends
+itself SIGTERM. Gunicorn's UvicornWorker then stops accepting, drains
+in-flight requests within graceful_timeout and exits, and the master
+forks a fresh worker. Recycling is only enabled by gunicorn's post_fork
+hook; anywhere else the guard just reports RSS.
+
+The worker sizing plan is exported at startup next to the RSS gauges so
+both decisions are visible in Prometheus.
+"""
+import asyncio
+import logging
+import os
+import random
+import signal
+from typing import Optional
+
+from monitoring.metrics import (
+    worker_rss_bytes,
+    worker_rss_limit_bytes,
+    worker_recycles,
+    worker_sizing,
+)
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def current_rss() -> int:
+    """Resident set size of this process in bytes"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except OSError:
+        import psutil
+        return psutil.Process().memory_info().rss
+
+
+class WorkerMemoryGuard:
+    """Samples this worker's RSS and recycles it past a threshold"""
+
+    def __init__(self, max_rss_mb: int, interval: float = 10.0, jitter: float = 0.1, grace_samples: int = 3):
+        """
+        Args:
+            max_rss_mb: RSS that triggers recycling (0: derive from the memory limit, if any)
+            interval: Seconds between samples
+            jitter: Fractional spread of the threshold across workers
+            grace_samples: Consecutive samples over the threshold before recycling
+        """
+        self.max_rss_bytes = max_rss_mb * 1024 * 1024
+        self.interval = interval
+        self.jitter = jitter
+        self.grace_samples = grace_samples
+        self.threshold: Optional[int] = None
+        self.recycle = False
+        self._over = 0
+        self._recycling = False
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        """Export the sizing plan and start sampling (idempotent)"""
+        from utils.worker_sizing import plan_from_env
+
+        plan = plan_from_env()
+        # Pool sizes set explicitly in the environment override the plan
+        effective = {
+            "workers": plan["workers"],
+            "cpu_quota": plan["cpu_quota"],
+            "mongo_max_pool_size": int(os.getenv("MONGODB_MAX_POOL_SIZE", plan["mongo_max_pool_size"])),
+            "mongo_analytics_max_pool_size": int(os.getenv("MONGODB_ANALYTICS_MAX_POOL_SIZE", plan["mongo_analytics_max_pool_size"])),
+            "http_max_connections": int(os.getenv("HTTP_MAX_CONNECTIONS", plan["http_max_connections"]))
+        }
+        for setting, value in effective.items():
+            worker_sizing.labels(setting=setting).set(value)
+
+        max_rss_bytes = self.max_rss_bytes
+        if not max_rss_bytes and plan["memory_limit_bytes"]:
+            # Default: an equal share of 80% of the container's memory limit
+            max_rss_bytes = int(plan["memory_limit_bytes"] * 0.8 / plan["workers"])
+        if max_rss_bytes:
+            self.threshold = int(max_rss_bytes * (1 + random.uniform(-self.jitter, self.jitter)))
+            baseline = current_rss()
+            if self.threshold <= baseline:
+                # A fresh worker would recycle immediately, in a loop
+                logger.warning(
+                    f"WORKER_MAX_RSS_MB is below a fresh worker's RSS "
+                    f"({baseline // (1024 * 1024)} MB); recycling disabled"
+                )
+                self.threshold = None
+            else:
+                worker_rss_limit_bytes.set(self.threshold)
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def enable_recycling(self) -> None:
+        """Allow self-termination; only safe under a master that replaces workers"""
+        self.recycle = True
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.check()
+            except Exception as e:
+                logger.warning(f"Worker memory check failed: {e}")
+
+    def check(self) -> None:
+        """Sample RSS once and recycle if it stayed over the threshold"""
+        rss = current_rss()
+        worker_rss_bytes.set(rss)
+        if not self.threshold or not self.recycle or self._recycling:
+            return
+
+        self._over = self._over + 1 if rss > self.threshold else 0
+        if self._over >= self.grace_samples:
+            self._recycling = True
+            with worker_recycles.get_lock():
+                worker_recycles.value += 1
+            logger.warning(
+                f"Worker {os.getpid()} RSS {rss // (1024 * 1024)} MB over "
+                f"{self.threshold // (1024 * 1024)} MB; recycling gracefully"
+            )
+            os.kill(os.getpid(), signal.SIGTERM)
+
+
+worker_memory_guard = WorkerMemoryGuard(
+    max_rss_mb=int(os.getenv("WORKER_MAX_RSS_MB", 0)),
+    interval=float(os.getenv("WORKER_RSS_CHECK_INTERVAL", 10))
+)
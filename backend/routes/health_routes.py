@@ -1,12 +1,25 @@
 """Health Check Endpoints"""
-import httpx
 from fastapi import APIRouter, Depends
 from datetime import datetime
-from config.whatsapp_config import whatsapp_config
-from services.sharepoint_service import SharePointService
+from monitoring.health_monitor import health_monitor
+from monitoring.worker_memory import worker_memory_guard
+from middleware.rate_limiter import close_redis
+from utils.http_client import close_http_client
+from utils.lifecycle import startup_report
 
 router = APIRouter(prefix="/health", tags=["Health"])
 
+# Dependency checks run in the background of each worker; probes read the cache
+router.add_event_handler("startup", health_monitor.start)
+router.add_event_handler("shutdown", health_monitor.stop)
+router.add_event_handler("startup", worker_memory_guard.start)
+router.add_event_handler("shutdown", worker_memory_guard.stop)
+# Include this router last so readiness is measured after every other startup hook
+# and shared clients close after every other shutdown hook
+router.add_event_handler("startup", startup_report.ready)
+router.add_event_handler("shutdown", close_redis)
+router.add_event_handler("shutdown", close_http_client)
+
 @router.get("/")
 async def health_check():
     """Basic health check - liveness probe"""
@@ -18,63 +31,10 @@ async def health_check():
 
 @router.get("/ready")
 async def readiness_check():
-    """Comprehensive readiness check"""
-    from database.connection import Database
-    from middleware.rate_limiter import redis_client
-    
-    checks = {
-        "database": "unknown",
-        "redis": "unknown",
-        "sharepoint": "unknown",
-        "whatsapp": "unknown"
-    }
-    
-    # Check MongoDB
-    try:
-        db = Database.get_db()
-        await db.command('ping')
-        checks["database"] = "healthy"
-    except Exception as e:
-        checks["database"] = f"unhealthy: {str(e)}"
-    
-    # Check Redis
-    try:
-        redis_client.ping()
-        checks["redis"] = "healthy"
-    except Exception as e:
-        checks["redis"] = f"unhealthy: {str(e)}"
-    
-    # Check SharePoint connectivity
-    try:
-        sharepoint_service = SharePointService()
-        await sharepoint_service._get_access_token()
-        checks["sharepoint"] = "healthy"
-    except Exception as e:
-        checks["sharepoint"] = f"unhealthy: {str(e)}"
-    
-    # Check WhatsApp API
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{whatsapp_config.BASE_URL}/{whatsapp_config.PHONE_NUMBER_ID}",
-                headers={"Authorization": f"Bearer {whatsapp_config.ACCESS_TOKEN}"},
-                timeout=5.0
-            )
-            if response.status_code == 200:
-                checks["whatsapp"] = "healthy"
-            else:
-                checks["whatsapp"] = f"unhealthy: status {response.status_code}"
-    except Exception as e:
-        checks["whatsapp"] = f"unhealthy: {str(e)}"
-    
-    all_healthy = all(
-        c == "healthy" or c.startswith("healthy:") 
-        for c in checks.values()
-    )
-    
+    """Readiness check served from cached background dependency checks"""
     return {
-        "status": "ready" if all_healthy else "not_ready",
-        "checks": checks,
+        "status": "ready" if health_monitor.is_ready() else "not_ready",
+        "checks": health_monitor.snapshot(),
         "timestamp": datetime.now().isoformat()
     }
 
@@ -0,0 +1,42 @@
+"""Temporary Media Endpoints
+
+Serves files uploaded via /api/whatsapp/upload-temp so the WhatsApp Cloud
+API can fetch them by URL. Unauthenticated by design: Meta cannot send our
+JWT, and media IDs are random UUIDs.
+"""
+import asyncio
+import os
+
+from fastapi import APIRouter, HTTPException, Request
+
+from services.temp_media import temp_media_store
+from utils.file_response import RangeFileResponse
+
+router = APIRouter(prefix="/temp-media", tags=["Media"])
+
+router.add_event_handler("startup", temp_media_store.start)
+router.add_event_handler("shutdown", temp_media_store.stop)
+
+@router.api_route("/{media_id}", methods=["GET", "HEAD"])
+async def get_temp_media(media_id: str, request: Request):
+    """Serve a temporary media file with Range and ETag support"""
+    path = await asyncio.to_thread(temp_media_store.path_for, media_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Media not found")
+
+    try:
+        stat = await asyncio.to_thread(os.stat, path)
+    except FileNotFoundError:
+        # Expired and swept since path_for looked
+        raise HTTPException(status_code=404, detail="Media not found")
+    meta = await asyncio.to_thread(temp_media_store.read_meta, media_id)
+
+    return RangeFileResponse(
+        path,
+        stat,
+        request.headers,
+        media_type=meta.get("content_type", "application/octet-stream"),
+        etag=f'"{meta["sha256"]}"' if meta.get("sha256") else None,
+        method=request.method,
+        headers={"cache-control": f"private, max-age={temp_media_store.ttl}"}
+    )
@@ -1,22 +1,63 @@
 """WhatsApp API Routes"""
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Request
+import logging
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Request, Query, Header
 from typing import Optional, List
 from datetime import datetime, timedelta
 from bson import ObjectId
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from pymongo.errors import DuplicateKeyError
 
-from services.whatsapp_service import WhatsAppService
+from services.whatsapp_service import get_whatsapp_service
+from services.number_registry import number_registry, UnknownSender
+from services.media_processor import media_processor
+from services.message_status import message_status, webhook_statuses
+from services.background_jobs import JOB_INBOUND_MEDIA
+from services.jobs import job_queue
+from services.outbox import outbox, IdempotencyConflict, LANE_INTERACTIVE
+from services.message_search import message_search, InvalidSearchCursor
+from services.read_state import read_state
+from services.response_cache import (
+    response_cache,
+    entity_scope,
+    SCOPE_CONVERSATIONS,
+    CONVERSATIONS_TTL,
+    ENTITY_MESSAGES_TTL,
+    STATS_TTL
+)
+from services.webhook_dedup import webhook_deduplicator, webhook_message_id
+from services.temp_media import temp_media_store, MediaTooLarge, UnsupportedMediaType
 from auth.jwt_handler import verify_token
-from database.connection import Database
+from utils.json_response import BSONJSONResponse
+from utils.phone import normalize_phone, is_national, conversation_key, InvalidPhoneNumber
+from database.connection import Database, ANALYTICS_PROFILE
+from database.archive import message_archiver
+from database.conversation_keys import conversation_keys
+from database.write_buffer import write_buffer, DURABILITY_BATCHED
+from monitoring.metrics import archive_reads_total
 
-router = APIRouter(prefix="/api/whatsapp", tags=["WhatsApp"])
-whatsapp_service = WhatsAppService()
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api/whatsapp", tags=["WhatsApp"], default_response_class=BSONJSONResponse)
+
+if not job_queue.runner_enabled:
+    # Otherwise archived by the job runner (worker.py)
+    router.add_event_handler("startup", message_archiver.start)
+router.add_event_handler("startup", conversation_keys.start)
+router.add_event_handler("startup", outbox.start)
+router.add_event_handler("shutdown", outbox.stop)
+router.add_event_handler("shutdown", message_archiver.stop)
+router.add_event_handler("shutdown", conversation_keys.stop)
+router.add_event_handler("shutdown", read_state.stop)
+router.add_event_handler("shutdown", message_status.stop)
+router.add_event_handler("shutdown", media_processor.stop)
 
 class SendMessageRequest(BaseModel):
     to_phone: str
     message: str
     link_to_entity: Optional[str] = None
     entity_type: Optional[str] = None  # project, petty_cash, lead
+    priority: str = Field(LANE_INTERACTIVE, pattern="^(interactive|bulk)$")
+    sender: Optional[str] = None  # business number or pool; default: the contact's number
 
 class SendMediaRequest(BaseModel):
     to_phone: str
@@ -25,6 +66,8 @@ class SendMediaRequest(BaseModel):
     caption: Optional[str] = None
     link_to_entity: Optional[str] = None
     entity_type: Optional[str] = None
+    priority: str = Field(LANE_INTERACTIVE, pattern="^(interactive|bulk)$")
+    sender: Optional[str] = None
 
 class ConversationResponse(BaseModel):
     conversation_id: str
@@ -47,88 +90,142 @@ async def get_current_user(request: Request):
     
     return payload
 
-@router.post("/send-message")
+@router.post("/send-message", status_code=202)
 async def send_message(
     request: SendMessageRequest,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None, max_length=200)
 ):
-    """Send text message via WhatsApp"""
-    try:
-        result = await whatsapp_service.send_text_message(
-            to_phone=request.to_phone,
-            message=request.message,
-            user_id=current_user.get("sub")
-        )
-        
-        # Link message to entity if provided
-        if request.link_to_entity and request.entity_type:
-            db = Database.get_db()
-            await db.whatsapp_entity_links.insert_one({
-                "message_id": result["messages"][0]["id"],
-                "entity_id": request.link_to_entity,
-                "entity_type": request.entity_type,
-                "created_at": datetime.now()
-            })
-        
-        return {
-            "success": True,
-            "message_id": result["messages"][0]["id"],
-            "status": "sent"
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    """Queue a text message for sending via WhatsApp
+    
+    Returns as soon as the message is in the outbox; poll
+    /outbox/{outbox_id} for the result. Retrying with the same
+    Idempotency-Key header returns the original entry instead of sending
+    twice. Campaigns should send with `priority: bulk`, and can spread
+    load over several numbers by naming a pool as `sender`.
+    """
+    return await _enqueue_send(
+        "text",
+        {"to_phone": request.to_phone, "message": request.message},
+        request,
+        current_user,
+        idempotency_key
+    )
 
-@router.post("/send-media")
+@router.post("/send-media", status_code=202)
 async def send_media(
     request: SendMediaRequest,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None, max_length=200)
 ):
-    """Send media message via WhatsApp"""
+    """Queue a media message for sending via WhatsApp (see /send-message)"""
+    return await _enqueue_send(
+        "media",
+        {
+            "to_phone": request.to_phone,
+            "media_url": request.media_url,
+            "media_type": request.media_type,
+            "caption": request.caption
+        },
+        request,
+        current_user,
+        idempotency_key
+    )
+
+async def _resolve_contact(to_phone: str) -> str:
+    """Conversation key (E.164 without "+", as the Cloud API takes it) to send to
+
+    A bare number that already names a conversation, such as a
+    conversation_id from /conversations, is a wa_id and is used as it is,
+    even when it has the length of a national number. Anything else is
+    read as entered by staff.
+    """
+    if is_national(to_phone) and not to_phone.strip().startswith("0"):
+        key = conversation_key(to_phone)
+        if await Database.get_db().whatsapp_messages.find_one({conversation_keys.field: key}, {"_id": 1}):
+            return key
+    return normalize_phone(to_phone)[1:]
+
+async def _enqueue_send(kind: str, payload: dict, request: BaseModel, current_user: dict, idempotency_key: Optional[str]) -> dict:
+    link = None
+    if request.link_to_entity and request.entity_type:
+        link = {"entity_id": request.link_to_entity, "entity_type": request.entity_type}
+    
+    try:
+        number_registry.validate_sender(request.sender)
+        contact = await _resolve_contact(request.to_phone)
+    except (UnknownSender, InvalidPhoneNumber) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    payload = {**payload, "to_phone": contact}
+    # Replies go out from the number the contact wrote to
+    sender = request.sender or await number_registry.sender_for_contact(Database.get_db(), contact)
+    
     try:
-        result = await whatsapp_service.send_media_message(
-            to_phone=request.to_phone,
-            media_url=request.media_url,
-            media_type=request.media_type,
-            caption=request.caption,
-            user_id=current_user.get("sub")
+        entry = await outbox.enqueue(
+            kind,
+            payload,
+            user_id=current_user.get("sub"),
+            idempotency_key=idempotency_key,
+            lane=request.priority,
+            link=link,
+            sender=sender
         )
-        
-        return {
-            "success": True,
-            "message_id": result["messages"][0]["id"],
-            "status": "sent"
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    return {"success": True, **_outbox_status(entry)}
+
+@router.get("/outbox/{outbox_id}")
+async def get_outbox_status(
+    outbox_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """Dispatch status of a send queued by the current user"""
+    entry = await outbox.get(outbox_id, current_user.get("sub"))
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Outbox entry not found")
+    return _outbox_status(entry)
+
+def _outbox_status(entry: dict) -> dict:
+    return {
+        "outbox_id": str(entry["_id"]),
+        "status": entry["status"],
+        "message_id": entry.get("whatsapp_message_id"),
+        "attempts": entry.get("attempts", 0),
+        "error": entry.get("last_error") if entry["status"] == "failed" else None
+    }
 
 @router.get("/conversations")
 async def get_conversations(
+    request: Request,
     current_user: dict = Depends(get_current_user)
 ):
-    """Get all WhatsApp conversations"""
-    db = Database.get_db()
+    """Get all WhatsApp conversations
     
-    # Aggregate conversations from messages
-    pipeline = [
+    Served from the response cache; new messages and read receipts bump
+    its version.
+    """
+    return await response_cache.cached(
+        request,
+        route="conversations",
+        compute=_load_conversations,
+        ttl=CONVERSATIONS_TTL,
+        scopes=[SCOPE_CONVERSATIONS]
+    )
+
+def _conversations_pipeline(field: str, limit: int, exclude: List[str]) -> List[dict]:
+    """Newest message per conversation, read in order from the conversation index"""
+    return [
+        {
+            "$match": {field: {"$nin": exclude}}
+        },
         {
-            "$sort": {"created_at": -1}
+            "$sort": {field: 1, "created_at": -1}
         },
         {
             "$group": {
-                "_id": "$other_party",
+                "_id": f"${field}",
                 "last_message": {"$first": "$$ROOT"},
-                "unread_count": {
-                    "$sum": {
-                        "$cond": [
-                            {"$and": [
-                                {"$eq": ["$direction", "inbound"]},
-                                {"$eq": ["$read", False]}
-                            ]},
-                            1,
-                            0
-                        ]
-                    }
-                },
                 "created_at": {"$first": "$created_at"}
             }
         },
@@ -141,47 +238,89 @@ async def get_conversations(
                     "type": "$last_message.message_type",
                     "text": "$last_message.message_body",
                     "timestamp": "$last_message.created_at",
-                    "direction": "$last_message.direction"
+                    "direction": "$last_message.direction",
+                    "status": "$last_message.status",
+                    "thumbnail_url": "$last_message.media_thumbnail_url"
                 },
-                "unread_count": 1,
                 "created_at": 1,
                 "_id": 0
             }
         },
         {
             "$sort": {"last_message.timestamp": -1}
+        },
+        {
+            "$limit": limit
         }
     ]
+
+async def _load_conversations() -> List[dict]:
+    db = Database.get_db(profile=ANALYTICS_PROFILE)
+    field = conversation_keys.field
+    limit = 100
     
-    conversations = await db.whatsapp_messages.aggregate(pipeline).to_list(100)
+    max_time_ms = Database.max_time_ms(ANALYTICS_PROFILE)
+    conversations = await db.whatsapp_messages.aggregate(
+        _conversations_pipeline(field, limit, []),
+        maxTimeMS=max_time_ms
+    ).to_list(limit)
+    
+    # Conversations quiet for longer than the hot window are only in the
+    # archives; every archived message is older than every hot one, so
+    # the list continues month by month, newest first
+    if len(conversations) < limit:
+        for collection in await message_archiver.archive_collections(db, refresh=True):
+            archive_reads_total.labels(query="conversations").inc()
+            conversations.extend(await db[collection].aggregate(
+                _conversations_pipeline(field, limit - len(conversations), [c["conversation_id"] for c in conversations]),
+                maxTimeMS=max_time_ms
+            ).to_list(None))
+            if len(conversations) >= limit:
+                break
+    
+    # Unread counts are inbound messages after each conversation's read watermark
+    parties = [c["other_party"] for c in conversations]
+    watermarks = await read_state.get_watermarks(db, parties)
+    unread = await read_state.unread_counts(db, parties, watermarks, max_time_ms=max_time_ms)
+    for conversation in conversations:
+        conversation["unread_count"] = unread.get(conversation["other_party"], 0)
     
     return conversations
 
 @router.get("/conversation/{phone_number}")
 async def get_conversation_messages(
     phone_number: str,
+    before: Optional[datetime] = None,
+    limit: int = Query(1000, ge=1, le=1000),
     current_user: dict = Depends(get_current_user)
 ):
-    """Get all messages in a conversation"""
+    """Get a page of messages in a conversation, oldest first
+
+    Returns the newest `limit` messages older than `before`. Pages past
+    the hot window are read from the monthly archives. The number is the
+    international one, with or without "+" and separators.
+    """
     db = Database.get_db()
+    key = conversation_key(phone_number)
     
-    messages = await db.whatsapp_messages.find({
-        "other_party": phone_number
-    }).sort("created_at", 1).to_list(1000)
-    
-    # Mark inbound messages as read
-    await db.whatsapp_messages.update_many(
-        {
-            "other_party": phone_number,
-            "direction": "inbound",
-            "read": False
-        },
-        {
-            "$set": {"read": True, "read_at": datetime.now()}
-        }
+    messages = await message_archiver.find_conversation_page(
+        db,
+        {conversation_keys.field: key},
+        limit=limit,
+        before=before
     )
+    messages.reverse()
     
-    # Format messages for frontend
+    # Advance the read watermark (no write if nothing new was seen)
+    inbound = [msg["created_at"] for msg in messages if msg.get("direction") == "inbound"]
+    if inbound:
+        await read_state.mark_read(db, key, max(inbound))
+    
+    # Rendered by orjson directly; datetimes and ObjectIds need no pre-encoding
+    return BSONJSONResponse(_format_messages(messages))
+
+def _format_messages(messages: List[dict]) -> List[dict]:
+    """Format conversation messages for the frontend"""
     formatted_messages = []
     for msg in messages:
         formatted_messages.append({
@@ -192,14 +331,22 @@ async def get_conversation_messages(
             "status": msg.get("status", "sent"),
             "timestamp": msg.get("created_at"),
             "media_url": msg.get("media_url"),
-            "from_user": str(msg.get("from_user_id")) if msg.get("from_user_id") else None
+            "thumbnail_url": msg.get("media_thumbnail_url"),
+            "preview_url": msg.get("media_web_url") or msg.get("media_url"),
+            "media_status": msg.get("media_status"),
+            "from_user": msg.get("from_user_id") or None
         })
-    
     return formatted_messages
 
 @router.post("/webhook")
 async def whatsapp_webhook(request: Request):
-    """Handle incoming WhatsApp webhooks"""
+    """Handle incoming WhatsApp webhooks
+    
+    Messages are handled by the service of the business number they were
+    sent to (`metadata.phone_number_id`). With a job runner deployed,
+    media messages are stored straight away with `media_status: pending`
+    and their media is fetched and uploaded by a `media.inbound` job.
+    """
     from config.whatsapp_config import whatsapp_config
     
     # Verify webhook (first time setup)
@@ -217,55 +364,102 @@ async def whatsapp_webhook(request: Request):
     # Process incoming message
     body = await request.json()
     
+    # Delivery/read receipts are coalesced and written in bulk
+    statuses = webhook_statuses(body)
+    if statuses:
+        message_status.add(statuses)
+    
+    # Redeliveries are acknowledged before any download or write
+    message_id = webhook_message_id(body)
+    if message_id and not await webhook_deduplicator.claim(message_id):
+        return {"status": "duplicate"}
+    
     try:
-        result = await whatsapp_service.process_incoming_message(body)
+        whatsapp_service = get_whatsapp_service(number_registry.for_webhook(body))
+        defer_media = job_queue.runner_enabled
+        result = await whatsapp_service.process_incoming_message(body, store_media=not defer_media)
+        if result.get("status") == "no_messages":
+            return {"status": "success" if statuses else "ignored"}
         
         # Store in database
-        db = Database.get_db()
-        
+        key = conversation_key(result["from_phone"])
         message_doc = {
             "whatsapp_message_id": result["message_id"],
             "from_phone": result["from_phone"],
-            "other_party": result["from_phone"],
-            "to_phone": whatsapp_config.PHONE_NUMBER_ID,
+            "other_party": key,
+            "conversation_key": key,
+            "to_phone": whatsapp_service.number.phone_number_id,
             "message_type": result["type"],
             "message_body": result.get("text"),
             "direction": "inbound",
             "status": "received",
             "read": False,
             "created_at": result["timestamp"],
-            "media_url": result.get("media", {}).get("sharepoint_url")
+            "media_url": result.get("media", {}).get("sharepoint_url"),
+            "media_thumbnail_url": result.get("media", {}).get("thumbnail_url"),
+            "media_web_url": result.get("media", {}).get("web_url")
         }
         
-        await db.whatsapp_messages.insert_one(message_doc)
+        media = result.get("media")
+        if media and defer_media:
+            # Queued first, so a failed insert is redelivered and still finds its job
+            await job_queue.enqueue(JOB_INBOUND_MEDIA, {
+                "message_id": result["message_id"],
+                "number": whatsapp_service.number.name,
+                "media_id": media["media_id"],
+                "media_type": result["type"],
+                "filename": media["filename"],
+                "from_phone": result["from_phone"],
+                "timestamp": result["timestamp"]
+            }, key=f"media:{result['message_id']}")
+            message_doc["media_status"] = "pending"
         
-        return {"status": "success"}
+        await write_buffer.insert("whatsapp_messages", message_doc, durability=DURABILITY_BATCHED)
+        await response_cache.bump(SCOPE_CONVERSATIONS)
         
+        return {"status": "success"}
+    
+    except DuplicateKeyError:
+        # Stored before the dedup claim expired, or while Redis was down
+        return {"status": "duplicate"}
     except Exception as e:
-        print(f"Webhook error: {e}")
-        return {"status": "error", "message": str(e)}
+        if message_id:
+            await webhook_deduplicator.release(message_id)
+        logger.exception(f"Webhook processing failed for {message_id}")
+        # Meta only redelivers on a non-2xx answer
+        raise HTTPException(status_code=500, detail=f"Webhook processing failed: {e}")
 
 @router.get("/entity-messages/{entity_type}/{entity_id}")
 async def get_entity_messages(
     entity_type: str,
     entity_id: str,
+    request: Request,
     current_user: dict = Depends(get_current_user)
 ):
     """Get all WhatsApp messages linked to a specific entity"""
-    db = Database.get_db()
+    return await response_cache.cached(
+        request,
+        route="entity_messages",
+        compute=lambda: _load_entity_messages(entity_type, entity_id),
+        ttl=ENTITY_MESSAGES_TTL,
+        params={"entity_type": entity_type, "entity_id": entity_id},
+        scopes=[entity_scope(entity_type, entity_id)]
+    )
+
+async def _load_entity_messages(entity_type: str, entity_id: str) -> List[dict]:
+    db = Database.get_db(profile=ANALYTICS_PROFILE)
+    max_time_ms = Database.max_time_ms(ANALYTICS_PROFILE)
     
     # Find all message links for this entity
     links = await db.whatsapp_entity_links.find({
         "entity_type": entity_type,
         "entity_id": entity_id
-    }).to_list(1000)
+    }).max_time_ms(max_time_ms).to_list(1000)
     
     message_ids = [link["message_id"] for link in links]
     
-    # Get messages
-    messages = await db.whatsapp_messages.find({
-        "whatsapp_message_id": {"$in": message_ids}
-    }).sort("created_at", -1).to_list(1000)
+    # Get messages (archived ones are looked up only if missing from the hot tier)
+    messages = await message_archiver.find_by_message_ids(db, message_ids, max_time_ms=max_time_ms)
     
     return [{
         "id": str(msg["_id"]),
@@ -276,53 +470,110 @@ async def get_entity_messages(
         "phone": msg.get("other_party")
     } for msg in messages]
 
+@router.get("/search")
+async def search_messages(
+    q: str = Query(..., min_length=2, max_length=200),
+    phone: Optional[str] = Query(None, pattern=r"^\+?\d{3,15}$"),
+    direction: Optional[str] = Query(None, pattern="^(inbound|outbound)$"),
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    entity_type: Optional[str] = None,
+    entity_id: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Search message history by text, ranked by relevance
+    
+    Pass `next_cursor` from a response as `cursor` to get the next page.
+    Archived months are searched only when `start_date` is older than
+    the hot window.
+    """
+    try:
+        page = await message_search.search(
+            Database.get_db(profile=ANALYTICS_PROFILE),
+            q,
+            phone=phone.lstrip("+") if phone else None,
+            direction=direction,
+            start_date=start_date,
+            end_date=end_date,
+            entity_type=entity_type,
+            entity_id=entity_id,
+            limit=limit,
+            cursor=cursor,
+            max_time_ms=Database.max_time_ms(ANALYTICS_PROFILE)
+        )
+    except InvalidSearchCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return BSONJSONResponse(page)
+
 @router.post("/upload-temp")
 async def upload_temp_file(
     file: UploadFile = File(...),
     current_user: dict = Depends(get_current_user)
 ):
-    """Upload temporary file for WhatsApp media sending"""
-    import uuid
+    """Upload temporary file for WhatsApp media sending
+
+    The file is streamed to disk in chunks; type and size limits are
+    enforced while streaming. It is served from /temp-media/{id} until the
+    sweeper removes it.
+    """
     import os
     
-    # Create temp directory if not exists
-    os.makedirs("/tmp/whatsapp-uploads", exist_ok=True)
-    
-    # Generate unique filename
-    file_extension = os.path.splitext(file.filename)[1]
-    unique_filename = f"{uuid.uuid4()}{file_extension}"
-    file_path = f"/tmp/whatsapp-uploads/{unique_filename}"
-    
-    # Save file
-    with open(file_path, "wb") as buffer:
-        content = await file.read()
-        buffer.write(content)
+    try:
+        media = await temp_media_store.save(file)
+    except UnsupportedMediaType as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    except MediaTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
     
     # Return publicly accessible URL (you need to configure this)
     # For production, upload to S3/Azure Blob and return public URL
     base_url = os.getenv("API_BASE_URL", "http://localhost:8000")
     
     return {
-        "url": f"{base_url}/temp-media/{unique_filename}",
-        "filename": file.filename
+        "url": f"{base_url}/temp-media/{media['id']}",
+        "filename": file.filename,
+        "media_type": media["media_type"],
+        "size": media["size"]
     }
 
 @router.get("/stats")
 async def get_whatsapp_stats(
+    request: Request,
     days: int = 30,
     current_user: dict = Depends(get_current_user)
 ):
-    """Get WhatsApp usage statistics"""
-    db = Database.get_db()
+    """Get WhatsApp usage statistics
+    
+    Aggregate counts tolerate a minute of staleness, so cached entries
+    expire on TTL alone instead of on every new message.
+    """
+    return await response_cache.cached(
+        request,
+        route="stats",
+        compute=lambda: _load_stats(days),
+        ttl=STATS_TTL,
+        params={"days": days}
+    )
+
+async def _load_stats(days: int) -> dict:
+    db = Database.get_db(profile=ANALYTICS_PROFILE)
+    max_time_ms = Database.max_time_ms(ANALYTICS_PROFILE)
     
     start_date = datetime.now() - timedelta(days=days)
+    match = {"$match": {"created_at": {"$gte": start_date}}}
+    
+    # Periods reaching past the hot window also scan the overlapping archives
+    archive_stages = []
+    if start_date < message_archiver.hot_cutoff():
+        for collection in await message_archiver.archive_collections(db):
+            archive_stages.append({"$unionWith": {"coll": collection, "pipeline": [match]}})
     
     pipeline = [
-        {
-            "$match": {
-                "created_at": {"$gte": start_date}
-            }
-        },
+        match,
+        *archive_stages,
         {
             "$group": {
                 "_id": {
@@ -334,18 +585,28 @@ async def get_whatsapp_stats(
         }
     ]
     
-    stats = await db.whatsapp_messages.aggregate(pipeline).to_list(100)
+    stats = await db.whatsapp_messages.aggregate(
+        pipeline,
+        maxTimeMS=max_time_ms
+    ).to_list(100)
     
     # Total messages
-    total_messages = await db.whatsapp_messages.count_documents({
-        "created_at": {"$gte": start_date}
-    })
+    total_messages = sum(entry["count"] for entry in stats)
     
     # Unique conversations
-    unique_conversations = len(await db.whatsapp_messages.distinct(
-        "other_party",
-        {"created_at": {"$gte": start_date}}
-    ))
+    field = conversation_keys.field
+    if archive_stages:
+        unique = await db.whatsapp_messages.aggregate(
+            [match, *archive_stages, {"$group": {"_id": f"${field}"}}, {"$count": "count"}],
+            maxTimeMS=max_time_ms
+        ).to_list(1)
+        unique_conversations = unique[0]["count"] if unique else 0
+    else:
+        unique_conversations = len(await db.whatsapp_messages.distinct(
+            field,
+            {"created_at": {"$gte": start_date}},
+            maxTimeMS=max_time_ms
+        ))
     
     return {
         "total_messages": total_messages,
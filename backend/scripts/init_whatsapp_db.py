@@ -1,121 +1,94 @@
 #!/usr/bin/env python3
-"""Initialize WhatsApp Chat Database Schema"""
+"""Initialize WhatsApp Chat Database Schema
+
+Applies pending versioned migrations (see database/migrations.py) and
+optionally verifies that every API query shape is index-backed.
+
+    python scripts/init_whatsapp_db.py                 # apply migrations
+    python scripts/init_whatsapp_db.py --status        # list applied/pending
+    python scripts/init_whatsapp_db.py --check-plans   # migrate, then explain() all query shapes
+
+Works against any MongoDB, e.g. a local `mongod` via
+MONGODB_URI=mongodb://localhost:27017.
+"""
+import argparse
 import asyncio
 import os
+import sys
+
 from motor.motor_asyncio import AsyncIOMotorClient
 from pymongo.server_api import ServerApi
 from dotenv import load_dotenv
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.migrations import MigrationRunner, MigrationError  # noqa: E402
+from database.index_advisor import (  # noqa: E402
+    check_query_plans,
+    IndexAdvisorError,
+    MODE_WARN,
+    MODE_FAIL,
+)
+
 load_dotenv()
 
-async def init_database():
-    """Initialize database collections and indexes for WhatsApp chat"""
-    
+async def init_database(args) -> int:
+    """Apply migrations and optionally verify query plans"""
+
     # Connect to MongoDB
     client = AsyncIOMotorClient(
         os.getenv("MONGODB_URI"),
         server_api=ServerApi('1')
     )
-    
+
     db = client[os.getenv("MONGODB_DATABASE", "madio_erp")]
-    
-    print("📦 Initializing WhatsApp Chat Database Schema...\n")
-    
-    # Create whatsapp_messages collection
-    print("Creating whatsapp_messages collection...")
-    try:
-        await db.create_collection("whatsapp_messages")
-        print("✅ Collection created")
-    except Exception as e:
-        print(f"⚠️  Collection exists or error: {e}")
-    
-    # Create indexes for whatsapp_messages
-    print("\nCreating indexes for whatsapp_messages...")
-    
-    indexes = [
-        {"keys": [("whatsapp_message_id", 1)], "unique": True, "name": "whatsapp_message_id_1"},
-        {"keys": [("other_party", 1), ("created_at", -1)], "name": "conversation_messages"},
-        {"keys": [("direction", 1), ("status", 1)], "name": "message_status"},
-        {"keys": [("created_at", -1)], "name": "created_at_desc"},
-        {"keys": [("from_user_id", 1), ("created_at", -1)], "name": "user_messages"},
-        {"keys": [("read", 1), ("direction", 1)], "name": "unread_inbound"}
-    ]
-    
-    for index_spec in indexes:
-        try:
-            await db.whatsapp_messages.create_index(
-                index_spec["keys"],
-                unique=index_spec.get("unique", False),
-                name=index_spec["name"]
-            )
-            print(f"✅ Created index: {index_spec['name']}")
-        except Exception as e:
-            print(f"⚠️  Index exists or error: {index_spec['name']}")
-    
-    # Create whatsapp_entity_links collection
-    print("\nCreating whatsapp_entity_links collection...")
-    try:
-        await db.create_collection("whatsapp_entity_links")
-        print("✅ Collection created")
-    except Exception as e:
-        print(f"⚠️  Collection exists or error: {e}")
-    
-    # Create indexes for whatsapp_entity_links
-    print("\nCreating indexes for whatsapp_entity_links...")
-    
-    link_indexes = [
-        {"keys": [("message_id", 1)], "name": "message_id_1"},
-        {"keys": [("entity_type", 1), ("entity_id", 1)], "name": "entity_lookup"},
-        {"keys": [("entity_id", 1)], "name": "entity_id_1"}
-    ]
-    
-    for index_spec in link_indexes:
-        try:
-            await db.whatsapp_entity_links.create_index(
-                index_spec["keys"],
-                name=index_spec["name"]
-            )
-            print(f"✅ Created index: {index_spec['name']}")
-        except Exception as e:
-            print(f"⚠️  Index exists or error: {index_spec['name']}")
-    
-    # Create refresh_tokens collection (for JWT)
-    print("\nCreating refresh_tokens collection...")
+    runner = MigrationRunner(db)
+
     try:
-        await db.create_collection("refresh_tokens")
-        print("✅ Collection created")
-    except Exception as e:
-        print(f"⚠️  Collection exists or error: {e}")
-    
-    # Create indexes for refresh_tokens
-    print("\nCreating indexes for refresh_tokens...")
-    
-    token_indexes = [
-        {"keys": [("jti", 1)], "unique": True, "name": "jti_unique"},
-        {"keys": [("user_id", 1), ("revoked", 1)], "name": "user_active_tokens"},
-        {"keys": [("expires_at", 1)], "expireAfterSeconds": 0, "name": "token_expiry"}
-    ]
-    
-    for index_spec in token_indexes:
-        try:
-            await db.refresh_tokens.create_index(
-                index_spec["keys"],
-                unique=index_spec.get("unique", False),
-                name=index_spec["name"],
-                expireAfterSeconds=index_spec.get("expireAfterSeconds")
-            )
-            print(f"✅ Created index: {index_spec['name']}")
-        except Exception as e:
-            print(f"⚠️  Index exists or error: {index_spec['name']}")
-    
-    print("\n✅ Database initialization complete!\n")
-    print("Collections created:")
-    collections = await db.list_collection_names()
-    for col in collections:
-        if 'whatsapp' in col or 'refresh' in col:
-            print(f"  - {col}")
-    
-    client.close()
+        if args.status:
+            applied = await runner.applied_versions()
+            pending = await runner.pending()
+            print(f"Applied migrations: {applied or 'none'}")
+            for migration in pending:
+                print(f"  pending {migration.version}: {migration.description}")
+            return 0
+
+        print("📦 Applying WhatsApp Chat database migrations...\n")
+        applied = await runner.run(wait_timeout=args.lock_timeout)
+
+        if applied:
+            print(f"✅ Applied migrations: {applied}")
+        else:
+            print("✅ Schema already up to date")
+
+        if args.check_plans:
+            print("\n🔎 Checking query plans...")
+            report = await check_query_plans(db, mode=args.mode)
+            for name, problems in report.items():
+                marker = "⚠️ " if problems else "✅"
+                print(f"{marker} {name}: {', '.join(problems) or 'index-backed'}")
+
+        return 0
+
+    except (MigrationError, IndexAdvisorError) as e:
+        print(f"\n❌ {e}")
+        return 1
+
+    finally:
+        client.close()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--status", action="store_true", help="show applied and pending migrations")
+    parser.add_argument("--check-plans", action="store_true", help="explain() every API query shape")
+    parser.add_argument(
+        "--mode",
+        choices=[MODE_WARN, MODE_FAIL],
+        default=MODE_FAIL,
+        help="fail (non-zero exit) or warn on COLLSCAN / in-memory sorts"
+    )
+    parser.add_argument("--lock-timeout", type=float, default=300, help="seconds to wait for the migration lock")
+    return parser.parse_args()
 
 if __name__ == "__main__":
-    asyncio.run(init_database())
+    sys.exit(asyncio.run(init_database(parse_args())))
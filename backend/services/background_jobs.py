@@ -0,0 +1,115 @@
+"""Job Types Run by the Job Runner
+
+Importing this module registers the handlers with `job_registry`;
+worker.py imports it before starting the queue.
+"""
+import hashlib
+import os
+from typing import Any, Dict
+
+from config.whatsapp_config import whatsapp_config
+from database.archive import message_archiver
+from database.connection import Database
+from database.locks import DistributedLock
+from services.jobs import job_registry
+from services.number_registry import number_registry
+from services.response_cache import response_cache, SCOPE_CONVERSATIONS
+from services.whatsapp_service import get_whatsapp_service
+
+JOB_INBOUND_MEDIA = "media.inbound"
+JOB_ARCHIVE_MESSAGES = "messages.archive"
+
+
+class MessageNotStored(Exception):
+    """Raised when a media job runs before its message has been written"""
+
+
+def per_message_filename(filename: str, message_id: str) -> str:
+    """A file name no other message's upload uses, e.g. "invoice_1a2b3c4d.pdf"
+
+    Generated names already contain the message id; names chosen by the
+    sender (documents) get a short hash of it before the extension.
+    """
+    if message_id in filename:
+        return filename
+    stem, dot, extension = filename.rpartition(".")
+    if not dot or not stem:
+        stem, extension = filename, ""
+    suffix = hashlib.sha1(message_id.encode()).hexdigest()[:8]
+    return f"{stem}_{suffix}.{extension}" if extension else f"{stem}_{suffix}"
+
+
+async def inbound_media_failed(payload: Dict[str, Any]) -> None:
+    """Mark a message whose media could not be stored, so it stops showing as pending"""
+    await Database.get_db().whatsapp_messages.update_one(
+        {"whatsapp_message_id": payload["message_id"]},
+        {"$set": {"media_status": "failed"}}
+    )
+    await response_cache.bump(SCOPE_CONVERSATIONS)
+
+
+@job_registry.job(
+    JOB_INBOUND_MEDIA,
+    concurrency=int(os.getenv("MEDIA_JOB_CONCURRENCY", 8)),
+    max_attempts=int(os.getenv("MEDIA_JOB_MAX_ATTEMPTS", 6)),
+    timeout=float(whatsapp_config.MEDIA_PROCESS_TIMEOUT) + 120,
+    on_failure=inbound_media_failed
+)
+async def store_inbound_media(payload: Dict[str, Any]) -> None:
+    """Fetch an inbound message's media, upload it to SharePoint, and attach the links
+
+    Payload: message_id, number, media_id, media_type, filename,
+    from_phone, timestamp. A message whose media is already stored is
+    skipped. Otherwise the files are named per message and uploaded with
+    conflictBehavior=replace, so a retry or a rerun after a lost lease
+    overwrites its earlier upload instead of leaving a renamed copy.
+    """
+    messages = Database.get_db().whatsapp_messages
+    message = await messages.find_one({"whatsapp_message_id": payload["message_id"]}, {"media_status": 1})
+    if message is None:
+        # Queued just before the webhook's insert; retried once it lands
+        raise MessageNotStored(payload["message_id"])
+    if message.get("media_status") == "stored":
+        return
+
+    number = number_registry.get(payload["number"]) or number_registry.default
+    media = await get_whatsapp_service(number).store_media(
+        payload["media_id"],
+        per_message_filename(payload["filename"], payload["message_id"]),
+        payload["media_type"],
+        message_id=payload["message_id"],
+        from_phone=payload["from_phone"],
+        timestamp=payload["timestamp"],
+        conflict_behavior="replace"
+    )
+
+    await messages.update_one(
+        {"whatsapp_message_id": payload["message_id"]},
+        {"$set": {
+            "media_status": "stored",
+            "media_url": media["sharepoint_url"],
+            "media_thumbnail_url": media["thumbnail_url"],
+            "media_web_url": media["web_url"]
+        }}
+    )
+    await response_cache.bump(SCOPE_CONVERSATIONS)
+
+
+@job_registry.job(
+    JOB_ARCHIVE_MESSAGES,
+    concurrency=1,
+    max_attempts=1,
+    timeout=message_archiver.interval,
+    every=message_archiver.interval if os.getenv("MESSAGE_ARCHIVE_ENABLED", "false").lower() == "true" else None
+)
+async def archive_messages(payload: Dict[str, Any]) -> None:
+    """Move messages older than the hot window into the monthly archives"""
+    db = Database.get_db()
+    # Shared with the in-process archiver, in case both are running mid-rollout
+    lock = DistributedLock(db, "message_archiver", ttl=int(message_archiver.interval * 2))
+    if not await lock.acquire():
+        return
+    try:
+        await message_archiver.archive_once(db)
+    finally:
+        await lock.release()
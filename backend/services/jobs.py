@@ -0,0 +1,302 @@
+"""Background Job Queue
+
+Work that doesn't have to finish inside an HTTP request (downloading,
+processing and uploading inbound media; archiving old messages) is queued
+in `background_jobs` and run by the job runner (worker.py), a separate
+process that scales independently of the gunicorn web tier. The web tier
+hands work over only when JOB_RUNNER_ENABLED is set; otherwise it keeps
+doing it in-process as before.
+
+Job types are registered with `@job_registry.job(...)`, each with its own
+concurrency, attempt limit and timeout. Handlers run on the event loop,
+so I/O-bound jobs overlap; CPU-heavy steps inside them go to a process
+pool (see services/media_processor.py). Periodic types name an interval
+and get one job per interval, keyed by the interval's start, so several
+runner replicas schedule it only once.
+
+Jobs move queued -> running -> done | failed. As in the outbox, a
+claimed job is leased to its runner (database/leased_queue.py), which
+renews the lease while the job runs; a runner that dies mid-job leaves a
+lease that expires, and the job runs again elsewhere. Handlers must
+therefore be idempotent. Failed runs are retried with jittered
+exponential backoff up to the type's attempt limit, after which the
+type's `on_failure` hook runs once.
+"""
+import asyncio
+import logging
+import os
+import random
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+from database.connection import Database
+from database.leased_queue import LeasedQueue, STATUS_QUEUED
+from monitoring.metrics import (
+    jobs_enqueued_total,
+    jobs_processed_total,
+    jobs_running,
+    job_duration_seconds,
+    job_queue_delay_seconds,
+)
+
+logger = logging.getLogger(__name__)
+
+JOBS_COLLECTION = "background_jobs"
+
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+JobHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class JobType:
+    """A registered kind of background job"""
+
+    def __init__(
+        self,
+        name: str,
+        handler: JobHandler,
+        concurrency: int = 4,
+        max_attempts: int = 5,
+        timeout: float = 300.0,
+        every: Optional[float] = None,
+        on_failure: Optional[JobHandler] = None
+    ):
+        """
+        Args:
+            name: Job type name, stored on each job and used in metrics
+            handler: Coroutine function taking the job's payload
+            concurrency: Jobs of this type run at once in each runner
+            max_attempts: Runs before a job is marked failed
+            timeout: Seconds a run may take before it is cancelled and retried
+            every: Seconds between scheduled runs (None: only when enqueued)
+            on_failure: Coroutine function taking the payload of a job that failed for good
+        """
+        self.name = name
+        self.handler = handler
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        self.every = every
+        self.on_failure = on_failure
+
+
+class JobRegistry:
+    """Job types known to this process"""
+
+    def __init__(self):
+        self.types: Dict[str, JobType] = {}
+
+    def job(self, name: str, **options) -> Callable[[JobHandler], JobHandler]:
+        """Decorator registering a handler as job type `name` (options as for JobType)"""
+        def register(handler: JobHandler) -> JobHandler:
+            self.types[name] = JobType(name, handler, **options)
+            return handler
+        return register
+
+
+class JobQueue(LeasedQueue):
+    """Mongo-backed job queue with per-type runner pools"""
+
+    def __init__(
+        self,
+        registry: JobRegistry,
+        runner_enabled: bool = False,
+        base_backoff: float = 5.0,
+        max_backoff: float = 600.0,
+        poll_interval: float = 1.0,
+        lease_seconds: float = 60.0,
+        retention_days: int = 3,
+        drain_timeout: float = 60.0
+    ):
+        """
+        Args:
+            registry: Job types to run
+            runner_enabled: Whether a job runner is deployed to hand work to
+            base_backoff: Seconds before the first retry
+            max_backoff: Upper bound on the delay between retries
+            poll_interval: Seconds between polls when a type has no due jobs
+            lease_seconds: Lease on a running job, renewed while it runs
+            retention_days: Days finished jobs are kept
+            drain_timeout: Seconds shutdown waits for running jobs
+        """
+        super().__init__(JOBS_COLLECTION, "next_run_at", STATUS_RUNNING, lease_seconds, retention_days)
+        self.registry = registry
+        self.runner_enabled = runner_enabled
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.poll_interval = poll_interval
+        self.drain_timeout = drain_timeout
+        self._workers: List[asyncio.Task] = []
+        self._schedulers: List[asyncio.Task] = []
+        self._stopping = False
+
+    async def enqueue(
+        self,
+        job_type: str,
+        payload: Optional[Dict[str, Any]] = None,
+        key: Optional[str] = None,
+        run_at: Optional[datetime] = None
+    ) -> Dict[str, Any]:
+        """Queue a job, or return the one already queued under `key`
+
+        Args:
+            job_type: Registered job type name
+            payload: Arguments for the handler (BSON-serializable)
+            key: Deduplication key; generated when omitted
+            run_at: Earliest time to run (default: now)
+        """
+        now = datetime.now()
+        doc = {
+            "key": key or uuid.uuid4().hex,
+            "job_type": job_type,
+            "payload": payload or {},
+            "status": STATUS_QUEUED,
+            "attempts": 0,
+            "next_run_at": run_at or now,
+            "created_at": now,
+            "updated_at": now
+        }
+
+        collection = Database.get_db()[JOBS_COLLECTION]
+        try:
+            result = await collection.insert_one(doc)
+        except DuplicateKeyError:
+            existing = await collection.find_one({"key": doc["key"]})
+            if existing is None:
+                # Expired between the insert and the read
+                return await self.enqueue(job_type, payload, key, run_at)
+            return existing
+
+        doc["_id"] = result.inserted_id
+        jobs_enqueued_total.labels(job_type=job_type).inc()
+        return doc
+
+    async def start(self) -> None:
+        """Start runner pools and schedulers for every registered type (idempotent)"""
+        if self._workers:
+            return
+        self._stopping = False
+        for job_type in self.registry.types.values():
+            for _ in range(job_type.concurrency):
+                self._workers.append(asyncio.create_task(self._run(job_type)))
+            if job_type.every:
+                self._schedulers.append(asyncio.create_task(self._schedule(job_type)))
+        logger.info(f"Job runner started: {sorted(self.registry.types)}")
+
+    async def stop(self) -> None:
+        """Stop claiming jobs and let running ones finish, then stop"""
+        if not self._workers:
+            return
+        self._stopping = True
+        for task in self._schedulers:
+            task.cancel()
+        _, pending = await asyncio.wait(self._workers, timeout=self.drain_timeout)
+        # Leases on anything still running expire and another runner retries
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*self._workers, *self._schedulers, return_exceptions=True)
+        if pending:
+            logger.warning(f"Job runner stopped with {len(pending)} jobs still running")
+        self._workers = []
+        self._schedulers = []
+
+    async def _schedule(self, job_type: JobType) -> None:
+        while not self._stopping:
+            slot = int(time.time() // job_type.every)
+            try:
+                await self.enqueue(job_type.name, key=f"{job_type.name}:{slot}")
+            except Exception as e:
+                logger.warning(f"Scheduling {job_type.name} failed: {e}")
+            await asyncio.sleep((slot + 1) * job_type.every - time.time())
+
+    async def _run(self, job_type: JobType) -> None:
+        while not self._stopping:
+            try:
+                job = await self._claim(job_type)
+            except Exception as e:
+                logger.warning(f"Job claim failed: {e}")
+                job = None
+
+            if job is None:
+                await asyncio.sleep(self.poll_interval)
+                continue
+
+            try:
+                if job["attempts"] > job_type.max_attempts:
+                    # Its last run's runner died mid-job
+                    await self._finish(job, STATUS_FAILED, error="Lease expired during the last attempt")
+                    continue
+                async with self._hold(job):
+                    await self._execute(job_type, job)
+            except Exception as e:
+                logger.error(f"Job {job['_id']} ({job_type.name}) could not be recorded: {e}")
+
+    async def _claim(self, job_type: JobType) -> Optional[Dict[str, Any]]:
+        """Lease the next due job of a type"""
+        return await self._claim_next({"job_type": job_type.name}, started_at=datetime.now())
+
+    async def _execute(self, job_type: JobType, job: Dict[str, Any]) -> None:
+        if job["attempts"] == 1:
+            job_queue_delay_seconds.labels(job_type=job_type.name).observe(
+                (job["started_at"] - job["created_at"]).total_seconds()
+            )
+
+        start_time = time.monotonic()
+        jobs_running.labels(job_type=job_type.name).inc()
+        try:
+            await asyncio.wait_for(job_type.handler(job["payload"]), timeout=job_type.timeout)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if job["attempts"] >= job_type.max_attempts:
+                await self._finish(job, STATUS_FAILED, error=error)
+            else:
+                await self._retry(job, error)
+            return
+        finally:
+            jobs_running.labels(job_type=job_type.name).dec()
+            job_duration_seconds.labels(job_type=job_type.name).observe(time.monotonic() - start_time)
+
+        await self._finish(job, STATUS_DONE)
+
+    async def _retry(self, job: Dict[str, Any], error: str) -> None:
+        ceiling = min(self.max_backoff, self.base_backoff * 2 ** (job["attempts"] - 1))
+        delay = random.uniform(self.base_backoff, max(self.base_backoff, ceiling))
+        if not await self._requeue(job, delay, last_error=error):
+            return
+        jobs_processed_total.labels(job_type=job["job_type"], outcome="retry").inc()
+        logger.warning(f"Job {job['_id']} ({job['job_type']}) retrying in {delay:.1f}s: {error}")
+
+    async def _finish(self, job: Dict[str, Any], status: str, error: Optional[str] = None) -> None:
+        fields = {"last_error": error} if error else {}
+        if not await self._complete(job, status, **fields):
+            return
+        jobs_processed_total.labels(job_type=job["job_type"], outcome=status).inc()
+        if status != STATUS_FAILED:
+            return
+
+        logger.error(f"Job {job['_id']} ({job['job_type']}) failed: {error}")
+        job_type = self.registry.types.get(job["job_type"])
+        if job_type is not None and job_type.on_failure is not None:
+            try:
+                await job_type.on_failure(job["payload"])
+            except Exception as e:
+                logger.error(f"Failure hook for job {job['_id']} ({job['job_type']}) failed: {e}")
+
+
+job_registry = JobRegistry()
+
+job_queue = JobQueue(
+    job_registry,
+    runner_enabled=os.getenv("JOB_RUNNER_ENABLED", "false").lower() == "true",
+    base_backoff=float(os.getenv("JOB_BASE_BACKOFF", 5)),
+    max_backoff=float(os.getenv("JOB_MAX_BACKOFF", 600)),
+    poll_interval=float(os.getenv("JOB_POLL_INTERVAL", 1.0)),
+    lease_seconds=float(os.getenv("JOB_LEASE_SECONDS", 60)),
+    drain_timeout=float(os.getenv("JOB_DRAIN_TIMEOUT", 60))
+)
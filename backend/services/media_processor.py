@@ -0,0 +1,189 @@
+"""Inbound Media Processing
+
+Builds thumbnails and web renditions of inbound images and videos before
+they are uploaded to SharePoint, and strips EXIF (including GPS) from
+image originals. Image work runs in a process pool so decoding a large
+photo never blocks the event loop; video work runs in ffmpeg
+subprocesses. Any failure falls back to storing the original untouched.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional, Tuple
+
+from config.whatsapp_config import whatsapp_config
+from monitoring.metrics import (
+    media_processing_bytes_total,
+    media_processing_duration_seconds,
+    media_processing_failures_total
+)
+
+logger = logging.getLogger(__name__)
+
+# (content, filename, content type)
+MediaFile = Tuple[bytes, str, str]
+
+
+class MediaProcessor:
+    """Process-pool backed rendition builder"""
+
+    def __init__(self, config=whatsapp_config):
+        """
+        Args:
+            config: WhatsApp configuration with media processing settings
+        """
+        self.config = config
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._ffmpeg = shutil.which("ffmpeg")
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # Spawned workers don't inherit the parent's Mongo/HTTP sockets or threads
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.config.MEDIA_PROCESS_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._pool
+
+    async def process(self, content: bytes, filename: str, media_type: str) -> Dict[str, Any]:
+        """Process inbound media
+
+        Returns `original` and a `renditions` dict (name -> MediaFile).
+        Documents, disabled processing and errors all return the original
+        with no renditions.
+        """
+        unprocessed = {"original": (content, filename, None), "renditions": {}}
+        if not self.config.MEDIA_PROCESSING_ENABLED or media_type not in ("image", "video"):
+            return unprocessed
+
+        start_time = time.time()
+        try:
+            if media_type == "image":
+                result = await asyncio.wait_for(
+                    self._process_image(content, filename),
+                    timeout=self.config.MEDIA_PROCESS_TIMEOUT
+                )
+            else:
+                result = await self._process_video(content, filename)
+        except Exception as e:
+            logger.warning(f"Media processing failed for {filename}, storing original: {e}")
+            media_processing_failures_total.labels(media_type=media_type).inc()
+            return unprocessed
+
+        media_processing_duration_seconds.labels(media_type=media_type).observe(time.time() - start_time)
+        media_processing_bytes_total.labels(media_type=media_type, stage="received").inc(len(content))
+        for name, (data, _, _) in [("original", result["original"]), *result["renditions"].items()]:
+            media_processing_bytes_total.labels(media_type=media_type, stage=name).inc(len(data))
+
+        return result
+
+    async def _process_image(self, content: bytes, filename: str) -> Dict[str, Any]:
+        from utils.image_processing import process_image
+
+        loop = asyncio.get_running_loop()
+        try:
+            processed = await loop.run_in_executor(
+                self._get_pool(),
+                process_image,
+                content,
+                self.config.MEDIA_THUMBNAIL_EDGE,
+                self.config.MEDIA_WEB_EDGE,
+                self.config.MEDIA_WEB_QUALITY,
+                self.config.MEDIA_STRIP_EXIF
+            )
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM on a decompression bomb); start fresh next time
+            self._pool = None
+            raise
+
+        stem, extension = os.path.splitext(filename)
+        original = (content, filename, None)
+        if processed["original"] is not None:
+            data, new_extension, content_type = processed["original"]
+            if {new_extension, extension.lower()} != {".jpg", ".jpeg"} and new_extension != extension.lower():
+                filename = stem + new_extension
+            original = (data, filename, content_type)
+
+        return {
+            "original": original,
+            "renditions": {
+                name: (data, f"{stem}.{name}{ext}", content_type)
+                for name, (data, ext, content_type) in processed["renditions"].items()
+            },
+            "width": processed["width"],
+            "height": processed["height"]
+        }
+
+    async def _process_video(self, content: bytes, filename: str) -> Dict[str, Any]:
+        if not self._ffmpeg:
+            return {"original": (content, filename, None), "renditions": {}}
+
+        stem = os.path.splitext(filename)[0]
+        renditions: Dict[str, MediaFile] = {}
+
+        with tempfile.TemporaryDirectory(prefix="whatsapp-media-") as workdir:
+            source = os.path.join(workdir, "source")
+            await asyncio.to_thread(_write_file, source, content)
+
+            thumb = os.path.join(workdir, "thumb.jpg")
+            edge = self.config.MEDIA_THUMBNAIL_EDGE
+            await self._ffmpeg_run([
+                "-ss", "1", "-i", source, "-frames:v", "1",
+                "-vf", f"scale='min({edge},iw)':-2", "-q:v", "5", thumb
+            ])
+            renditions["thumb"] = (await asyncio.to_thread(_read_file, thumb), f"{stem}.thumb.jpg", "image/jpeg")
+
+            if self.config.MEDIA_TRANSCODE_VIDEO:
+                web = os.path.join(workdir, "web.mp4")
+                height = self.config.MEDIA_VIDEO_MAX_HEIGHT
+                await self._ffmpeg_run([
+                    "-i", source, "-vf", f"scale=-2:'min({height},ih)'",
+                    "-c:v", "libx264", "-preset", "veryfast", "-crf", "28",
+                    "-c:a", "aac", "-b:a", "96k", "-movflags", "+faststart", web
+                ])
+                data = await asyncio.to_thread(_read_file, web)
+                # Only keep the transcode if it actually saves bytes
+                if len(data) < len(content):
+                    renditions["web"] = (data, f"{stem}.web.mp4", "video/mp4")
+
+        return {"original": (content, filename, None), "renditions": renditions}
+
+    async def _ffmpeg_run(self, args: List[str]) -> None:
+        process = await asyncio.create_subprocess_exec(
+            self._ffmpeg, "-hide_banner", "-loglevel", "error", "-y", *args,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE
+        )
+        try:
+            _, stderr = await asyncio.wait_for(process.communicate(), timeout=self.config.MEDIA_PROCESS_TIMEOUT)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            raise
+        if process.returncode != 0:
+            raise RuntimeError(f"ffmpeg exited {process.returncode}: {stderr.decode(errors='replace')[:200]}")
+
+    async def stop(self) -> None:
+        """Shut down the process pool"""
+        if self._pool is not None:
+            pool, self._pool = self._pool, None
+            await asyncio.to_thread(pool.shutdown, wait=True, cancel_futures=True)
+
+
+def _write_file(path: str, content: bytes) -> None:
+    with open(path, "wb") as f:
+        f.write(content)
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+media_processor = MediaProcessor()
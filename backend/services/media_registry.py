@@ -0,0 +1,198 @@
+"""Registry of Uploaded WhatsApp Media IDs
+
+Sending media by `link` makes Meta download the file from /temp-media for
+every recipient. Instead, each distinct file (by SHA-256) is uploaded once
+to the Cloud API `/media` endpoint and the returned media ID is reused
+until shortly before it expires. IDs are stored in
+`whatsapp_media_registry` so every worker shares them, with a small
+in-process cache in front.
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+import httpx
+
+from config.whatsapp_config import whatsapp_config
+from monitoring.metrics import media_registry_lookups_total, media_uploads_total
+from services.temp_media import temp_media_store
+from utils.http_client import get_http_client
+from utils.upstream_scheduler import Upstream, get_upstream
+
+logger = logging.getLogger(__name__)
+
+REGISTRY_COLLECTION = "whatsapp_media_registry"
+TEMP_MEDIA_PATH = "/temp-media/"
+
+
+class MediaUploadError(Exception):
+    """The Cloud API rejected a media upload"""
+
+
+class MediaRegistry:
+    """Upload-once cache of WhatsApp media IDs keyed by content hash"""
+
+    def __init__(self, config=whatsapp_config, store=temp_media_store):
+        """
+        Args:
+            config: WhatsApp configuration with credentials and validity window
+            store: Temporary media store the files are read from
+        """
+        self.config = config
+        self.store = store
+        self.validity = timedelta(days=config.MEDIA_ID_VALIDITY_DAYS)
+        self.refresh_margin = timedelta(hours=config.MEDIA_ID_REFRESH_HOURS)
+        self._cache: Dict[str, Tuple[str, datetime]] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def local_media(self, media_url: str) -> Optional[Dict[str, Any]]:
+        """Sidecar metadata if a URL points at one of our /temp-media files"""
+        path = urlparse(media_url).path
+        if TEMP_MEDIA_PATH not in path:
+            return None
+
+        media_id = path.rsplit(TEMP_MEDIA_PATH, 1)[1]
+        file_path = self.store.path_for(media_id)
+        if file_path is None:
+            return None
+
+        meta = self.store.read_meta(media_id)
+        if not meta.get("sha256"):
+            return None
+        return {**meta, "path": file_path}
+
+    async def get_media_id(
+        self,
+        db,
+        media: Dict[str, Any],
+        phone_number_id: str = None,
+        access_token: str = None,
+        client: Optional[httpx.AsyncClient] = None,
+        upstream: Optional[Upstream] = None
+    ) -> str:
+        """Media ID for a stored file, uploading it if none is fresh
+
+        Concurrent sends of the same file share one upload. IDs belong to
+        the business number that uploaded them.
+
+        Args:
+            db: Database handle
+            media: Sidecar metadata from local_media()
+            phone_number_id: Uploading number (default: PHONE_NUMBER_ID)
+            access_token: That number's token (default: ACCESS_TOKEN)
+            client: HTTP client to upload with (default: the shared pool)
+            upstream: Scheduler for the uploading number
+        """
+        phone_number_id = phone_number_id or self.config.PHONE_NUMBER_ID
+        key = f"{phone_number_id}:{media['sha256']}"
+
+        cached = self._cache.get(key)
+        if cached and self._is_fresh(cached[1]):
+            media_registry_lookups_total.labels(result="hit").inc()
+            return cached[0]
+
+        doc = await db[REGISTRY_COLLECTION].find_one({"_id": key})
+        if doc and self._is_fresh(doc["expires_at"]):
+            self._cache[key] = (doc["media_id"], doc["expires_at"])
+            media_registry_lookups_total.labels(result="hit").inc()
+            return doc["media_id"]
+
+        media_registry_lookups_total.labels(result="refresh" if doc else "miss").inc()
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    raise
+                # The send uploading it went away; upload it here instead
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            media_id = await self._upload(db, key, media, phone_number_id, access_token, client, upstream)
+            future.set_result(media_id)
+            return media_id
+        except Exception as e:
+            future.set_exception(e)
+            # Retrieve it so a future nobody awaited doesn't log a warning
+            future.exception()
+            raise
+        finally:
+            if not future.done():
+                future.cancel()
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    async def invalidate(self, db, media: Dict[str, Any], phone_number_id: str = None) -> None:
+        """Forget a media ID that the Cloud API no longer accepts"""
+        key = f"{phone_number_id or self.config.PHONE_NUMBER_ID}:{media['sha256']}"
+        self._cache.pop(key, None)
+        await db[REGISTRY_COLLECTION].delete_one({"_id": key})
+
+    def _is_fresh(self, expires_at: datetime) -> bool:
+        return expires_at - self.refresh_margin > datetime.utcnow()
+
+    async def _upload(
+        self,
+        db,
+        key: str,
+        media: Dict[str, Any],
+        phone_number_id: str,
+        access_token: Optional[str],
+        client: Optional[httpx.AsyncClient],
+        upstream: Optional[Upstream]
+    ) -> str:
+        content = await asyncio.to_thread(_read_file, media["path"])
+
+        upstream = upstream or get_upstream(f"whatsapp:{phone_number_id}")
+        response = await upstream.request(
+            client or get_http_client(),
+            "POST",
+            f"{self.config.BASE_URL}/{phone_number_id}/media",
+            paced=False,
+            headers={"Authorization": f"Bearer {access_token or self.config.ACCESS_TOKEN}"},
+            data={"messaging_product": "whatsapp", "type": media["content_type"]},
+            files={"file": (media.get("filename") or media["id"], content, media["content_type"])},
+            timeout=120
+        )
+
+        try:
+            media_id = response.json()["id"] if response.status_code == 200 else None
+        except (ValueError, KeyError):
+            media_id = None
+        if not media_id:
+            media_uploads_total.labels(status="failed").inc()
+            raise MediaUploadError(f"Media upload failed ({response.status_code}): {response.text[:200]}")
+
+        uploaded_at = datetime.utcnow()
+        expires_at = uploaded_at + self.validity
+
+        await db[REGISTRY_COLLECTION].update_one(
+            {"_id": key},
+            {"$set": {
+                "media_id": media_id,
+                "sha256": media["sha256"],
+                "phone_number_id": phone_number_id,
+                "content_type": media["content_type"],
+                "size": media.get("size"),
+                "uploaded_at": uploaded_at,
+                "expires_at": expires_at
+            }},
+            upsert=True
+        )
+        self._cache[key] = (media_id, expires_at)
+        media_uploads_total.labels(status="success").inc()
+        logger.info(f"Uploaded media {media['sha256'][:12]} as {media_id}")
+        return media_id
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+media_registry = MediaRegistry()
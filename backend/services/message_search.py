@@ -0,0 +1,157 @@
+"""Full-Text Search over WhatsApp Message History
+
+Backed by the `message_text` text index on `message_body`, which MongoDB
+maintains on every insert, so messages are searchable as soon as the
+write-behind buffer flushes them. Results are ranked by text score, then
+recency, and paged with an opaque keyset cursor over
+(score, created_at, _id) so deep pages cost the same as the first.
+
+The hot collection is always searched; archive collections only when
+the date range reaches past the hot window. Each collection is queried
+with the same cursor predicate and the results merged, which keeps the
+order total across tiers.
+"""
+import base64
+import json
+import re
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+from database.archive import HOT_COLLECTION, message_archiver
+from database.conversation_keys import conversation_keys
+from utils.phone import conversation_key
+
+# Upper bound on entity-linked message IDs used as a filter
+MAX_ENTITY_MESSAGES = 5000
+
+# A `phone` filter with fewer digits matches conversations by leading digits
+MIN_FULL_NUMBER_DIGITS = 10
+
+
+class InvalidSearchCursor(ValueError):
+    """Cursor was not produced by this endpoint"""
+
+
+def encode_cursor(score: float, created_at: datetime, message_id: ObjectId) -> str:
+    """Opaque cursor pointing just past a result"""
+    raw = json.dumps([score, created_at.isoformat(), str(message_id)])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[float, datetime, ObjectId]:
+    """Inverse of encode_cursor"""
+    try:
+        score, created_at, message_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return float(score), datetime.fromisoformat(created_at), ObjectId(message_id)
+    except (ValueError, TypeError, InvalidId) as e:
+        raise InvalidSearchCursor("Invalid search cursor") from e
+
+
+class MessageSearch:
+    """Relevance-ranked, keyset-paginated message search"""
+
+    def __init__(self, archiver=message_archiver):
+        """
+        Args:
+            archiver: Message archiver, for the hot cutoff and archive list
+        """
+        self.archiver = archiver
+
+    async def search(
+        self,
+        db,
+        query: str,
+        phone: Optional[str] = None,
+        direction: Optional[str] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        entity_type: Optional[str] = None,
+        entity_id: Optional[str] = None,
+        limit: int = 20,
+        cursor: Optional[str] = None,
+        max_time_ms: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Search messages; returns `results` and `next_cursor` (None on the last page)
+
+        `query` uses MongoDB text search syntax: words match any, "quoted
+        phrases" must appear, and -word excludes. `phone` matches the
+        conversation by full number (in any format) or leading digits.
+        """
+        position = decode_cursor(cursor) if cursor else None
+        match: Dict[str, Any] = {"$text": {"$search": query}}
+        if phone:
+            field = conversation_keys.field
+            # Judged by the digits left once +, 00 and separators are gone
+            key = conversation_key(phone)
+            if len(key) >= MIN_FULL_NUMBER_DIGITS:
+                match[field] = key
+            else:
+                match[field] = {"$regex": f"^{re.escape(key)}"}
+        if direction:
+            match["direction"] = direction
+        if start_date or end_date:
+            match["created_at"] = {}
+            if start_date:
+                match["created_at"]["$gte"] = start_date
+            if end_date:
+                match["created_at"]["$lte"] = end_date
+
+        if entity_type and entity_id:
+            links = await db.whatsapp_entity_links.find(
+                {"entity_type": entity_type, "entity_id": entity_id},
+                {"message_id": 1}
+            ).max_time_ms(max_time_ms).to_list(MAX_ENTITY_MESSAGES)
+            if not links:
+                return {"results": [], "next_cursor": None}
+            match["whatsapp_message_id"] = {"$in": [link["message_id"] for link in links]}
+
+        pipeline = [
+            {"$match": match},
+            {"$addFields": {"score": {"$meta": "textScore"}}}
+        ]
+        if position:
+            score, created_at, message_id = position
+            pipeline.append({"$match": {"$or": [
+                {"score": {"$lt": score}},
+                {"score": score, "created_at": {"$lt": created_at}},
+                {"score": score, "created_at": created_at, "_id": {"$lt": message_id}}
+            ]}})
+        pipeline += [
+            {"$sort": {"score": -1, "created_at": -1, "_id": -1}},
+            {"$limit": limit + 1}
+        ]
+
+        collections = [HOT_COLLECTION]
+        if start_date and start_date < self.archiver.hot_cutoff():
+            collections += await self.archiver.archive_collections(db, before=end_date, after=start_date)
+
+        docs: List[Dict[str, Any]] = []
+        for collection in collections:
+            docs += await db[collection].aggregate(pipeline, maxTimeMS=max_time_ms).to_list(limit + 1)
+
+        docs.sort(key=lambda doc: (doc["score"], doc["created_at"], doc["_id"]), reverse=True)
+        page = docs[:limit]
+        next_cursor = None
+        if len(docs) > limit:
+            last = page[-1]
+            next_cursor = encode_cursor(last["score"], last["created_at"], last["_id"])
+
+        return {
+            "results": [{
+                "id": msg["_id"],
+                "type": msg.get("message_type", "text"),
+                "body": msg.get("message_body"),
+                "direction": msg.get("direction"),
+                "phone": msg.get("other_party"),
+                "timestamp": msg.get("created_at"),
+                "thumbnail_url": msg.get("media_thumbnail_url"),
+                "score": round(msg["score"], 4)
+            } for msg in page],
+            "next_cursor": next_cursor
+        }
+
+
+message_search = MessageSearch()
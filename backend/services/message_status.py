@@ -0,0 +1,169 @@
+"""Delivery and Read Status Ingestion
+
+Status callbacks (sent, delivered, read, failed) arrive in webhooks'
+`value.statuses`, roughly three per outbound message. Instead of a write
+per callback, updates are coalesced per `whatsapp_message_id` to the
+furthest state seen within a short window, then applied as one unordered
+`bulk_write`.
+
+States only move forward: each update matches the message only while
+its stored status is an earlier state, so late or redelivered callbacks
+are no-ops and need no deduplication.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from pymongo import UpdateOne
+
+from monitoring.metrics import (
+    whatsapp_status_callbacks_total,
+    whatsapp_status_flush_size,
+    whatsapp_status_unmatched_total,
+)
+from services.response_cache import response_cache, SCOPE_CONVERSATIONS
+
+logger = logging.getLogger(__name__)
+
+# Later states win; "failed" can follow any of them
+STATUS_RANK = {"sent": 1, "delivered": 2, "read": 3, "failed": 4}
+
+
+def webhook_statuses(webhook_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Status callbacks in a webhook, across all entries and changes"""
+    statuses = []
+    for entry in webhook_data.get("entry", []):
+        for change in entry.get("changes", []):
+            statuses.extend(change.get("value", {}).get("statuses", []))
+    return statuses
+
+
+class MessageStatusIngestor:
+    """Coalesces status callbacks and applies them in bulk"""
+
+    def __init__(self, flush_interval: float = 1.0, max_pending: int = 5000):
+        """
+        Args:
+            flush_interval: Seconds to coalesce callbacks before writing
+            max_pending: Pending messages that trigger an early flush
+        """
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def add(self, statuses: List[Dict[str, Any]]) -> None:
+        """Queue status callbacks from a webhook"""
+        for status in statuses:
+            state = status.get("status")
+            message_id = status.get("id")
+            if state not in STATUS_RANK or not message_id:
+                continue
+            whatsapp_status_callbacks_total.labels(status=state).inc()
+
+            timestamp = datetime.fromtimestamp(int(status["timestamp"])) if status.get("timestamp") else datetime.now()
+            update = self._pending.setdefault(message_id, {"status": None, "timestamps": {}})
+            update["timestamps"][state] = timestamp
+            if update["status"] is None or STATUS_RANK[state] > STATUS_RANK[update["status"]]:
+                update["status"] = state
+                update["updated_at"] = timestamp
+            if state == "failed" and status.get("errors"):
+                error = status["errors"][0]
+                update["error"] = {"code": error.get("code"), "title": error.get("title")}
+
+        if self._pending:
+            self._ensure_started()
+            if len(self._pending) >= self.max_pending:
+                # Flush early, from the one flusher task
+                self._wakeup.set()
+
+    async def flush(self) -> None:
+        """Apply pending status changes in one unordered bulk write"""
+        from database.connection import Database
+
+        if not self._pending:
+            return
+
+        pending, self._pending = self._pending, {}
+        operations = []
+        for message_id, update in pending.items():
+            state = update["status"]
+            fields = {
+                "status": state,
+                "status_updated_at": update["updated_at"],
+                **{f"status_timestamps.{s}": t for s, t in update["timestamps"].items()}
+            }
+            if "error" in update:
+                fields["status_error"] = update["error"]
+            operations.append(UpdateOne(
+                {
+                    "whatsapp_message_id": message_id,
+                    "status": {"$in": [s for s, rank in STATUS_RANK.items() if rank < STATUS_RANK[state]]}
+                },
+                {"$set": fields}
+            ))
+
+        try:
+            result = await Database.get_db().whatsapp_messages.bulk_write(operations, ordered=False)
+        except asyncio.CancelledError:
+            # Stopped mid-write; stop() writes them out again
+            self._merge_back(pending)
+            raise
+        except Exception as e:
+            logger.error(f"Message status flush failed: {e}")
+            self._merge_back(pending)
+            self._ensure_started()
+            return
+
+        whatsapp_status_flush_size.observe(len(operations))
+        # Already at that state or later, archived, or not stored (media sends)
+        whatsapp_status_unmatched_total.inc(len(operations) - result.matched_count)
+        if result.modified_count:
+            # Message status shows in conversation views
+            await response_cache.bump(SCOPE_CONVERSATIONS)
+
+    def _merge_back(self, pending: Dict[str, Dict[str, Any]]) -> None:
+        """Requeue updates that were not written under anything queued since
+
+        The furthest state wins; timestamps seen in either are kept.
+        """
+        for message_id, update in pending.items():
+            current = self._pending.get(message_id)
+            if current is None:
+                self._pending[message_id] = update
+                continue
+            timestamps = {**update["timestamps"], **current["timestamps"]}
+            if STATUS_RANK[update["status"]] > STATUS_RANK[current["status"]]:
+                self._pending[message_id] = {**current, **update}
+            self._pending[message_id]["timestamps"] = timestamps
+
+    def _ensure_started(self) -> None:
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while self._pending:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def stop(self) -> None:
+        """Write out pending status changes on shutdown"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+
+message_status = MessageStatusIngestor(
+    flush_interval=float(os.getenv("STATUS_FLUSH_INTERVAL", 1.0)),
+    max_pending=int(os.getenv("STATUS_MAX_PENDING", 5000))
+)
@@ -0,0 +1,107 @@
+"""Business Number Registry
+
+Each branch has its own WhatsApp business number, and each number has
+its own throughput tier, so sending through several numbers scales
+throughput with them. Numbers come from WhatsAppConfig.numbers(); each
+gets its own WhatsAppService with a connection pool, pacing budget and
+SharePoint folder.
+
+Inbound webhooks are routed by `metadata.phone_number_id`. An outbound
+send names its sender: a number (by name or phone number ID), or a pool
+whose numbers share the load. With no sender, a reply goes out from the
+number the contact last wrote to, so conversations stay on one number.
+"""
+import itertools
+import logging
+from typing import Any, Dict, List, Optional
+
+from config.whatsapp_config import whatsapp_config, WhatsAppNumber
+from database.conversation_keys import conversation_keys
+from services.whatsapp_service import WhatsAppService, get_whatsapp_service
+
+logger = logging.getLogger(__name__)
+
+
+class UnknownSender(Exception):
+    """Raised when a send names a number or pool that isn't configured"""
+
+
+class NumberRegistry:
+    """Lookup and selection of configured business numbers"""
+
+    def __init__(self, numbers: List[WhatsAppNumber]):
+        """
+        Args:
+            numbers: Configured numbers; the first is the default sender
+        """
+        self.numbers = numbers
+        self.default = numbers[0]
+        self._by_key: Dict[str, WhatsAppNumber] = {}
+        self._pools: Dict[str, List[WhatsAppNumber]] = {}
+        for number in numbers:
+            self._by_key[number.name] = number
+            if number.phone_number_id:
+                self._by_key[number.phone_number_id] = number
+            self._pools.setdefault(number.pool, []).append(number)
+        self._round_robin = itertools.count()
+
+    def get(self, key: str) -> Optional[WhatsAppNumber]:
+        """A number by name or phone number ID"""
+        return self._by_key.get(key)
+
+    def for_webhook(self, webhook_data: Dict[str, Any]) -> WhatsAppNumber:
+        """The number a webhook was delivered for"""
+        try:
+            phone_number_id = webhook_data["entry"][0]["changes"][0]["value"]["metadata"]["phone_number_id"]
+        except (KeyError, IndexError, TypeError):
+            return self.default
+
+        number = self._by_key.get(phone_number_id)
+        if number is None:
+            logger.warning(f"Webhook for unconfigured number {phone_number_id}; handling as {self.default.name}")
+            return self.default
+        return number
+
+    def validate_sender(self, sender: Optional[str]) -> None:
+        """Raise UnknownSender unless `sender` is empty, a number or a pool"""
+        if sender and sender not in self._by_key and sender not in self._pools:
+            raise UnknownSender(f"Unknown sender number or pool: {sender}")
+
+    async def sender_for_contact(self, db, contact: str) -> Optional[str]:
+        """Name of the number a contact last wrote to, if several are configured
+
+        Args:
+            db: Motor database
+            contact: The contact's conversation key
+        """
+        if len(self.numbers) == 1:
+            return None
+        last_inbound = await db.whatsapp_messages.find_one(
+            {conversation_keys.field: contact, "direction": "inbound"},
+            {"to_phone": 1},
+            sort=[("created_at", -1)]
+        )
+        number = self._by_key.get(last_inbound.get("to_phone")) if last_inbound else None
+        return number.name if number else None
+
+    def service_for(self, sender: Optional[str] = None) -> WhatsAppService:
+        """Service to send through for a number, a pool, or the default
+
+        A pool send goes to the member with the most pacing budget left,
+        round-robin among equals.
+        """
+        if not sender:
+            return get_whatsapp_service(self.default)
+        if sender in self._by_key:
+            return get_whatsapp_service(self._by_key[sender])
+        if sender not in self._pools:
+            raise UnknownSender(f"Unknown sender number or pool: {sender}")
+
+        members = self._pools[sender]
+        offset = next(self._round_robin)
+        rotated = members[offset % len(members):] + members[:offset % len(members)]
+        services = [get_whatsapp_service(number) for number in rotated]
+        return max(services, key=lambda service: service.upstream.pacer.available())
+
+
+number_registry = NumberRegistry(whatsapp_config.numbers())
@@ -0,0 +1,323 @@
+"""Durable Outbound Message Outbox
+
+Sends are written to `whatsapp_outbox` and acknowledged as queued; a
+dispatcher pool in each worker drains the outbox and calls the Cloud
+API. A slow or throttled Graph API no longer holds the HTTP request
+open, and a send that could not be delivered is retried rather than
+silently dropped.
+
+Every send carries an idempotency key (the client's Idempotency-Key, or
+a generated one). The key is unique per user, so a client retrying after
+a timeout gets the original outbox entry back instead of a second send.
+
+Entries move queued -> sending -> sent | failed. Throttling (429 or a
+rate-limit error code), 5xx, transport errors and an open circuit are
+retried with jittered exponential backoff, honouring Retry-After; other
+rejections fail immediately. A claimed entry is leased to its dispatcher
+(database/leased_queue.py), which renews the lease for as long as the
+send takes, uploads and Retry-After pauses included. Dispatch is
+at-least-once: a worker that dies mid-send leaves a lease that expires,
+and another worker sends again, up to the attempt limit.
+
+Interactive and bulk sends are separate lanes with their own
+dispatchers, so a staff member's reply never queues behind a campaign.
+The sending number (or pool) is resolved at dispatch through the number
+registry, which paces each number to its own throughput tier.
+"""
+import asyncio
+import logging
+import os
+import random
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import httpx
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+
+from database.connection import Database
+from database.leased_queue import LeasedQueue, STATUS_QUEUED
+from database.write_buffer import write_buffer, DURABILITY_DEFERRED
+from monitoring.metrics import (
+    outbox_enqueued_total,
+    outbox_dispatched_total,
+    outbox_queue_delay_seconds,
+)
+from services.response_cache import response_cache, entity_scope
+from services.number_registry import number_registry, UnknownSender
+from services.whatsapp_service import WhatsAppAPIError
+from utils.phone import conversation_key
+from utils.upstream_scheduler import UpstreamUnavailable
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_COLLECTION = "whatsapp_outbox"
+
+LANE_INTERACTIVE = "interactive"
+LANE_BULK = "bulk"
+LANES = (LANE_INTERACTIVE, LANE_BULK)
+
+STATUS_SENDING = "sending"
+STATUS_SENT = "sent"
+STATUS_FAILED = "failed"
+
+
+class IdempotencyConflict(Exception):
+    """Raised when an idempotency key is reused for a different send"""
+
+
+class Outbox(LeasedQueue):
+    """Mongo-backed send queue with per-lane dispatcher pools"""
+
+    def __init__(
+        self,
+        workers: Dict[str, int],
+        max_attempts: int = 8,
+        base_backoff: float = 1.0,
+        max_backoff: float = 300.0,
+        lease_seconds: float = 60.0,
+        poll_interval: float = 1.0,
+        retention_days: int = 7,
+        drain_timeout: float = 10.0
+    ):
+        """
+        Args:
+            workers: Dispatcher tasks per lane in each worker process
+            max_attempts: Sends before an entry is marked failed
+            base_backoff: Seconds before the first retry
+            max_backoff: Upper bound on the delay between retries
+            lease_seconds: Lease on a claimed entry, renewed while it is sent
+            poll_interval: Seconds between polls for entries queued by other workers
+            retention_days: Days finished entries (and their idempotency keys) are kept
+            drain_timeout: Seconds shutdown waits for in-flight sends
+        """
+        super().__init__(OUTBOX_COLLECTION, "next_attempt_at", STATUS_SENDING, lease_seconds, retention_days)
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.poll_interval = poll_interval
+        self.drain_timeout = drain_timeout
+        self._wakeups: Dict[str, asyncio.Event] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._stopping = False
+
+    async def enqueue(
+        self,
+        kind: str,
+        payload: Dict[str, Any],
+        user_id: Optional[str],
+        idempotency_key: Optional[str] = None,
+        lane: str = LANE_INTERACTIVE,
+        link: Optional[Dict[str, str]] = None,
+        sender: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Queue a send, or return the entry already queued under the key
+
+        Args:
+            kind: "text" or "media"
+            payload: Arguments for the WhatsApp service's send method
+            user_id: Staff member sending
+            idempotency_key: Client-chosen key; generated when omitted
+            lane: LANE_INTERACTIVE or LANE_BULK
+            link: Entity to link the sent message to (entity_id, entity_type)
+            sender: Business number or pool to send from (default number if None)
+        """
+        key = f"{user_id}:{idempotency_key}" if idempotency_key else uuid.uuid4().hex
+        now = datetime.now()
+        doc = {
+            "idempotency_key": key,
+            "kind": kind,
+            "payload": payload,
+            "link": link,
+            "lane": lane,
+            "sender": sender,
+            "requested_by": user_id,
+            "status": STATUS_QUEUED,
+            "attempts": 0,
+            "next_attempt_at": now,
+            "created_at": now,
+            "updated_at": now
+        }
+
+        collection = Database.get_db()[OUTBOX_COLLECTION]
+        try:
+            result = await collection.insert_one(doc)
+        except DuplicateKeyError:
+            existing = await collection.find_one({"idempotency_key": key})
+            if existing is None:
+                # Expired between the insert and the read
+                return await self.enqueue(kind, payload, user_id, idempotency_key, lane, link, sender)
+            if existing["kind"] != kind or existing["payload"] != payload:
+                raise IdempotencyConflict("Idempotency key was already used for a different message")
+            return existing
+
+        doc["_id"] = result.inserted_id
+        outbox_enqueued_total.labels(lane=lane).inc()
+        # This worker's dispatchers pick it up now; others within poll_interval
+        if lane in self._wakeups:
+            self._wakeups[lane].set()
+        return doc
+
+    async def get(self, outbox_id: str, user_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        """An outbox entry by id, if `user_id` queued it"""
+        if not ObjectId.is_valid(outbox_id):
+            return None
+        return await Database.get_db()[OUTBOX_COLLECTION].find_one(
+            {"_id": ObjectId(outbox_id), "requested_by": user_id}
+        )
+
+    async def start(self) -> None:
+        """Start the dispatcher pools (idempotent)"""
+        if self._tasks:
+            return
+        self._stopping = False
+        for lane in LANES:
+            self._wakeups[lane] = asyncio.Event()
+            for _ in range(self.workers.get(lane, 0)):
+                self._tasks.append(asyncio.create_task(self._run(lane)))
+
+    async def stop(self) -> None:
+        """Let in-flight sends finish, then stop the dispatchers"""
+        if not self._tasks:
+            return
+        self._stopping = True
+        for wakeup in self._wakeups.values():
+            wakeup.set()
+        _, pending = await asyncio.wait(self._tasks, timeout=self.drain_timeout)
+        # Leases on anything still sending expire and another worker retries
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _run(self, lane: str) -> None:
+        wakeup = self._wakeups[lane]
+        while not self._stopping:
+            try:
+                entry = await self._claim(lane)
+            except Exception as e:
+                logger.warning(f"Outbox claim failed: {e}")
+                entry = None
+
+            if entry is None:
+                wakeup.clear()
+                try:
+                    await asyncio.wait_for(wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                if entry["attempts"] > self.max_attempts:
+                    # Its last attempt's dispatcher died mid-send
+                    await self._finish(entry, STATUS_FAILED, error="Lease expired during the last attempt")
+                    continue
+                async with self._hold(entry):
+                    await self._dispatch(entry)
+            except Exception as e:
+                logger.error(f"Outbox dispatch of {entry['_id']} failed: {e}")
+
+    async def _claim(self, lane: str) -> Optional[Dict[str, Any]]:
+        """Lease the next due entry in a lane"""
+        return await self._claim_next({"lane": lane})
+
+    async def _dispatch(self, entry: Dict[str, Any]) -> None:
+        outbox_id = str(entry["_id"])
+        try:
+            whatsapp_service = number_registry.service_for(entry.get("sender"))
+        except UnknownSender as e:
+            # The number was removed from the configuration after queueing
+            await self._finish(entry, STATUS_FAILED, error=str(e))
+            return
+
+        try:
+            if entry["kind"] == "text":
+                result = await whatsapp_service.send_text_message(
+                    **entry["payload"],
+                    user_id=entry.get("requested_by"),
+                    outbox_id=outbox_id
+                )
+            else:
+                result = await whatsapp_service.send_media_message(
+                    **entry["payload"],
+                    user_id=entry.get("requested_by")
+                )
+        except WhatsAppAPIError as e:
+            if e.retryable:
+                await self._retry(entry, str(e), e.retry_after)
+            else:
+                await self._finish(entry, STATUS_FAILED, error=str(e))
+            return
+        except UpstreamUnavailable as e:
+            # Circuit open: come back when it allows a trial call
+            await self._retry(entry, str(e), e.retry_after)
+            return
+        except httpx.HTTPError as e:
+            await self._retry(entry, f"{type(e).__name__}: {e}")
+            return
+
+        message_id = result["messages"][0]["id"]
+        await self._finish(
+            entry,
+            STATUS_SENT,
+            whatsapp_message_id=message_id,
+            from_number=whatsapp_service.number.name
+        )
+
+        # Link message to entity if requested; the send is already settled
+        link = entry.get("link")
+        if link:
+            try:
+                await write_buffer.insert("whatsapp_entity_links", {
+                    "message_id": message_id,
+                    "other_party": entry["payload"]["to_phone"],
+                    "conversation_key": conversation_key(entry["payload"]["to_phone"]),
+                    "entity_id": link["entity_id"],
+                    "entity_type": link["entity_type"],
+                    "created_at": datetime.now()
+                }, durability=DURABILITY_DEFERRED)
+                await response_cache.bump(entity_scope(link["entity_type"], link["entity_id"]))
+            except Exception as e:
+                logger.error(f"Entity link for sent message {message_id} could not be stored: {e}")
+
+    async def _retry(self, entry: Dict[str, Any], error: str, retry_after: Optional[float] = None) -> None:
+        if entry["attempts"] >= self.max_attempts:
+            await self._finish(entry, STATUS_FAILED, error=error)
+            return
+
+        # Full jitter, so throttled sends don't all come back together
+        ceiling = min(self.max_backoff, self.base_backoff * 2 ** (entry["attempts"] - 1))
+        delay = max(random.uniform(self.base_backoff, ceiling), retry_after or 0)
+        if not await self._requeue(entry, delay, last_error=error):
+            return
+        outbox_dispatched_total.labels(lane=entry["lane"], outcome="retry").inc()
+        logger.warning(f"Outbox send {entry['_id']} retrying in {delay:.1f}s: {error}")
+
+    async def _finish(self, entry: Dict[str, Any], status: str, **fields) -> None:
+        if "error" in fields:
+            fields["last_error"] = fields.pop("error")
+        if not await self._complete(entry, status, **fields):
+            return
+        outbox_dispatched_total.labels(lane=entry["lane"], outcome=status).inc()
+        if status == STATUS_SENT:
+            outbox_queue_delay_seconds.labels(lane=entry["lane"]).observe(
+                (datetime.now() - entry["created_at"]).total_seconds()
+            )
+        else:
+            logger.error(f"Outbox send {entry['_id']} failed: {fields.get('last_error')}")
+
+
+outbox = Outbox(
+    workers={
+        LANE_INTERACTIVE: int(os.getenv("OUTBOX_INTERACTIVE_WORKERS", 4)),
+        LANE_BULK: int(os.getenv("OUTBOX_BULK_WORKERS", 2))
+    },
+    max_attempts=int(os.getenv("OUTBOX_MAX_ATTEMPTS", 8)),
+    base_backoff=float(os.getenv("OUTBOX_BASE_BACKOFF", 1.0)),
+    max_backoff=float(os.getenv("OUTBOX_MAX_BACKOFF", 300)),
+    lease_seconds=float(os.getenv("OUTBOX_LEASE_SECONDS", 60)),
+    poll_interval=float(os.getenv("OUTBOX_POLL_INTERVAL", 1.0)),
+    retention_days=int(os.getenv("OUTBOX_RETENTION_DAYS", 7))
+)
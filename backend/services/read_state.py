@@ -0,0 +1,174 @@
+"""Per-Conversation Read Watermarks
+
+Instead of flipping a `read` flag on every inbound message, each
+conversation keeps a single watermark: the `created_at` of the newest
+inbound message staff have seen. Unread messages are the inbound ones
+after the watermark, counted from the (conversation_key, direction,
+created_at) index. Conversations are identified by their conversation
+key, which for inbound messages always equalled `other_party`, so
+existing watermarks carry over.
+
+Watermarks are cached in Redis and persisted to `whatsapp_read_state`
+by a debounced flusher, so repeated polling of an open conversation
+costs no database writes.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from pymongo import UpdateOne
+
+from database.conversation_keys import conversation_keys
+from monitoring.metrics import read_state_flushes_total
+from services.response_cache import response_cache, SCOPE_CONVERSATIONS
+
+logger = logging.getLogger(__name__)
+
+READ_STATE_COLLECTION = "whatsapp_read_state"
+REDIS_KEY_PREFIX = "whatsapp:read_watermark:"
+REDIS_TTL_SECONDS = 7 * 24 * 3600
+
+
+class ReadStateEngine:
+    """Read watermarks with a Redis cache and debounced persistence"""
+
+    def __init__(self, flush_interval: float = 2.0):
+        """
+        Args:
+            flush_interval: Seconds to coalesce watermark updates before writing
+        """
+        self.flush_interval = flush_interval
+        self._pending: Dict[str, datetime] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def _redis(self):
+        from middleware.rate_limiter import get_async_redis
+        return get_async_redis()
+
+    async def get_watermarks(self, db, conversations: Iterable[str]) -> Dict[str, datetime]:
+        """Watermarks for conversations, from pending updates, Redis, then Mongo"""
+        conversations = list(conversations)
+        watermarks = {c: self._pending[c] for c in conversations if c in self._pending}
+        missing = [c for c in conversations if c not in watermarks]
+
+        if missing:
+            try:
+                cached = await self._redis().mget([REDIS_KEY_PREFIX + c for c in missing])
+                for conversation, value in zip(missing, cached):
+                    if value:
+                        watermarks[conversation] = datetime.fromisoformat(value)
+            except Exception as e:
+                logger.warning(f"Read watermark cache unavailable: {e}")
+
+        missing = [c for c in conversations if c not in watermarks]
+        if missing:
+            docs = await db[READ_STATE_COLLECTION].find(
+                {"_id": {"$in": missing}}
+            ).to_list(len(missing))
+            found = {doc["_id"]: doc["last_read_at"] for doc in docs}
+            watermarks.update(found)
+            await self._cache(found)
+
+        return watermarks
+
+    async def mark_read(self, db, conversation: str, up_to: datetime) -> bool:
+        """Advance a conversation's watermark; returns False if nothing changed"""
+        current = (await self.get_watermarks(db, [conversation])).get(conversation)
+        if current is not None and current >= up_to:
+            return False
+
+        self._pending[conversation] = up_to
+        await self._cache({conversation: up_to})
+        self._ensure_started()
+        # Unread counts in /conversations changed
+        await response_cache.bump(SCOPE_CONVERSATIONS)
+        return True
+
+    async def unread_counts(
+        self,
+        db,
+        conversations: List[str],
+        watermarks: Dict[str, datetime],
+        max_time_ms: Optional[int] = None
+    ) -> Dict[str, int]:
+        """Inbound messages after each conversation's watermark
+
+        Conversations without a watermark yet fall back to the legacy
+        per-message `read` flag, which new inbound messages still carry.
+        """
+        if not conversations:
+            return {}
+
+        field = conversation_keys.field
+        clauses = []
+        for conversation in conversations:
+            if conversation in watermarks:
+                clauses.append({field: conversation, "created_at": {"$gt": watermarks[conversation]}})
+            else:
+                clauses.append({field: conversation, "read": False})
+
+        counts = await db.whatsapp_messages.aggregate([
+            {"$match": {"direction": "inbound", "$or": clauses}},
+            {"$group": {"_id": f"${field}", "count": {"$sum": 1}}}
+        ], maxTimeMS=max_time_ms).to_list(None)
+
+        return {entry["_id"]: entry["count"] for entry in counts}
+
+    async def _cache(self, watermarks: Dict[str, datetime]) -> None:
+        if not watermarks:
+            return
+        try:
+            pipe = self._redis().pipeline(transaction=False)
+            for conversation, watermark in watermarks.items():
+                pipe.set(REDIS_KEY_PREFIX + conversation, watermark.isoformat(), ex=REDIS_TTL_SECONDS)
+            await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Read watermark cache unavailable: {e}")
+
+    async def flush(self) -> None:
+        """Persist pending watermarks in one unordered bulk write"""
+        from database.connection import Database
+
+        if not self._pending:
+            return
+
+        pending, self._pending = self._pending, {}
+        now = datetime.now()
+        try:
+            await Database.get_db()[READ_STATE_COLLECTION].bulk_write([
+                UpdateOne(
+                    {"_id": conversation},
+                    {"$max": {"last_read_at": watermark}, "$set": {"updated_at": now}},
+                    upsert=True
+                )
+                for conversation, watermark in pending.items()
+            ], ordered=False)
+            read_state_flushes_total.inc()
+        except Exception as e:
+            logger.error(f"Read watermark flush failed: {e}")
+            # Keep the newer of the failed and any freshly queued watermark
+            for conversation, watermark in pending.items():
+                if self._pending.get(conversation, watermark) <= watermark:
+                    self._pending[conversation] = watermark
+
+    def _ensure_started(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while self._pending:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def stop(self) -> None:
+        """Write out pending watermarks on shutdown"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+
+read_state = ReadStateEngine(flush_interval=float(os.getenv("READ_STATE_FLUSH_INTERVAL", 2)))
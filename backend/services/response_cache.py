@@ -0,0 +1,233 @@
+"""Redis Response Cache for Read-Heavy Endpoints
+
+Rendered JSON bodies are cached in Redis for a few seconds under a key
+built from the route, its parameters and the current value of every
+version counter the response depends on. Writes bump those counters
+(`bump()`), which retires stale entries without having to find and
+delete them.
+
+Each entry carries a strong ETag (SHA-256 of the body), so polling
+clients revalidating with If-None-Match get 304 with no body. Recomputes
+are single-flight: one per key per worker, and across workers a short
+Redis lock makes the others wait for the winner's entry. The lock holds a
+per-fill token and is only deleted by its owner, so a fill that outlived
+the lock never releases another worker's.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional
+
+from fastapi import Request, Response
+
+from monitoring.metrics import response_cache_requests_total
+from utils.file_response import etag_matches
+from utils.json_response import BSONJSONResponse
+
+logger = logging.getLogger(__name__)
+
+VERSION_PREFIX = "cache:version:"
+ENTRY_PREFIX = "cache:response:"
+LOCK_PREFIX = "cache:lock:"
+
+# Delete a lock only if it still holds our token
+_RELEASE_LOCK = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+# Version scopes bumped by writes
+SCOPE_CONVERSATIONS = "conversations"
+
+# Entry lifetimes per route, in seconds
+CONVERSATIONS_TTL = int(os.getenv("RESPONSE_CACHE_CONVERSATIONS_TTL", 5))
+STATS_TTL = int(os.getenv("RESPONSE_CACHE_STATS_TTL", 60))
+ENTITY_MESSAGES_TTL = int(os.getenv("RESPONSE_CACHE_ENTITY_MESSAGES_TTL", 30))
+
+
+def entity_scope(entity_type: str, entity_id: str) -> str:
+    """Version scope for an entity's linked messages"""
+    return f"entity:{entity_type}:{entity_id}"
+
+
+class ResponseCache:
+    """Versioned, ETag-aware response cache with single-flight fills"""
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        lock_timeout: float = 5.0,
+        lock_wait: float = 2.0,
+        poll_interval: float = 0.05
+    ):
+        """
+        Args:
+            enabled: Serve from cache (when False every request is computed)
+            lock_timeout: Seconds a fill lock is held before it expires
+            lock_wait: Seconds to wait for another worker's fill before computing anyway
+            poll_interval: Seconds between checks while waiting for a fill
+        """
+        self.enabled = enabled
+        self.lock_timeout = lock_timeout
+        self.lock_wait = lock_wait
+        self.poll_interval = poll_interval
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def _redis(self):
+        from middleware.rate_limiter import get_async_redis
+        return get_async_redis()
+
+    async def bump(self, *scopes: str) -> None:
+        """Invalidate every cached response depending on these scopes"""
+        if not self.enabled or not scopes:
+            return
+        try:
+            pipe = self._redis().pipeline(transaction=False)
+            for scope in scopes:
+                pipe.incr(VERSION_PREFIX + scope)
+            await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Response cache version bump failed: {e}")
+
+    async def _key(self, route: str, params: Dict[str, Any], scopes: Iterable[str]) -> str:
+        scopes = sorted(scopes)
+        versions = await self._redis().mget([VERSION_PREFIX + scope for scope in scopes]) if scopes else []
+        fingerprint = json.dumps(
+            [params, [f"{scope}={version or 0}" for scope, version in zip(scopes, versions)]],
+            sort_keys=True,
+            default=str
+        )
+        return f"{ENTRY_PREFIX}{route}:{hashlib.sha1(fingerprint.encode()).hexdigest()}"
+
+    async def cached(
+        self,
+        request: Request,
+        route: str,
+        compute: Callable[[], Awaitable[Any]],
+        ttl: int,
+        params: Optional[Dict[str, Any]] = None,
+        scopes: Iterable[str] = ()
+    ) -> Response:
+        """Serve a route's response from cache, computing it on a miss
+
+        Args:
+            request: Incoming request (for If-None-Match)
+            route: Route name, the metric label and key prefix
+            compute: Coroutine function returning the response data
+            ttl: Seconds an entry lives even if no write bumps its scopes
+            params: Parameters that change the response
+            scopes: Version scopes the response depends on
+        """
+        if not self.enabled:
+            response_cache_requests_total.labels(route=route, result="bypass").inc()
+            return self._render(await compute())
+
+        try:
+            key = await self._key(route, params or {}, scopes)
+            entry = await self._redis().hgetall(key)
+        except Exception as e:
+            logger.warning(f"Response cache unavailable: {e}")
+            response_cache_requests_total.labels(route=route, result="bypass").inc()
+            return self._render(await compute())
+
+        if entry:
+            result = "hit"
+        else:
+            result = "miss"
+            entry = await self._fill(key, compute, ttl)
+
+        if etag_matches(request.headers.get("if-none-match"), entry["etag"]):
+            response_cache_requests_total.labels(route=route, result="not_modified").inc()
+            return Response(status_code=304, headers=self._headers(entry["etag"]))
+
+        response_cache_requests_total.labels(route=route, result=result).inc()
+        return Response(
+            content=entry["body"],
+            media_type="application/json",
+            headers=self._headers(entry["etag"])
+        )
+
+    async def _fill(self, key: str, compute: Callable[[], Awaitable[Any]], ttl: int) -> Dict[str, str]:
+        """Compute an entry once per key, however many requests miss together"""
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    raise
+                # The request computing it went away; compute it here instead
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            entry = await self._fill_across_workers(key, compute, ttl)
+            future.set_result(entry)
+            return entry
+        except Exception as e:
+            future.set_exception(e)
+            # Retrieve it so a future nobody awaited doesn't log a warning
+            future.exception()
+            raise
+        finally:
+            if not future.done():
+                future.cancel()
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    async def _fill_across_workers(self, key: str, compute: Callable[[], Awaitable[Any]], ttl: int) -> Dict[str, str]:
+        redis = self._redis()
+        lock_key = LOCK_PREFIX + key
+        token = uuid.uuid4().hex
+        try:
+            locked = await redis.set(lock_key, token, nx=True, px=int(self.lock_timeout * 1000))
+        except Exception:
+            locked = True
+
+        if not locked:
+            # Another worker is computing this entry; wait briefly for it
+            deadline = time.monotonic() + self.lock_wait
+            while time.monotonic() < deadline:
+                await asyncio.sleep(self.poll_interval)
+                try:
+                    entry = await redis.hgetall(key)
+                except Exception:
+                    break
+                if entry:
+                    return entry
+
+        try:
+            body = self._render(await compute()).body.decode()
+            entry = {"body": body, "etag": f'"{hashlib.sha256(body.encode()).hexdigest()}"'}
+            try:
+                pipe = redis.pipeline(transaction=False)
+                pipe.hset(key, mapping=entry)
+                pipe.expire(key, ttl)
+                await pipe.execute()
+            except Exception as e:
+                logger.warning(f"Response cache store failed: {e}")
+            return entry
+        finally:
+            if locked:
+                try:
+                    await redis.eval(_RELEASE_LOCK, 1, lock_key, token)
+                except Exception:
+                    pass
+
+    @staticmethod
+    def _render(data: Any) -> Response:
+        return BSONJSONResponse(content=data)
+
+    @staticmethod
+    def _headers(etag: str) -> Dict[str, str]:
+        # Clients may keep the body but must revalidate on every poll
+        return {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+
+response_cache = ResponseCache(enabled=os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true")
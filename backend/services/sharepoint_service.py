@@ -1,18 +1,70 @@
-"""Microsoft SharePoint File Upload Service"""
-import httpx
-import msal
+"""Microsoft SharePoint File Upload Service
+
+Graph calls go through the "graph" upstream scheduler, which paces them,
+waits out Retry-After and retries throttled or failed idempotent calls.
+What still fails is raised as SharePointError with the HTTP status.
+"""
+import logging
+import re
 from typing import Dict, Any, Optional
 from datetime import datetime, timedelta
+from urllib.parse import quote
 
 from config.whatsapp_config import whatsapp_config
+from monitoring.metrics import sharepoint_folders_created_total
+from utils.http_client import get_http_client
+from utils.upstream_scheduler import Upstream, get_upstream
+
+logger = logging.getLogger(__name__)
+
+FOLDER_CACHE_KEY = "sharepoint:folders"
+DEFAULT_AUTHORITY_HOST = "https://login.microsoftonline.com"
+
+# Characters SharePoint rejects in file and folder names
+INVALID_NAME_CHARS = re.compile(r'["*:<>?/\\|#%\x00-\x1f]')
+
+
+class SharePointError(Exception):
+    """Raised when Microsoft Graph rejects a SharePoint call"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        """
+        Args:
+            message: What failed, with the response body
+            status_code: HTTP status, if there was a response
+        """
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def sanitize_filename(name: str) -> str:
+    """Make a user-supplied name safe for SharePoint"""
+    name = INVALID_NAME_CHARS.sub("_", name).strip(" .")
+    return name[:200] or "file"
+
 
 class SharePointService:
-    """Microsoft SharePoint File Upload Service"""
+    """Uploads files and folders to the configured SharePoint document library"""
     
     def __init__(self):
         self.config = whatsapp_config
         self.access_token = None
         self.token_expiry = None
+        self.site_url = f"{self.config.GRAPH_API_URL}/sites/{self.config.SHAREPOINT_SITE_ID}"
+        self.drive_url = f"{self.site_url}/drive"
+        self._folder_ids: Dict[str, str] = {}
+    
+    @property
+    def upstream(self) -> Upstream:
+        """Request scheduler for Microsoft Graph"""
+        return get_upstream(
+            "graph",
+            max_concurrency=self.config.GRAPH_MAX_CONCURRENCY,
+            rate=self.config.GRAPH_REQUESTS_PER_SECOND,
+            max_retries=self.config.UPSTREAM_MAX_RETRIES,
+            failure_threshold=self.config.UPSTREAM_FAILURE_THRESHOLD,
+            reset_timeout=self.config.UPSTREAM_RESET_TIMEOUT
+        )
     
     async def _get_access_token(self) -> str:
         """Get Microsoft Graph API access token"""
@@ -21,12 +73,17 @@ class SharePointService:
             if datetime.now() < self.token_expiry:
                 return self.access_token
         
-        authority = f"https://login.microsoftonline.com/{self.config.SHAREPOINT_TENANT_ID}"
+        # msal is only needed when a token expires; keep it out of worker boot
+        import msal
+        
+        authority = f"{self.config.MSAL_AUTHORITY_HOST}/{self.config.SHAREPOINT_TENANT_ID}"
         
         app = msal.ConfidentialClientApplication(
             self.config.SHAREPOINT_CLIENT_ID,
             authority=authority,
-            client_credential=self.config.SHAREPOINT_CLIENT_SECRET
+            client_credential=self.config.SHAREPOINT_CLIENT_SECRET,
+            # Custom authority hosts (local stand-ins) can't pass Microsoft's instance discovery
+            validate_authority=self.config.MSAL_AUTHORITY_HOST == DEFAULT_AUTHORITY_HOST
         )
         
         result = app.acquire_token_for_client(
@@ -38,27 +95,41 @@ class SharePointService:
             self.token_expiry = datetime.now() + timedelta(seconds=3500)
             return self.access_token
         else:
-            raise Exception(f"Failed to acquire token: {result.get('error_description')}")
+            raise SharePointError(f"Failed to acquire token: {result.get('error_description')}")
     
     async def upload_file(
         self,
         file_content: bytes,
         filename: str,
         folder_path: str,
-        metadata: Optional[Dict[str, Any]] = None
+        metadata: Optional[Dict[str, Any]] = None,
+        conflict_behavior: Optional[str] = None
     ) -> Dict[str, Any]:
-        """Upload file to SharePoint document library"""
+        """Upload file to SharePoint document library
         
-        token = await self._get_access_token()
+        The folder is created on first use and its item ID cached, so
+        uploads address the folder directly instead of resolving the path.
+        `conflict_behavior` is fail, replace or rename (default from config).
+        Only fail and replace uploads are retried after a timeout or 5xx: a
+        rename upload that did land would be stored again as "name 1.ext".
+        """
         
-        upload_url = (
-            f"https://graph.microsoft.com/v1.0/sites/{self.config.SHAREPOINT_SITE_ID}"
-            f"/drive/root:{folder_path}/{filename}:/content"
-        )
+        token = await self._get_access_token()
+        behavior = conflict_behavior or self.config.SHAREPOINT_CONFLICT_BEHAVIOR
+        filename = sanitize_filename(filename)
         
-        async with httpx.AsyncClient() as client:
-            response = await client.put(
+        for attempt in range(2):
+            folder_id = await self.ensure_folder(folder_path)
+            upload_url = (
+                f"{self.drive_url}/items/{folder_id}:/{quote(filename)}:/content"
+                f"?@microsoft.graph.conflictBehavior={behavior}"
+            )
+            
+            response = await self.upstream.request(
+                get_http_client(),
+                "PUT",
                 upload_url,
+                idempotent=behavior in ("replace", "fail"),
                 headers={
                     "Authorization": f"Bearer {token}",
                     "Content-Type": "application/octet-stream"
@@ -66,25 +137,128 @@ class SharePointService:
                 content=file_content
             )
             
-            if response.status_code not in [200, 201]:
-                raise Exception(f"SharePoint upload failed: {response.text}")
-            
-            file_data = response.json()
-            
-            if metadata:
-                await self._update_file_metadata(
-                    file_id=file_data["id"],
-                    metadata=metadata,
-                    token=token
-                )
-            
-            return {
-                "file_id": file_data["id"],
-                "name": file_data["name"],
-                "size": file_data["size"],
-                "web_url": file_data["webUrl"],
-                "created_at": file_data["createdDateTime"]
+            if response.status_code == 404 and attempt == 0:
+                # Folder was deleted or moved in SharePoint; forget it and recreate
+                await self.forget_folder(folder_path)
+                continue
+            break
+        
+        if response.status_code == 409:
+            raise FileExistsError(f"{folder_path}/{filename} already exists in SharePoint")
+        if response.status_code not in [200, 201]:
+            raise SharePointError(f"SharePoint upload failed: {response.text}", response.status_code)
+        
+        file_data = response.json()
+        
+        if metadata:
+            await self._update_file_metadata(
+                file_id=file_data["id"],
+                metadata=metadata,
+                token=token
+            )
+        
+        return {
+            "file_id": file_data["id"],
+            "name": file_data["name"],
+            "size": file_data["size"],
+            "web_url": file_data["webUrl"],
+            "created_at": file_data["createdDateTime"]
+        }
+    
+    async def ensure_folder(self, folder_path: str) -> str:
+        """Drive item ID of a folder, creating it (and its parents) if missing
+        
+        Known folders are cached in memory and in Redis, so steady-state
+        uploads make no existence checks at all.
+        """
+        folder_path = "/" + folder_path.strip("/")
+        if folder_path == "/":
+            return "root"
+        
+        folder_id = self._folder_ids.get(folder_path)
+        if folder_id:
+            return folder_id
+        
+        try:
+            folder_id = await self._redis().hget(FOLDER_CACHE_KEY, self._cache_field(folder_path))
+        except Exception as e:
+            logger.warning(f"SharePoint folder cache unavailable: {e}")
+        
+        if not folder_id:
+            folder_id = await self._lookup_folder(folder_path)
+        if not folder_id:
+            parent_path, name = folder_path.rsplit("/", 1)
+            parent_id = await self.ensure_folder(parent_path)
+            folder_id = await self._create_folder(parent_id, name) or await self._lookup_folder(folder_path)
+            if not folder_id:
+                raise SharePointError(f"Could not create SharePoint folder {folder_path}")
+            sharepoint_folders_created_total.inc()
+        
+        await self._remember_folder(folder_path, folder_id)
+        return folder_id
+    
+    async def forget_folder(self, folder_path: str) -> None:
+        """Drop a folder from the cache"""
+        folder_path = "/" + folder_path.strip("/")
+        self._folder_ids.pop(folder_path, None)
+        try:
+            await self._redis().hdel(FOLDER_CACHE_KEY, self._cache_field(folder_path))
+        except Exception as e:
+            logger.warning(f"SharePoint folder cache unavailable: {e}")
+    
+    async def _remember_folder(self, folder_path: str, folder_id: str) -> None:
+        self._folder_ids[folder_path] = folder_id
+        try:
+            await self._redis().hset(FOLDER_CACHE_KEY, self._cache_field(folder_path), folder_id)
+        except Exception as e:
+            logger.warning(f"SharePoint folder cache unavailable: {e}")
+    
+    def _cache_field(self, folder_path: str) -> str:
+        return f"{self.config.SHAREPOINT_SITE_ID}:{folder_path}"
+    
+    def _redis(self):
+        from middleware.rate_limiter import get_async_redis
+        return get_async_redis()
+    
+    async def _lookup_folder(self, folder_path: str) -> Optional[str]:
+        token = await self._get_access_token()
+        response = await self.upstream.request(
+            get_http_client(),
+            "GET",
+            f"{self.drive_url}/root:{quote(folder_path)}",
+            params={"$select": "id"},
+            headers={"Authorization": f"Bearer {token}"}
+        )
+        if response.status_code == 404:
+            return None
+        if response.status_code != 200:
+            raise SharePointError(f"SharePoint folder lookup failed: {response.text}", response.status_code)
+        return response.json()["id"]
+    
+    async def _create_folder(self, parent_id: str, name: str) -> Optional[str]:
+        """Create a child folder; None if another worker created it first"""
+        token = await self._get_access_token()
+        response = await self.upstream.request(
+            get_http_client(),
+            "POST",
+            f"{self.drive_url}/items/{parent_id}/children",
+            # A repeat fails with 409 (conflictBehavior: fail), handled below
+            idempotent=True,
+            headers={
+                "Authorization": f"Bearer {token}",
+                "Content-Type": "application/json"
+            },
+            json={
+                "name": name,
+                "folder": {},
+                "@microsoft.graph.conflictBehavior": "fail"
             }
+        )
+        if response.status_code == 409:
+            return None
+        if response.status_code not in [200, 201]:
+            raise SharePointError(f"SharePoint folder creation failed: {response.text}", response.status_code)
+        return response.json()["id"]
     
     async def _update_file_metadata(
         self,
@@ -94,22 +268,25 @@ class SharePointService:
     ) -> None:
         """Update file metadata in SharePoint"""
         
-        async with httpx.AsyncClient() as client:
-            item_response = await client.get(
-                f"https://graph.microsoft.com/v1.0/sites/{self.config.SHAREPOINT_SITE_ID}"
-                f"/drive/items/{file_id}/listItem",
-                headers={"Authorization": f"Bearer {token}"}
-            )
+        client = get_http_client()
+        item_response = await self.upstream.request(
+            client,
+            "GET",
+            f"{self.drive_url}/items/{file_id}/listItem",
+            headers={"Authorization": f"Bearer {token}"}
+        )
+        
+        if item_response.status_code == 200:
+            list_item_id = item_response.json()["id"]
             
-            if item_response.status_code == 200:
-                list_item_id = item_response.json()["id"]
-                
-                await client.patch(
-                    f"https://graph.microsoft.com/v1.0/sites/{self.config.SHAREPOINT_SITE_ID}"
-                    f"/lists/Documents/items/{list_item_id}/fields",
-                    headers={
-                        "Authorization": f"Bearer {token}",
-                        "Content-Type": "application/json"
-                    },
-                    json=metadata
-                )
+            await self.upstream.request(
+                client,
+                "PATCH",
+                f"{self.site_url}/lists/Documents/items/{list_item_id}/fields",
+                idempotent=True,
+                headers={
+                    "Authorization": f"Bearer {token}",
+                    "Content-Type": "application/json"
+                },
+                json=metadata
+            )
@@ -0,0 +1,237 @@
+"""Temporary Media Store for Outbound WhatsApp Media
+
+Uploads are streamed to disk in chunks off the event loop, with type and
+size limits from WhatsAppConfig enforced while streaming. Each file gets a
+JSON sidecar with its original name, content type, size and SHA-256. A
+background sweeper removes files past their TTL and, if the directory is
+still over its disk quota, the oldest files first.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import UploadFile
+
+from config.whatsapp_config import whatsapp_config
+from monitoring.metrics import temp_media_bytes, temp_media_swept_total
+
+logger = logging.getLogger(__name__)
+
+MEDIA_ID_PATTERN = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\.[a-z0-9]{1,5}$")
+META_SUFFIX = ".meta.json"
+PART_SUFFIX = ".part"
+
+# Accepted MIME type prefixes per WhatsApp media category
+CONTENT_TYPE_PREFIXES = {
+    "image": ("image/",),
+    "video": ("video/",),
+    "document": ("application/",)
+}
+
+
+class MediaTooLarge(Exception):
+    """Upload exceeds the size limit for its media type"""
+
+
+class UnsupportedMediaType(Exception):
+    """Upload extension or content type is not allowed"""
+
+
+class TempMediaStore:
+    """Disk-backed store for media served to Meta by URL"""
+
+    def __init__(self, config=whatsapp_config, chunk_size: int = 1024 * 1024):
+        """
+        Args:
+            config: WhatsApp configuration with media limits
+            chunk_size: Bytes read and written per step while streaming
+        """
+        self.config = config
+        self.directory = config.TEMP_MEDIA_DIR
+        self.ttl = config.TEMP_MEDIA_TTL_HOURS * 3600
+        self.quota_bytes = config.TEMP_MEDIA_QUOTA_MB * 1024 * 1024
+        self.sweep_interval = config.TEMP_MEDIA_SWEEP_INTERVAL
+        self.chunk_size = chunk_size
+        self._task: Optional[asyncio.Task] = None
+
+    def media_category(self, extension: str) -> str:
+        """WhatsApp media type for a file extension"""
+        extension = extension.lower()
+        if extension in self.config.ALLOWED_IMAGE_TYPES:
+            return "image"
+        if extension in self.config.ALLOWED_VIDEO_TYPES:
+            return "video"
+        if extension in self.config.ALLOWED_DOCUMENT_TYPES:
+            return "document"
+        raise UnsupportedMediaType(f"File type {extension or '(none)'} is not allowed")
+
+    def max_bytes(self, category: str) -> int:
+        """Size limit for a media category"""
+        limits = {
+            "image": self.config.MAX_IMAGE_SIZE_MB,
+            "video": self.config.MAX_VIDEO_SIZE_MB,
+            "document": self.config.MAX_DOCUMENT_SIZE_MB
+        }
+        return limits[category] * 1024 * 1024
+
+    def path_for(self, media_id: str) -> Optional[str]:
+        """Filesystem path for a media ID, or None if invalid or missing"""
+        if not MEDIA_ID_PATTERN.match(media_id):
+            return None
+        path = os.path.join(self.directory, media_id)
+        return path if os.path.isfile(path) else None
+
+    def read_meta(self, media_id: str) -> Dict[str, Any]:
+        """Sidecar metadata for a stored file (empty if unavailable)"""
+        try:
+            with open(os.path.join(self.directory, media_id + META_SUFFIX)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    async def save(self, upload: UploadFile) -> Dict[str, Any]:
+        """Stream an upload to disk, enforcing type and size limits"""
+        extension = os.path.splitext(upload.filename or "")[1].lower()
+        category = self.media_category(extension)
+
+        content_type = (upload.content_type or "").lower()
+        if content_type and content_type != "application/octet-stream" and \
+                not content_type.startswith(CONTENT_TYPE_PREFIXES[category]):
+            raise UnsupportedMediaType(f"Content type {content_type} does not match {category} file {extension}")
+
+        limit = self.max_bytes(category)
+        media_id = f"{uuid.uuid4()}{extension}"
+        final_path = os.path.join(self.directory, media_id)
+        part_path = final_path + PART_SUFFIX
+
+        await asyncio.to_thread(os.makedirs, self.directory, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+
+        buffer = await asyncio.to_thread(open, part_path, "wb")
+        try:
+            while True:
+                chunk = await upload.read(self.chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > limit:
+                    raise MediaTooLarge(
+                        f"{category.capitalize()} exceeds {limit // (1024 * 1024)} MB limit"
+                    )
+                digest.update(chunk)
+                await asyncio.to_thread(buffer.write, chunk)
+        except BaseException:
+            await asyncio.to_thread(buffer.close)
+            await asyncio.to_thread(_remove, part_path)
+            raise
+
+        await asyncio.to_thread(buffer.close)
+
+        meta = {
+            "id": media_id,
+            "filename": upload.filename,
+            "content_type": content_type or "application/octet-stream",
+            "media_type": category,
+            "size": size,
+            "sha256": digest.hexdigest(),
+            "created_at": time.time()
+        }
+        await asyncio.to_thread(_write_json, final_path + META_SUFFIX, meta)
+        await asyncio.to_thread(os.replace, part_path, final_path)
+        temp_media_bytes.inc(size)
+
+        return {**meta, "path": final_path}
+
+    def sweep(self) -> Tuple[int, int]:
+        """Delete expired files, then oldest files until under quota
+
+        Blocking; run it in a thread. Returns (files removed, bytes kept).
+        """
+        if not os.path.isdir(self.directory):
+            return 0, 0
+
+        now = time.time()
+        files: List[Tuple[float, int, str]] = []
+        removed = 0
+
+        for entry in os.scandir(self.directory):
+            if not entry.is_file() or entry.name.endswith(META_SUFFIX):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                # Another worker's sweeper got there first
+                continue
+            if now - stat.st_mtime > self.ttl:
+                removed += self._delete(entry.path, "expired")
+            elif not entry.name.endswith(PART_SUFFIX):
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.quota_bytes:
+                break
+            removed += self._delete(path, "quota")
+            total -= size
+
+        # Sidecars whose media file is gone (skipping uploads still being renamed)
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(META_SUFFIX) and not os.path.exists(entry.path[:-len(META_SUFFIX)]):
+                try:
+                    if now - entry.stat().st_mtime > 60:
+                        _remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
+        temp_media_bytes.set(total)
+        return removed, total
+
+    def _delete(self, path: str, reason: str) -> int:
+        _remove(path)
+        _remove(path + META_SUFFIX)
+        temp_media_swept_total.labels(reason=reason).inc()
+        return 1
+
+    async def start(self) -> None:
+        """Start the background sweeper"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background sweeper"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                removed, kept = await asyncio.to_thread(self.sweep)
+                if removed:
+                    logger.info(f"Temp media sweep removed {removed} files, {kept} bytes kept")
+            except Exception as e:
+                logger.error(f"Temp media sweep failed: {e}")
+            await asyncio.sleep(self.sweep_interval)
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _write_json(path: str, data: Dict[str, Any]) -> None:
+    with open(path, "w") as f:
+        json.dump(data, f)
+
+
+temp_media_store = TempMediaStore()
@@ -0,0 +1,95 @@
+"""Webhook Redelivery Deduplication
+
+Meta redelivers a webhook whenever it doesn't get a timely 200, so the
+same message can arrive several times. Each inbound `whatsapp_message_id`
+is claimed with a Redis `SET NX` (shared by all workers) before any media
+download or write; a message that is already claimed is acknowledged and
+dropped. A small in-process LRU of recent claims answers repeats within
+the same worker without a Redis round trip.
+
+If processing fails the claim is released and the webhook answered with
+a 500, so Meta redelivers it and the redelivery is processed instead of
+being dropped. When Redis is unavailable messages
+are processed anyway and the unique index on `whatsapp_message_id`
+remains the backstop.
+"""
+import logging
+import os
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from monitoring.metrics import webhook_dedup_checks_total
+
+logger = logging.getLogger(__name__)
+
+REDIS_KEY_PREFIX = "whatsapp:webhook_seen:"
+
+
+def webhook_message_id(webhook_data: Dict[str, Any]) -> Optional[str]:
+    """The inbound message id of a webhook, without touching anything else"""
+    try:
+        value = webhook_data["entry"][0]["changes"][0]["value"]
+        return value["messages"][0]["id"]
+    except (KeyError, IndexError, TypeError):
+        return None
+
+
+class WebhookDeduplicator:
+    """Claims inbound message ids so redeliveries are processed once"""
+
+    def __init__(self, ttl_seconds: int = 86400, local_size: int = 10000):
+        """
+        Args:
+            ttl_seconds: How long a message id is remembered (Meta retries for up to a day)
+            local_size: Recent claims kept in memory by each worker (0 disables)
+        """
+        self.ttl_seconds = ttl_seconds
+        self.local_size = local_size
+        self._recent: "OrderedDict[str, None]" = OrderedDict()
+
+    def _redis(self):
+        from middleware.rate_limiter import get_async_redis
+        return get_async_redis()
+
+    async def claim(self, message_id: str) -> bool:
+        """True if this is the first delivery of the message"""
+        if message_id in self._recent:
+            self._recent.move_to_end(message_id)
+            webhook_dedup_checks_total.labels(result="duplicate_local").inc()
+            return False
+
+        try:
+            first = await self._redis().set(REDIS_KEY_PREFIX + message_id, 1, nx=True, ex=self.ttl_seconds)
+        except Exception as e:
+            logger.warning(f"Webhook dedup unavailable, processing {message_id}: {e}")
+            webhook_dedup_checks_total.labels(result="unavailable").inc()
+            return True
+
+        if not first:
+            # Not cached locally: the claiming worker may still release it
+            webhook_dedup_checks_total.labels(result="duplicate_redis").inc()
+            return False
+        self._remember(message_id)
+        webhook_dedup_checks_total.labels(result="new").inc()
+        return True
+
+    async def release(self, message_id: str) -> None:
+        """Forget a claim whose processing failed, so a redelivery is processed"""
+        self._recent.pop(message_id, None)
+        try:
+            await self._redis().delete(REDIS_KEY_PREFIX + message_id)
+        except Exception as e:
+            logger.warning(f"Could not release webhook claim {message_id}: {e}")
+
+    def _remember(self, message_id: str) -> None:
+        if not self.local_size:
+            return
+        self._recent[message_id] = None
+        if len(self._recent) > self.local_size:
+            self._recent.popitem(last=False)
+
+
+webhook_deduplicator = WebhookDeduplicator(
+    ttl_seconds=int(os.getenv("WEBHOOK_DEDUP_TTL_SECONDS", 86400)),
+    local_size=int(os.getenv("WEBHOOK_DEDUP_LOCAL_SIZE", 10000))
+)
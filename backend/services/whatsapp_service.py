@@ -1,60 +1,136 @@
 """WhatsApp Business API Integration Service"""
-import httpx
+import asyncio
+import logging
 from typing import Optional, Dict, Any
 from datetime import datetime
 from bson import ObjectId
 
-from config.whatsapp_config import whatsapp_config
-from services.sharepoint_service import SharePointService
+from config.whatsapp_config import whatsapp_config, WhatsAppNumber
+from database.connection import Database
+from database.conversation_keys import conversation_keys
+from database.write_buffer import write_buffer, DURABILITY_BATCHED
+from services.media_processor import media_processor
+from services.media_registry import media_registry
+from services.response_cache import response_cache, SCOPE_CONVERSATIONS
+from services.sharepoint_service import SharePointService, sanitize_filename
+from utils.http_client import get_http_client
+from utils.lifecycle import after_fork
+from utils.phone import conversation_key
+from utils.upstream_scheduler import Upstream, get_upstream, parse_retry_after
+
+logger = logging.getLogger(__name__)
+
+# Graph error codes for throughput limits, whatever the HTTP status
+RATE_LIMIT_ERROR_CODES = {4, 80007, 130429, 131056}
+
+# Error codes (or code, subcode) for a media ID the Cloud API won't accept
+MEDIA_ID_ERROR_CODES = {131009, 131052, 131053, (100, 2494102)}
+
+
+class WhatsAppAPIError(Exception):
+    """Raised when the Cloud API rejects a send"""
+
+    def __init__(self, status_code: int, error: Dict[str, Any], retry_after: Optional[float] = None):
+        """
+        Args:
+            status_code: HTTP status of the response
+            error: The response's `error` object
+            retry_after: Seconds from a Retry-After header, if any
+        """
+        super().__init__(f"WhatsApp API returned {status_code}: {error.get('message', error)}")
+        self.status_code = status_code
+        self.error = error
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self) -> bool:
+        """Throttling and server errors; anything else fails the same way again"""
+        return (
+            self.status_code == 429
+            or self.status_code >= 500
+            or self.error.get("code") in RATE_LIMIT_ERROR_CODES
+        )
+
+    @property
+    def media_rejected(self) -> bool:
+        """The media object (an expired or unknown media ID) was refused"""
+        code = self.error.get("code")
+        return code in MEDIA_ID_ERROR_CODES or (code, self.error.get("error_subcode")) in MEDIA_ID_ERROR_CODES
+
 
 class WhatsAppService:
-    """WhatsApp Business API Integration Service"""
+    """WhatsApp Business API Integration Service for one business number
+    
+    Each number is its own upstream: calls go through its own connection
+    pool and scheduler, paced to the number's throughput tier.
+    """
     
-    def __init__(self):
+    def __init__(self, number: Optional[WhatsAppNumber] = None, sharepoint: Optional[SharePointService] = None):
+        """
+        Args:
+            number: Business number (defaults to the first configured)
+            sharepoint: SharePoint client, shared between numbers
+        """
         self.config = whatsapp_config
-        self.sharepoint = SharePointService()
-        self.base_url = f"{self.config.BASE_URL}/{self.config.PHONE_NUMBER_ID}"
+        self.number = number or self.config.numbers()[0]
+        self.sharepoint = sharepoint or SharePointService()
+        self.base_url = f"{self.config.BASE_URL}/{self.number.phone_number_id}"
+        self.pool = f"whatsapp:{self.number.name}"
+    
+    @property
+    def upstream(self) -> Upstream:
+        """This number's request scheduler"""
+        return get_upstream(
+            self.pool,
+            max_concurrency=self.config.WHATSAPP_MAX_CONCURRENCY,
+            rate=self.number.messages_per_second,
+            max_retries=self.config.UPSTREAM_MAX_RETRIES,
+            failure_threshold=self.config.UPSTREAM_FAILURE_THRESHOLD,
+            reset_timeout=self.config.UPSTREAM_RESET_TIMEOUT
+        )
+    
+    def _http_client(self):
+        return get_http_client(self.pool, self.number.max_connections or None)
     
     async def send_text_message(
         self, 
         to_phone: str, 
         message: str,
-        user_id: Optional[str] = None
+        user_id: Optional[str] = None,
+        outbox_id: Optional[str] = None
     ) -> Dict[str, Any]:
-        """Send text message via WhatsApp"""
-        
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{self.base_url}/messages",
-                headers={
-                    "Authorization": f"Bearer {self.config.ACCESS_TOKEN}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "messaging_product": "whatsapp",
-                    "recipient_type": "individual",
-                    "to": to_phone,
-                    "type": "text",
-                    "text": {"body": message}
-                }
+        """Send text message via WhatsApp
+        
+        Raises WhatsAppAPIError if the message was not accepted; accepted
+        messages are stored. Once accepted it never raises, since the
+        caller would send it again: a failed store is logged instead.
+        """
+        response_data = await self._post_message({
+            "messaging_product": "whatsapp",
+            "recipient_type": "individual",
+            "to": to_phone,
+            "type": "text",
+            "text": {"body": message}
+        })
+        
+        # Store message in database
+        message_id = response_data["messages"][0]["id"]
+        try:
+            await self._store_message(
+                whatsapp_message_id=message_id,
+                to_phone=to_phone,
+                from_phone=self.number.phone_number_id,
+                from_user_id=user_id,
+                outbox_id=outbox_id,
+                message_type="text",
+                message_body=message,
+                direction="outbound",
+                status="sent"
             )
-            
-            response_data = response.json()
-            
-            if response.status_code == 200:
-                # Store message in database
-                await self._store_message(
-                    whatsapp_message_id=response_data["messages"][0]["id"],
-                    to_phone=to_phone,
-                    from_phone=self.config.PHONE_NUMBER_ID,
-                    from_user_id=user_id,
-                    message_type="text",
-                    message_body=message,
-                    direction="outbound",
-                    status="sent"
-                )
-            
-            return response_data
+        except Exception as e:
+            logger.error(f"Sent message {message_id} could not be stored: {e}")
+        
+        return response_data
     
     async def send_media_message(
         self,
@@ -64,59 +140,131 @@ class WhatsAppService:
         caption: Optional[str] = None,
         user_id: Optional[str] = None
     ) -> Dict[str, Any]:
-        """Send media message via WhatsApp"""
+        """Send media message via WhatsApp
+        
+        Files uploaded through /upload-temp are sent by media ID from the
+        media registry, so Meta fetches each file once rather than once per
+        recipient. Other URLs, and any registry failure, fall back to `link`.
+        Raises WhatsAppAPIError if the message was not accepted.
+        """
+        link_object = {"link": media_url}
+        media_object = link_object
+        local_media = media_registry.local_media(media_url)
+        
+        if local_media:
+            if media_type == "document" and local_media.get("filename"):
+                link_object["filename"] = local_media["filename"]
+            try:
+                media_id = await media_registry.get_media_id(
+                    Database.get_db(),
+                    local_media,
+                    phone_number_id=self.number.phone_number_id,
+                    access_token=self.number.access_token,
+                    client=self._http_client(),
+                    upstream=self.upstream
+                )
+                media_object = {**link_object, "id": media_id}
+                del media_object["link"]
+            except Exception as e:
+                logger.warning(f"Media registry unavailable, sending by link: {e}")
         
+        try:
+            return await self._post_media(to_phone, media_type, media_object, caption)
+        except WhatsAppAPIError as e:
+            if "id" not in media_object or not e.media_rejected:
+                raise
+            # The ID may have been purged early on Meta's side; retry by link once
+            logger.warning(f"Send by media ID failed, retrying by link: {e}")
+            await media_registry.invalidate(Database.get_db(), local_media, phone_number_id=self.number.phone_number_id)
+            return await self._post_media(to_phone, media_type, link_object, caption)
+    
+    async def _post_media(
+        self,
+        to_phone: str,
+        media_type: str,
+        media_object: Dict[str, Any],
+        caption: Optional[str]
+    ) -> Dict[str, Any]:
         payload = {
             "messaging_product": "whatsapp",
             "recipient_type": "individual",
             "to": to_phone,
             "type": media_type,
-            media_type: {
-                "link": media_url
-            }
+            media_type: dict(media_object)
         }
         
         if caption and media_type in ["image", "video"]:
             payload[media_type]["caption"] = caption
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{self.base_url}/messages",
-                headers={
-                    "Authorization": f"Bearer {self.config.ACCESS_TOKEN}",
-                    "Content-Type": "application/json"
-                },
-                json=payload
+        return await self._post_message(payload)
+    
+    async def _post_message(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """POST to /messages, raising WhatsAppAPIError unless accepted"""
+        # Not retried here: the outbox retries sends durably, after backoff
+        response = await self.upstream.request(
+            self._http_client(),
+            "POST",
+            f"{self.base_url}/messages",
+            retries=0,
+            headers={
+                "Authorization": f"Bearer {self.number.access_token}",
+                "Content-Type": "application/json"
+            },
+            json=payload
+        )
+        
+        try:
+            response_data = response.json()
+        except ValueError:
+            response_data = {}
+        
+        if response.status_code != 200 or not response_data.get("messages"):
+            raise WhatsAppAPIError(
+                response.status_code,
+                response_data.get("error") or {"message": response.text[:200]},
+                retry_after=parse_retry_after(response.headers.get("Retry-After"))
             )
-            
-            return response.json()
+        
+        return response_data
     
     async def download_media(self, media_id: str) -> bytes:
         """Download media from WhatsApp"""
         
-        async with httpx.AsyncClient() as client:
-            # Get media URL
-            media_response = await client.get(
-                f"{self.config.BASE_URL}/{media_id}",
-                headers={"Authorization": f"Bearer {self.config.ACCESS_TOKEN}"}
-            )
-            
-            media_data = media_response.json()
-            media_url = media_data.get("url")
-            
-            # Download media content
-            content_response = await client.get(
-                media_url,
-                headers={"Authorization": f"Bearer {self.config.ACCESS_TOKEN}"}
-            )
-            
-            return content_response.content
+        client = self._http_client()
+        # Get media URL
+        media_response = await self.upstream.request(
+            client,
+            "GET",
+            f"{self.config.BASE_URL}/{media_id}",
+            headers={"Authorization": f"Bearer {self.number.access_token}"},
+            # The rate budget is the number's messaging throughput
+            paced=False
+        )
+        
+        media_data = media_response.json()
+        media_url = media_data.get("url")
+        
+        # Download media content
+        content_response = await self.upstream.request(
+            client,
+            "GET",
+            media_url,
+            headers={"Authorization": f"Bearer {self.number.access_token}"},
+            paced=False
+        )
+        
+        return content_response.content
     
     async def process_incoming_message(
         self, 
-        webhook_data: Dict[str, Any]
+        webhook_data: Dict[str, Any],
+        store_media: bool = True
     ) -> Dict[str, Any]:
-        """Process incoming WhatsApp webhook message"""
+        """Process incoming WhatsApp webhook message
+        
+        With `store_media` False, media is only identified (`media_id`,
+        `filename`) and left for the job runner to fetch and upload.
+        """
         
         entry = webhook_data.get("entry", [])[0]
         changes = entry.get("changes", [])[0]
@@ -145,40 +293,135 @@ class WhatsAppService:
         
         elif message_type in ["image", "video", "document"]:
             media = message.get(message_type, {})
-            media_id = media.get("id")
-            filename = media.get("filename", f"{message_type}_{message_id}")
-            
-            # Download and upload to SharePoint
-            media_content = await self.download_media(media_id)
-            
-            sharepoint_result = await self.sharepoint.upload_file(
-                file_content=media_content,
-                filename=filename,
-                folder_path=f"{self.config.SHAREPOINT_ROOT_FOLDER}/General",
-                metadata={
-                    "whatsapp_message_id": message_id,
-                    "sender_phone": from_phone,
-                    "received_at": timestamp.isoformat()
-                }
-            )
-            
             result["media"] = {
-                "media_id": media_id,
-                "filename": filename,
-                "sharepoint_url": sharepoint_result["web_url"]
+                "media_id": media.get("id"),
+                "filename": media.get("filename", f"{message_type}_{message_id}")
             }
+            if store_media:
+                result["media"].update(await self.store_media(
+                    result["media"]["media_id"],
+                    result["media"]["filename"],
+                    message_type,
+                    message_id=message_id,
+                    from_phone=from_phone,
+                    timestamp=timestamp
+                ))
         
         return result
     
-    async def _store_message(self, **kwargs) -> str:
-        """Store message in database"""
-        from database import Database
-        db = Database.get_db()
+    async def store_media(
+        self,
+        media_id: str,
+        filename: str,
+        media_type: str,
+        message_id: str,
+        from_phone: str,
+        timestamp: datetime,
+        conflict_behavior: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Download inbound media, build renditions, and upload them to SharePoint
+        
+        Returns the stored `filename` and the `sharepoint_url`,
+        `thumbnail_url` and `web_url` of the uploads.
+        `conflict_behavior` is passed to the uploads (default from config).
+        """
+        media_content = await self.download_media(media_id)
+        processed = await media_processor.process(media_content, filename, media_type)
+        
+        metadata = {
+            "whatsapp_message_id": message_id,
+            "sender_phone": from_phone,
+            "received_at": timestamp.isoformat()
+        }
+        folder_path = await self._media_folder(from_phone, timestamp)
+        files = [processed["original"], *processed["renditions"].values()]
+        
+        uploads = await asyncio.gather(*[
+            self.sharepoint.upload_file(
+                file_content=content,
+                filename=name,
+                folder_path=folder_path,
+                metadata=metadata,
+                conflict_behavior=conflict_behavior
+            )
+            for content, name, _ in files
+        ])
+        renditions = dict(zip(processed["renditions"], uploads[1:]))
+        
+        return {
+            "filename": processed["original"][1],
+            "sharepoint_url": uploads[0]["web_url"],
+            "thumbnail_url": renditions["thumb"]["web_url"] if "thumb" in renditions else None,
+            "web_url": renditions["web"]["web_url"] if "web" in renditions else None
+        }
+    
+    async def _media_folder(self, contact: str, timestamp: datetime) -> str:
+        """SharePoint folder for a contact's media under the configured layout"""
+        layout = self.config.SHAREPOINT_FOLDER_LAYOUT
+        values = {
+            "year": f"{timestamp:%Y}",
+            "month": f"{timestamp:%m}",
+            "day": f"{timestamp:%d}",
+            "contact": contact,
+            "entity_type": "Unlinked",
+            "entity_id": "Unlinked"
+        }
+        
+        if "{entity_" in layout:
+            # The entity most recently linked to a message to this contact
+            link = await Database.get_db().whatsapp_entity_links.find_one(
+                {conversation_keys.field: conversation_key(contact)},
+                sort=[("created_at", -1)]
+            )
+            if link:
+                values["entity_type"] = link["entity_type"]
+                values["entity_id"] = str(link["entity_id"])
+        
+        segments = [sanitize_filename(segment.format(**values)) for segment in layout.split("/") if segment]
+        return "/".join([self.number.sharepoint_folder.rstrip("/"), *segments])
+    
+    async def _store_message(self, durability: str = DURABILITY_BATCHED, **kwargs) -> str:
+        """Store message in database through the write-behind buffer
         
+        The contact's conversation key is computed here, once, for both
+        directions.
+        """
+        contact = kwargs.get("from_phone") if kwargs.get("direction") == "inbound" else kwargs.get("to_phone")
+        key = conversation_key(contact)
         doc = {
             **kwargs,
+            "other_party": key,
+            "conversation_key": key,
             "created_at": datetime.now()
         }
         
-        result = await db.whatsapp_messages.insert_one(doc)
-        return str(result.inserted_id)
+        inserted_id = await write_buffer.insert("whatsapp_messages", doc, durability=durability)
+        await response_cache.bump(SCOPE_CONVERSATIONS)
+        return str(inserted_id)
+
+
+_services: Dict[str, WhatsAppService] = {}
+_sharepoint: Optional[SharePointService] = None
+
+
+def get_whatsapp_service(number: Optional[WhatsAppNumber] = None) -> WhatsAppService:
+    """This process's service for a business number (default: the first), created on first use"""
+    global _sharepoint
+    if number is None:
+        from services.number_registry import number_registry
+        number = number_registry.default
+    service = _services.get(number.name)
+    if service is None:
+        # One SharePoint token cache for all numbers
+        if _sharepoint is None:
+            _sharepoint = SharePointService()
+        service = _services[number.name] = WhatsAppService(number, sharepoint=_sharepoint)
+    return service
+
+
+@after_fork
+def _forget_whatsapp_service() -> None:
+    # Token and folder caches, pacing and pools are per process
+    global _sharepoint
+    _services.clear()
+    _sharepoint = None
@@ -0,0 +1,49 @@
+import asyncio
+import os
+import sys
+import uuid
+
+import pytest
+
+# Backend modules import each other as top-level packages (run from backend/)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MONGODB_TEST_URI = os.getenv("MONGODB_TEST_URI", "mongodb://localhost:27017")
+
+
+@pytest.fixture(scope="session")
+def mongo_uri():
+    """MONGODB_TEST_URI if a mongod answers there; skips the requesting tests otherwise"""
+    pymongo = pytest.importorskip("pymongo")
+    client = pymongo.MongoClient(MONGODB_TEST_URI, serverSelectionTimeoutMS=500)
+    try:
+        client.admin.command("ping")
+    except pymongo.errors.PyMongoError:
+        pytest.skip(f"No mongod reachable at {MONGODB_TEST_URI}")
+    finally:
+        client.close()
+    return MONGODB_TEST_URI
+
+
+@pytest.fixture
+def run_with_mongo(mongo_uri):
+    """Run a coroutine function against a scratch database, dropped afterwards"""
+    motor = pytest.importorskip("motor.motor_asyncio")
+    name = f"test_{uuid.uuid4().hex[:12]}"
+
+    def run(scenario):
+        async def main():
+            client = motor.AsyncIOMotorClient(mongo_uri)
+            try:
+                return await scenario(client[name])
+            finally:
+                client.close()
+        return asyncio.run(main())
+
+    yield run
+
+    async def drop():
+        client = motor.AsyncIOMotorClient(mongo_uri)
+        await client.drop_database(name)
+        client.close()
+    asyncio.run(drop())
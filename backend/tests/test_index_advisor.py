@@ -0,0 +1,56 @@
+import pytest
+
+from database.index_advisor import (
+    MODE_FAIL,
+    IndexAdvisorError,
+    QueryShape,
+    check_query_plans,
+)
+
+FIND_SORTED = QueryShape("items_by_kind", "items", {
+    "find": "items",
+    "filter": {"kind": "a"},
+    "sort": {"rank": -1},
+    "limit": 10
+})
+
+GROUP_AFTER_SORT = QueryShape("latest_per_kind", "items", {
+    "aggregate": "items",
+    "pipeline": [
+        {"$sort": {"kind": 1, "rank": -1}},
+        {"$group": {"_id": "$kind", "top": {"$first": "$$ROOT"}}}
+    ],
+    "cursor": {}
+})
+
+
+async def _seed(db):
+    await db.items.insert_many([{"kind": kind, "rank": rank} for kind in "abc" for rank in range(20)])
+
+
+def test_flags_collscan_and_in_memory_sort(run_with_mongo):
+    async def scenario(db):
+        await _seed(db)
+        return await check_query_plans(db, shapes=[FIND_SORTED, GROUP_AFTER_SORT])
+
+    report = run_with_mongo(scenario)
+    assert report["items_by_kind"] == ["COLLSCAN", "in-memory SORT"]
+    assert "in-memory SORT" in report["latest_per_kind"]
+
+
+def test_indexed_shapes_pass(run_with_mongo):
+    async def scenario(db):
+        await _seed(db)
+        await db.items.create_index([("kind", 1), ("rank", -1)])
+        return await check_query_plans(db, shapes=[FIND_SORTED, GROUP_AFTER_SORT])
+
+    assert run_with_mongo(scenario) == {"items_by_kind": [], "latest_per_kind": []}
+
+
+def test_fail_mode_raises(run_with_mongo):
+    async def scenario(db):
+        await _seed(db)
+        await check_query_plans(db, mode=MODE_FAIL, shapes=[FIND_SORTED])
+
+    with pytest.raises(IndexAdvisorError):
+        run_with_mongo(scenario)
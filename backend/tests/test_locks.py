@@ -0,0 +1,45 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("motor")
+
+from database.locks import DistributedLock  # noqa: E402
+
+
+def test_only_one_owner_holds_the_lock(run_with_mongo):
+    async def scenario(db):
+        first, second = DistributedLock(db, "leader"), DistributedLock(db, "leader")
+        results = [await first.acquire(), await second.acquire(), await first.acquire()]
+        await first.release()
+        results.append(await second.acquire())
+        return results
+
+    # Held, refused, renewed by its owner, free again after release
+    assert run_with_mongo(scenario) == [True, False, True, True]
+
+
+def test_concurrent_acquires_have_a_single_winner(run_with_mongo):
+    async def scenario(db):
+        locks = [DistributedLock(db, "leader") for _ in range(8)]
+        return await asyncio.gather(*(lock.acquire() for lock in locks))
+
+    assert sum(run_with_mongo(scenario)) == 1
+
+
+def test_expired_lease_can_be_taken_over(run_with_mongo):
+    async def scenario(db):
+        stale, fresh = DistributedLock(db, "leader", ttl=60), DistributedLock(db, "leader", ttl=60)
+        await stale.acquire()
+        await db.distributed_locks.update_one(
+            {"_id": "leader"},
+            {"$set": {"expires_at": datetime.utcnow() - timedelta(seconds=1)}}
+        )
+        taken = await fresh.acquire()
+        # The stale owner's release must not drop the new owner's lease
+        await stale.release()
+        holder = await db.distributed_locks.find_one({"_id": "leader"})
+        return taken, holder["owner"] == fresh.owner, await stale.acquire()
+
+    assert run_with_mongo(scenario) == (True, True, False)
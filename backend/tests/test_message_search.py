@@ -0,0 +1,151 @@
+import asyncio
+import base64
+from datetime import datetime, timedelta
+
+import pytest
+
+message_search = pytest.importorskip("services.message_search")
+
+from bson import ObjectId  # noqa: E402
+
+ARCHIVE_COLLECTION = "whatsapp_messages_2026_01"
+HOT_CUTOFF = datetime(2026, 3, 1)
+
+
+class FakeArchiver:
+    def hot_cutoff(self):
+        return HOT_CUTOFF
+
+    async def archive_collections(self, db, before=None, after=None):
+        return [ARCHIVE_COLLECTION]
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def to_list(self, length):
+        return self.docs[:length]
+
+
+class FakeCollection:
+    """Evaluates the search pipeline's keyset $match, $sort and $limit"""
+
+    def __init__(self, docs, pipelines):
+        self.docs = docs
+        self.pipelines = pipelines
+
+    def aggregate(self, pipeline, maxTimeMS=None):
+        self.pipelines.append(pipeline)
+        docs = list(self.docs)
+        for stage in pipeline:
+            if "$or" in stage.get("$match", {}):
+                docs = [doc for doc in docs if any(_matches(doc, clause) for clause in stage["$match"]["$or"])]
+            elif "$sort" in stage:
+                docs.sort(key=lambda doc: (doc["score"], doc["created_at"], doc["_id"]), reverse=True)
+            elif "$limit" in stage:
+                docs = docs[:stage["$limit"]]
+        return FakeCursor(docs)
+
+
+def _matches(doc, clause):
+    for field, condition in clause.items():
+        if isinstance(condition, dict):
+            if not doc[field] < condition["$lt"]:
+                return False
+        elif doc[field] != condition:
+            return False
+    return True
+
+
+def _message(score, created_at):
+    return {"_id": ObjectId(), "score": score, "created_at": created_at, "message_body": "quotation"}
+
+
+@pytest.fixture
+def tiers():
+    day = timedelta(days=1)
+    hot = [_message(2.0, HOT_CUTOFF + day), _message(1.5, HOT_CUTOFF + 2 * day), _message(1.0, HOT_CUTOFF + day)]
+    archive = [_message(2.0, HOT_CUTOFF - 30 * day), _message(1.5, HOT_CUTOFF - 30 * day), _message(1.5, HOT_CUTOFF - 30 * day)]
+    pipelines = []
+    db = {
+        message_search.HOT_COLLECTION: FakeCollection(hot, pipelines),
+        ARCHIVE_COLLECTION: FakeCollection(archive, pipelines)
+    }
+    return db, hot + archive, pipelines
+
+
+def _search(db, **kwargs):
+    search = message_search.MessageSearch(archiver=FakeArchiver())
+    return asyncio.run(search.search(db, "quotation", **kwargs))
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2026, 3, 4, 5, 6, 7, 890123)
+    message_id = ObjectId()
+    cursor = message_search.encode_cursor(0.75, created_at, message_id)
+    assert message_search.decode_cursor(cursor) == (0.75, created_at, message_id)
+
+
+@pytest.mark.parametrize("cursor", [
+    "not a cursor",
+    base64.urlsafe_b64encode(b'{"score": 1}').decode(),
+    base64.urlsafe_b64encode(b'[1.0, "2026-03-04T05:06:07"]').decode(),
+    base64.urlsafe_b64encode(b'[1.0, "yesterday", "65f0a1b2c3d4e5f601234567"]').decode(),
+    base64.urlsafe_b64encode(b'[1.0, "2026-03-04T05:06:07", "not-an-object-id"]').decode(),
+])
+def test_invalid_cursor_is_rejected(cursor):
+    with pytest.raises(message_search.InvalidSearchCursor):
+        message_search.decode_cursor(cursor)
+
+
+def test_invalid_cursor_is_a_400(monkeypatch):
+    whatsapp_routes = pytest.importorskip("routes.whatsapp_routes")
+    from fastapi import HTTPException
+
+    monkeypatch.setattr(whatsapp_routes.Database, "get_db", classmethod(lambda cls, profile=None: {}))
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(whatsapp_routes.search_messages(
+            q="quotation", phone=None, direction=None, start_date=None, end_date=None,
+            entity_type=None, entity_id=None, limit=20, cursor="not a cursor",
+            current_user={"user_id": "staff"}
+        ))
+    assert error.value.status_code == 400
+
+
+def test_pages_follow_one_keyset_order_across_tiers(tiers):
+    db, messages, _ = tiers
+    expected = [doc["_id"] for doc in sorted(
+        messages, key=lambda doc: (doc["score"], doc["created_at"], doc["_id"]), reverse=True
+    )]
+
+    seen, cursor = [], None
+    while True:
+        page = _search(db, start_date=HOT_CUTOFF - timedelta(days=60), limit=2, cursor=cursor)
+        seen += [result["id"] for result in page["results"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert seen == expected
+
+
+def test_archives_are_skipped_inside_the_hot_window(tiers):
+    db, _, pipelines = tiers
+    page = _search(db, start_date=HOT_CUTOFF + timedelta(hours=1))
+    assert len(pipelines) == 1
+    assert len(page["results"]) == 3
+
+
+@pytest.mark.parametrize("phone, expected", [
+    ("+91 98765 43210", "919876543210"),
+    ("0091-98765-43210", "919876543210"),
+    ("+91 98", {"$regex": "^9198"}),
+    ("0091 98", {"$regex": "^9198"}),
+    ("98765", {"$regex": "^98765"}),
+])
+def test_phone_filter_is_decided_on_normalized_digits(tiers, phone, expected):
+    db, _, pipelines = tiers
+    _search(db, phone=phone)
+    field = message_search.conversation_keys.field
+    assert pipelines[0][0]["$match"][field] == expected
@@ -0,0 +1,108 @@
+import asyncio
+
+import pytest
+
+message_status = pytest.importorskip("services.message_status")
+
+
+class FakeMessages:
+    """whatsapp_messages stand-in recording bulk writes"""
+
+    def __init__(self, fail=False, during_write=None):
+        self.fail = fail
+        self.during_write = during_write
+        self.writes = []
+
+    async def bulk_write(self, operations, ordered):
+        self.writes.append(operations)
+        if self.during_write:
+            self.during_write()
+        if self.fail:
+            raise ConnectionError("primary stepped down")
+        return type("Result", (), {"matched_count": len(operations), "modified_count": 0})()
+
+
+@pytest.fixture
+def messages(monkeypatch):
+    from database.connection import Database
+
+    messages = FakeMessages()
+    monkeypatch.setattr(Database, "get_db", classmethod(lambda cls: type("DB", (), {"whatsapp_messages": messages})()))
+    return messages
+
+
+def callback(message_id, state, timestamp):
+    return {"id": message_id, "status": state, "timestamp": str(timestamp)}
+
+
+def test_callbacks_coalesce_to_the_furthest_state():
+    async def scenario():
+        ingestor = message_status.MessageStatusIngestor(flush_interval=60)
+        ingestor.add([
+            callback("wamid.A", "sent", 100),
+            callback("wamid.A", "read", 102),
+            callback("wamid.A", "delivered", 101),  # arrives after read
+            callback("wamid.A", "sent", 100),  # redelivered
+            callback("wamid.B", "delivered", 101),
+            callback("wamid.B", "failed", 103),
+        ])
+        return ingestor._pending
+
+    pending = asyncio.run(scenario())
+    assert pending["wamid.A"]["status"] == "read"
+    assert set(pending["wamid.A"]["timestamps"]) == {"sent", "delivered", "read"}
+    assert pending["wamid.B"]["status"] == "failed"
+
+
+def test_flush_only_moves_states_forward(messages):
+    async def scenario():
+        ingestor = message_status.MessageStatusIngestor(flush_interval=60)
+        ingestor.add([callback("wamid.A", "delivered", 101)])
+        await ingestor.stop()
+
+    asyncio.run(scenario())
+    (update,), = messages.writes
+    assert update._filter == {"whatsapp_message_id": "wamid.A", "status": {"$in": ["sent"]}}
+    assert update._doc["$set"]["status"] == "delivered"
+
+
+def test_failed_flush_merges_back_under_newer_callbacks(messages):
+    ingestor = message_status.MessageStatusIngestor(flush_interval=60)
+    messages.fail = True
+    # Queued while the failing write is in flight
+    messages.during_write = lambda: ingestor.add([
+        callback("wamid.A", "read", 102),
+        callback("wamid.B", "sent", 100),
+    ])
+
+    async def scenario():
+        ingestor.add([
+            callback("wamid.A", "delivered", 101),
+            callback("wamid.B", "delivered", 101),
+        ])
+        await ingestor.flush()
+        return ingestor._pending
+
+    pending = asyncio.run(scenario())
+    assert pending["wamid.A"]["status"] == "read"
+    assert pending["wamid.B"]["status"] == "delivered"
+    assert set(pending["wamid.A"]["timestamps"]) == {"delivered", "read"}
+    assert set(pending["wamid.B"]["timestamps"]) == {"sent", "delivered"}
+
+
+def test_backlog_past_max_pending_flushes_early_from_one_task(messages):
+    async def scenario():
+        ingestor = message_status.MessageStatusIngestor(flush_interval=60, max_pending=2)
+        tasks_before = len(asyncio.all_tasks())
+        for n in range(3):
+            ingestor.add([callback(f"wamid.{n}", "sent", 100), callback(f"wamid.{n}.b", "sent", 100)])
+        tasks_after = len(asyncio.all_tasks())
+        await asyncio.sleep(0.01)
+        pending = dict(ingestor._pending)
+        await ingestor.stop()
+        return tasks_after - tasks_before, pending
+
+    new_tasks, pending = asyncio.run(scenario())
+    assert new_tasks == 1
+    assert pending == {}
+    assert sum(len(operations) for operations in messages.writes) == 6
@@ -0,0 +1,31 @@
+import pytest
+
+pytest.importorskip("motor")
+
+from database.migrations import MIGRATIONS, MigrationRunner  # noqa: E402
+
+
+def test_run_twice_applies_nothing_the_second_time(run_with_mongo):
+    async def scenario(db):
+        first = await MigrationRunner(db).run()
+        second = await MigrationRunner(db).run()
+        return first, second, await MigrationRunner(db).applied_versions()
+
+    first, second, applied = run_with_mongo(scenario)
+    assert first == [m.version for m in MIGRATIONS]
+    assert second == []
+    assert applied == first
+
+
+def test_migrations_reapply_cleanly_over_their_own_schema(run_with_mongo):
+    # A crash after a migration's changes but before its record is written
+    async def scenario(db):
+        await MigrationRunner(db).run()
+        indexes_before = await db.whatsapp_messages.index_information()
+        await db.schema_migrations.delete_many({})
+        reapplied = await MigrationRunner(db).run()
+        return reapplied, indexes_before, await db.whatsapp_messages.index_information()
+
+    reapplied, indexes_before, indexes_after = run_with_mongo(scenario)
+    assert reapplied == [m.version for m in MIGRATIONS]
+    assert indexes_after == indexes_before
@@ -0,0 +1,74 @@
+import pytest
+
+from utils.phone import InvalidPhoneNumber, conversation_key, is_national, normalize_phone
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("9876543210", "+919876543210"),
+    ("09876543210", "+919876543210"),
+    ("098765 43210", "+919876543210"),
+    ("+91 98765-43210", "+919876543210"),
+    ("0091 9876543210", "+919876543210"),
+    ("919876543210", "+919876543210"),
+])
+def test_normalize_indian_numbers(value, expected):
+    assert normalize_phone(value) == expected
+
+
+@pytest.mark.parametrize("value, expected", [
+    # Foreign numbers of 10 digits or fewer keep their own country code
+    ("+65 8123 4567", "+6581234567"),
+    ("006581234567", "+6581234567"),
+    ("+45 12 34 56 78", "+4512345678"),
+    ("+1 (415) 555-0100", "+14155550100"),
+    ("4791234567", "+914791234567"),  # bare national length reads as Indian
+    ("479123456", "+479123456"),
+    ("14155550100", "+14155550100"),
+])
+def test_normalize_foreign_numbers(value, expected):
+    assert normalize_phone(value) == expected
+
+
+def test_normalize_custom_country_code():
+    assert normalize_phone("020 7946 0018", default_country_code="44") == "+442079460018"
+
+
+@pytest.mark.parametrize("value", ["", "111", "+12", "not a number", "+91 98765 4321x", "1234567890123456"])
+def test_normalize_rejects_invalid(value):
+    with pytest.raises(InvalidPhoneNumber):
+        normalize_phone(value)
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("9876543210", True),
+    ("09876543210", True),
+    ("+9876543210", False),
+    ("009876543210", False),
+    ("6581234567", True),
+    ("919876543210", False),
+])
+def test_is_national(value, expected):
+    assert is_national(value) is expected
+
+
+@pytest.mark.parametrize("wa_id", [
+    "6581234567",  # Singapore
+    "4512345678",  # Denmark
+    "4791234567",  # Norway
+    "85212345678",  # Hong Kong
+    "919876543210",
+])
+def test_conversation_key_keeps_wa_ids(wa_id):
+    assert conversation_key(wa_id) == wa_id
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("+65 8123 4567", "6581234567"),
+    ("006581234567", "6581234567"),
+    ("+91-98765-43210", "919876543210"),
+    ("abc", "abc"),
+    ("whatsapp:123", "123"),
+    ("", ""),
+])
+def test_conversation_key_formats(value, expected):
+    assert conversation_key(value) == expected
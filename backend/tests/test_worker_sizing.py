@@ -0,0 +1,102 @@
+import os
+
+import pytest
+
+from utils.worker_sizing import cpu_quota, memory_limit, plan_workers
+
+GIB = 1024 ** 3
+
+
+@pytest.fixture(autouse=True)
+def eight_cpus(monkeypatch):
+    monkeypatch.setattr(os, "sched_getaffinity", lambda pid: set(range(8)), raising=False)
+
+
+def cgroup_v2(root, cpu_max=None, memory_max=None):
+    if cpu_max is not None:
+        (root / "cpu.max").write_text(f"{cpu_max}\n")
+    if memory_max is not None:
+        (root / "memory.max").write_text(f"{memory_max}\n")
+    return str(root)
+
+
+def cgroup_v1(root, quota=None, period=100000, memory_limit_in_bytes=None):
+    (root / "cpu").mkdir()
+    (root / "memory").mkdir()
+    if quota is not None:
+        (root / "cpu" / "cpu.cfs_quota_us").write_text(f"{quota}\n")
+        (root / "cpu" / "cpu.cfs_period_us").write_text(f"{period}\n")
+    if memory_limit_in_bytes is not None:
+        (root / "memory" / "memory.limit_in_bytes").write_text(f"{memory_limit_in_bytes}\n")
+    return str(root)
+
+
+@pytest.mark.parametrize("cpu_max, expected", [
+    ("200000 100000", 2.0),
+    ("150000 100000", 1.5),
+    ("max 100000", 8.0),
+    ("1600000 100000", 8.0),  # quota above the CPUs we may run on
+])
+def test_cpu_quota_v2(tmp_path, cpu_max, expected):
+    assert cpu_quota(cgroup_v2(tmp_path, cpu_max=cpu_max)) == expected
+
+
+@pytest.mark.parametrize("quota, expected", [
+    (50000, 0.5),
+    (300000, 3.0),
+    (-1, 8.0),
+])
+def test_cpu_quota_v1(tmp_path, quota, expected):
+    assert cpu_quota(cgroup_v1(tmp_path, quota=quota)) == expected
+
+
+def test_cpu_quota_without_cgroup_uses_affinity(tmp_path):
+    assert cpu_quota(str(tmp_path)) == 8.0
+
+
+@pytest.mark.parametrize("memory_max, expected", [
+    (str(2 * GIB), 2 * GIB),
+    ("max", None),
+])
+def test_memory_limit_v2(tmp_path, memory_max, expected):
+    assert memory_limit(cgroup_v2(tmp_path, memory_max=memory_max)) == expected
+
+
+@pytest.mark.parametrize("limit_in_bytes, expected", [
+    (GIB, GIB),
+    (9223372036854771712, None),  # v1's "unlimited"
+])
+def test_memory_limit_v1(tmp_path, limit_in_bytes, expected):
+    assert memory_limit(cgroup_v1(tmp_path, memory_limit_in_bytes=limit_in_bytes)) == expected
+
+
+def test_memory_limit_without_cgroup(tmp_path):
+    assert memory_limit(str(tmp_path)) is None
+
+
+def test_plan_sized_by_cpu_quota(tmp_path):
+    root = cgroup_v2(tmp_path, cpu_max="400000 100000", memory_max="max")
+    plan = plan_workers(cpu_quota(root), memory_limit(root))
+    assert (plan["workers"], plan["limited_by"]) == (4, "cpu")
+    assert plan["mongo_max_pool_size"] + plan["mongo_analytics_max_pool_size"] == 25
+    assert plan["http_max_connections"] == 50
+
+
+def test_plan_sized_by_memory_limit(tmp_path):
+    # 80% of 1.5 GiB fits two 512 MB workers, though the quota allows four
+    root = cgroup_v1(tmp_path, quota=400000, memory_limit_in_bytes=3 * GIB // 2)
+    plan = plan_workers(cpu_quota(root), memory_limit(root))
+    assert (plan["workers"], plan["limited_by"]) == (2, "memory")
+    assert plan["memory_limit_bytes"] == 3 * GIB // 2
+
+
+def test_plan_keeps_one_worker_below_a_worker_of_memory(tmp_path):
+    root = cgroup_v2(tmp_path, cpu_max="200000 100000", memory_max=str(256 * 1024 * 1024))
+    plan = plan_workers(cpu_quota(root), memory_limit(root))
+    assert (plan["workers"], plan["limited_by"]) == (1, "memory")
+
+
+def test_plan_unlimited_container_is_capped_by_max_workers(tmp_path):
+    root = cgroup_v2(tmp_path, cpu_max="max 100000", memory_max="max")
+    plan = plan_workers(cpu_quota(root), memory_limit(root), workers_per_cpu=3, max_workers=16)
+    assert (plan["workers"], plan["limited_by"]) == (16, "max_workers")
@@ -0,0 +1,160 @@
+"""File Responses with Range, ETag and Zero-Copy Support
+
+Uses the ASGI `http.response.zerocopysend` extension (sendfile) when the
+server offers it, and falls back to threaded chunked reads otherwise.
+"""
+import os
+from email.utils import formatdate
+from typing import Mapping, Optional, Tuple
+
+import anyio
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+ZEROCOPY_EXTENSION = "http.response.zerocopysend"
+CHUNK_SIZE = 256 * 1024
+
+
+class RangeNotSatisfiable(Exception):
+    """Requested byte range lies outside the file"""
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single `bytes=` range into inclusive (start, end)
+
+    Returns None when there is no usable range (absent, malformed or
+    multi-range), which means the full file is served.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+
+    start_text, _, end_text = header[len("bytes="):].strip().partition("-")
+    try:
+        if start_text:
+            start = int(start_text)
+            end = int(end_text) if end_text else size - 1
+        else:
+            # Suffix range: the last N bytes
+            suffix = int(end_text)
+            if suffix == 0:
+                raise RangeNotSatisfiable()
+            start = max(0, size - suffix)
+            end = size - 1
+    except ValueError:
+        return None
+
+    if start >= size or start > end:
+        raise RangeNotSatisfiable()
+    return start, min(end, size - 1)
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag"""
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in header.split(",")]
+    return any(tag.replace("W/", "", 1) == etag for tag in candidates)
+
+
+class RangeFileResponse(Response):
+    """Serve a file with conditional GET and single byte-range support"""
+
+    def __init__(
+        self,
+        path: str,
+        stat: os.stat_result,
+        request_headers: Mapping[str, str],
+        media_type: str = "application/octet-stream",
+        etag: Optional[str] = None,
+        method: str = "GET",
+        headers: Optional[Mapping[str, str]] = None
+    ):
+        """
+        Args:
+            path: File to serve
+            stat: The file's os.stat() result, taken off the event loop by the caller
+            request_headers: Incoming request headers
+            media_type: Content-Type of the file
+            etag: Strong validator (quoted); defaults to mtime and size
+            method: GET or HEAD
+            headers: Extra response headers
+        """
+        self.path = path
+        self.size = stat.st_size
+        self.send_body = method != "HEAD"
+        self.etag = etag or f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+        self.start, self.end = 0, self.size - 1
+        self.length = 0
+
+        response_headers = {
+            "etag": self.etag,
+            "last-modified": formatdate(stat.st_mtime, usegmt=True),
+            "accept-ranges": "bytes",
+            **{k.lower(): v for k, v in (headers or {}).items()}
+        }
+
+        if etag_matches(request_headers.get("if-none-match"), self.etag):
+            status_code = 304
+        else:
+            status_code = 200
+            if_range = request_headers.get("if-range")
+            try:
+                byte_range = None
+                if if_range is None or if_range == self.etag:
+                    byte_range = parse_range(request_headers.get("range"), self.size)
+            except RangeNotSatisfiable:
+                status_code = 416
+                response_headers["content-range"] = f"bytes */{self.size}"
+            else:
+                if byte_range is not None:
+                    status_code = 206
+                    self.start, self.end = byte_range
+                    response_headers["content-range"] = f"bytes {self.start}-{self.end}/{self.size}"
+                self.length = self.end - self.start + 1 if self.size else 0
+                response_headers["content-type"] = media_type
+            response_headers["content-length"] = str(self.length)
+
+        super().__init__(status_code=status_code, headers=response_headers)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({
+            "type": "http.response.start",
+            "status": self.status_code,
+            "headers": self.raw_headers
+        })
+
+        if not self.send_body or self.length == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        file = await anyio.to_thread.run_sync(open, self.path, "rb")
+        try:
+            if ZEROCOPY_EXTENSION in scope.get("extensions", {}):
+                await send({
+                    "type": ZEROCOPY_EXTENSION,
+                    "file": file,
+                    "offset": self.start,
+                    "count": self.length,
+                    "more_body": False
+                })
+                return
+
+            await anyio.to_thread.run_sync(file.seek, self.start)
+            remaining = self.length
+            while remaining > 0:
+                chunk = await anyio.to_thread.run_sync(file.read, min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({
+                    "type": "http.response.body",
+                    "body": chunk,
+                    "more_body": remaining > 0
+                })
+            if remaining > 0:
+                # File shrank underneath us; terminate the body
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            await anyio.to_thread.run_sync(file.close)
@@ -0,0 +1,58 @@
+"""Shared Outbound HTTP Client
+
+One httpx.AsyncClient per worker process, so calls to the WhatsApp Cloud
+API and Microsoft Graph reuse pooled keep-alive connections instead of
+paying a TLS handshake per request. The pool is capped at
+HTTP_MAX_CONNECTIONS, which worker sizing derives from the container's
+HTTP_CONNECTION_BUDGET. Callers pass `timeout=` per request when they
+need longer than the default.
+
+Named pools keep one caller's backlog from taking another's connections;
+each WhatsApp business number sends through its own pool.
+"""
+import os
+from typing import Dict, Optional
+
+import httpx
+
+from utils.lifecycle import after_fork
+
+DEFAULT_TIMEOUT = 5.0
+DEFAULT_POOL = "default"
+
+_clients: Dict[str, httpx.AsyncClient] = {}
+
+
+def get_http_client(pool: str = DEFAULT_POOL, max_connections: Optional[int] = None) -> httpx.AsyncClient:
+    """This process's outbound HTTP client for a pool, created on first use
+
+    Args:
+        pool: Pool name
+        max_connections: Connection cap for a new pool (default HTTP_MAX_CONNECTIONS)
+    """
+    client = _clients.get(pool)
+    if client is None or client.is_closed:
+        max_connections = max_connections or int(os.getenv("HTTP_MAX_CONNECTIONS", 100))
+        client = _clients[pool] = httpx.AsyncClient(
+            timeout=DEFAULT_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max(1, max_connections // 2),
+                keepalive_expiry=30.0
+            )
+        )
+    return client
+
+
+async def close_http_client() -> None:
+    """Close pooled connections (lifespan shutdown)"""
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        await client.aclose()
+
+
+@after_fork
+def _forget_http_client() -> None:
+    # Connections belong to the parent's event loop
+    _clients.clear()
@@ -0,0 +1,95 @@
+"""Image Renditions for WhatsApp Media
+
+Pure functions run inside the media processing pool, so this module only
+imports Pillow and the standard library and stays cheap to load in a
+spawned worker.
+"""
+import io
+from typing import Any, Dict, Tuple
+
+from PIL import Image, ImageOps
+
+EXIF_ORIENTATION = 0x0112
+
+# Pillow format name -> (extension, content type) for re-saved originals
+ORIGINAL_FORMATS = {
+    "JPEG": (".jpg", "image/jpeg"),
+    "PNG": (".png", "image/png"),
+    "WEBP": (".webp", "image/webp")
+}
+
+
+def _flatten(image: Image.Image) -> Image.Image:
+    """RGB copy of an image, compositing transparency onto white"""
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.split()[-1])
+        return background
+    return image.convert("RGB")
+
+
+def _jpeg(image: Image.Image, max_edge: int, quality: int) -> bytes:
+    rendition = _flatten(image)
+    rendition.thumbnail((max_edge, max_edge), Image.LANCZOS)
+    output = io.BytesIO()
+    rendition.save(output, "JPEG", quality=quality, optimize=True, progressive=True)
+    return output.getvalue()
+
+
+def _strip_metadata(image: Image.Image, source_format: str) -> Tuple[bytes, str, str]:
+    """Re-save an image without EXIF, baking in its orientation
+
+    JPEGs without an orientation tag keep their quantization tables
+    (`quality="keep"`), so the pixels are re-encoded near-losslessly.
+    """
+    extension, content_type = ORIGINAL_FORMATS.get(source_format, (".jpg", "image/jpeg"))
+    output = io.BytesIO()
+    orientation = image.getexif().get(EXIF_ORIENTATION, 1)
+
+    if source_format == "JPEG":
+        if orientation == 1:
+            image.save(output, "JPEG", quality="keep", optimize=True)
+        else:
+            ImageOps.exif_transpose(image).save(output, "JPEG", quality=95, optimize=True)
+    elif source_format in ORIGINAL_FORMATS:
+        ImageOps.exif_transpose(image).save(output, source_format, optimize=True)
+    else:
+        _flatten(ImageOps.exif_transpose(image)).save(output, "JPEG", quality=95, optimize=True)
+
+    return output.getvalue(), extension, content_type
+
+
+def process_image(
+    content: bytes,
+    thumbnail_edge: int = 320,
+    web_edge: int = 1600,
+    web_quality: int = 82,
+    strip_exif: bool = True
+) -> Dict[str, Any]:
+    """Build thumbnail and web renditions of an image
+
+    Returns a dict with `width`, `height`, the EXIF-stripped `original`
+    (None when `strip_exif` is False) and `renditions`, each value an
+    (bytes, extension, content type) tuple. Renditions are always
+    orientation-corrected JPEGs without metadata.
+    """
+    with Image.open(io.BytesIO(content)) as image:
+        image.load()
+        source_format = image.format
+        upright = ImageOps.exif_transpose(image)
+
+        result = {
+            "width": upright.width,
+            "height": upright.height,
+            "original": _strip_metadata(image, source_format) if strip_exif else None,
+            "renditions": {
+                "thumb": (_jpeg(upright, thumbnail_edge, 70), ".jpg", "image/jpeg")
+            }
+        }
+
+        # Small images are served as-is; a web rendition would only add bytes
+        if max(upright.size) > web_edge or len(content) > 512 * 1024:
+            result["renditions"]["web"] = (_jpeg(upright, web_edge, web_quality), ".jpg", "image/jpeg")
+
+    return result
@@ -0,0 +1,49 @@
+"""orjson Response Class with Native BSON Types
+
+orjson serializes `datetime` natively and calls `_default` only for types
+it doesn't know (ObjectId, Decimal128, pydantic models), so route results
+can be rendered straight from Mongo documents. Returning a
+`BSONJSONResponse` from a route skips FastAPI's `jsonable_encoder` pass
+entirely, which dominates the cost of large message lists.
+
+Naive datetimes render without an offset, exactly like
+`datetime.isoformat()` does under the default encoder.
+"""
+from decimal import Decimal
+from typing import Any
+
+import orjson
+from bson import Decimal128, ObjectId
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, Decimal128):
+        # Strings keep full precision (jsonable_encoder would emit a float)
+        return str(value.to_decimal())
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if isinstance(value, bytes):
+        return value.decode()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """Serialize content (including BSON types) to JSON bytes"""
+    return orjson.dumps(content, default=_default, option=ORJSON_OPTIONS)
+
+
+class BSONJSONResponse(JSONResponse):
+    """JSON response rendered with orjson, understanding BSON types"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
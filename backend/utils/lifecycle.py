@@ -0,0 +1,201 @@
+"""Process Lifecycle: Fork Hooks and Startup Report
+
+With `preload_app` the application is imported once in the gunicorn
+master and forked into workers, so module import must only declare
+things. Anything holding sockets, threads or pools is created on first
+use in the process that uses it; its owner registers a reset with
+`@after_fork` so a copy inherited across a fork is dropped rather than
+shared. gunicorn.conf.py calls `run_after_fork()` from `post_fork`, and
+`os.register_at_fork` covers forks gunicorn doesn't make.
+
+`startup_report` times imports while the app loads (gunicorn.conf.py
+installs it before the preload) and, when the lifespan startup finishes,
+logs each worker's time-to-ready (preload import time plus fork to
+ready) against STARTUP_BUDGET_MS. Only the standard library is imported
+here, so it can be loaded before anything it measures.
+"""
+import importlib.abc
+import json
+import logging
+import os
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_after_fork_hooks: List[Callable[[], None]] = []
+_hooks_ran_in: Optional[int] = os.getpid()
+
+
+def after_fork(func: Callable[[], None]) -> Callable[[], None]:
+    """Register a function that resets per-process state in a forked child"""
+    _after_fork_hooks.append(func)
+    return func
+
+
+def run_after_fork() -> None:
+    """Reset per-process state inherited from the parent (once per process)"""
+    global _hooks_ran_in
+    if _hooks_ran_in == os.getpid():
+        return
+    _hooks_ran_in = os.getpid()
+    for hook in _after_fork_hooks:
+        try:
+            hook()
+        except Exception as e:
+            logger.warning(f"After-fork hook {hook.__qualname__} failed: {e}")
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=run_after_fork)
+
+
+class _TimedLoader(importlib.abc.Loader):
+    """Wraps a module's loader to time its execution"""
+
+    def __init__(self, loader, report: "StartupReport"):
+        self.loader = loader
+        self.report = report
+
+    def create_module(self, spec):
+        return self.loader.create_module(spec)
+
+    def exec_module(self, module):
+        self.report._enter()
+        start = time.perf_counter()
+        try:
+            self.loader.exec_module(module)
+        finally:
+            self.report._exit(module.__name__, time.perf_counter() - start)
+
+    def __getattr__(self, name):
+        return getattr(self.loader, name)
+
+
+class _TimingFinder(importlib.abc.MetaPathFinder):
+    """Meta path finder that delegates lookup and times module execution"""
+
+    def __init__(self, report: "StartupReport"):
+        self.report = report
+
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                    spec.loader = _TimedLoader(spec.loader, self.report)
+                return spec
+        return None
+
+
+class StartupReport:
+    """Import time breakdown and per-worker time-to-ready"""
+
+    def __init__(self, budget_ms: float, top: int = 15):
+        """
+        Args:
+            budget_ms: Time-to-ready budget; exceeding it logs a warning
+            top: Number of slowest imports to report
+        """
+        self.budget_ms = budget_ms
+        self.top = top
+        self.process_started = time.monotonic()
+        self.import_started: Optional[float] = None
+        self.import_ms: Optional[float] = None
+        self.forked_at: Optional[float] = None
+        self._finder: Optional[_TimingFinder] = None
+        # [cumulative seconds, child seconds] per module, and the stack of child totals
+        self._modules: Dict[str, List[float]] = {}
+        self._stack: List[float] = []
+
+    def start_imports(self) -> None:
+        """Start timing imports (call before the application is imported)"""
+        if self._finder is None:
+            self._finder = _TimingFinder(self)
+            sys.meta_path.insert(0, self._finder)
+            self.import_started = time.monotonic()
+
+    def stop_imports(self) -> None:
+        """Stop timing imports once the application is loaded"""
+        if self._finder is not None:
+            sys.meta_path.remove(self._finder)
+            self._finder = None
+            self.import_ms = (time.monotonic() - self.import_started) * 1000
+
+    def _enter(self) -> None:
+        self._stack.append(0.0)
+
+    def _exit(self, name: str, elapsed: float) -> None:
+        children = self._stack.pop()
+        self._modules[name] = [elapsed, children]
+        if self._stack:
+            self._stack[-1] += elapsed
+
+    def slowest_imports(self) -> List[Dict[str, Any]]:
+        """Slowest modules by self time (excluding the imports they triggered)"""
+        ranked = sorted(self._modules.items(), key=lambda item: item[1][0] - item[1][1], reverse=True)
+        return [{
+            "module": name,
+            "self_ms": round((total - children) * 1000, 1),
+            "cumulative_ms": round(total * 1000, 1)
+        } for name, (total, children) in ranked[:self.top]]
+
+    def by_package(self) -> Dict[str, float]:
+        """Self time per top-level package, in milliseconds"""
+        totals: Dict[str, float] = {}
+        for name, (total, children) in self._modules.items():
+            package = name.split(".")[0]
+            totals[package] = totals.get(package, 0.0) + (total - children) * 1000
+        return {k: round(v, 1) for k, v in sorted(totals.items(), key=lambda item: item[1], reverse=True)[:self.top]}
+
+    def mark_forked(self) -> None:
+        """Record when this worker was forked"""
+        self.forked_at = time.monotonic()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Import breakdown; with preload_app it was measured in the master"""
+        return {
+            "pid": os.getpid(),
+            "import_ms": round(self.import_ms, 1) if self.import_ms is not None else None,
+            "modules_imported": len(self._modules),
+            "slowest_imports": self.slowest_imports(),
+            "import_ms_by_package": self.by_package()
+        }
+
+    async def ready(self) -> None:
+        """Lifespan startup hook: log time-to-ready for this worker"""
+        from monitoring.metrics import worker_startup_seconds
+
+        now = time.monotonic()
+        preload_ms = self.import_ms or 0.0
+        if self._finder is not None:
+            # The app was imported in this process (no preload)
+            self.stop_imports()
+            preload_ms = 0.0
+
+        if self.forked_at is not None:
+            since_fork_ms = (now - self.forked_at) * 1000
+            total_ms = preload_ms + since_fork_ms
+        else:
+            since_fork_ms = None
+            total_ms = (now - self.process_started) * 1000
+
+        report = {
+            **self.snapshot(),
+            "fork_to_ready_ms": round(since_fork_ms, 1) if since_fork_ms is not None else None,
+            "time_to_ready_ms": round(total_ms, 1),
+            "budget_ms": self.budget_ms,
+            "within_budget": total_ms <= self.budget_ms
+        }
+        worker_startup_seconds.set(total_ms / 1000)
+        if total_ms > self.budget_ms:
+            logger.warning(f"Worker startup over budget: {json.dumps(report)}")
+        else:
+            logger.info(f"Worker startup: {json.dumps(report)}")
+
+
+startup_report = StartupReport(budget_ms=float(os.getenv("STARTUP_BUDGET_MS", 5000)))
+after_fork(startup_report.mark_forked)
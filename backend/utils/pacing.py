@@ -0,0 +1,53 @@
+"""Async Token Bucket Pacing
+
+Spaces outbound calls to a sustained rate with a bounded burst. Waiters
+are served in arrival order, so a backlog drains at the configured rate
+instead of in bursts that trip the upstream's throughput limit.
+"""
+import asyncio
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    """Rate limiter that delays callers instead of rejecting them"""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        """
+        Args:
+            rate: Tokens added per second (0: unlimited)
+            burst: Bucket capacity (defaults to one second's worth)
+        """
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def available(self) -> float:
+        """Tokens that could be taken right now"""
+        if not self.rate:
+            return float("inf")
+        self._refill()
+        return self.tokens
+
+    async def acquire(self, tokens: float = 1.0) -> float:
+        """Wait until `tokens` are available and take them; returns seconds waited"""
+        if not self.rate:
+            return 0.0
+
+        waited = 0.0
+        async with self._lock:
+            self._refill()
+            if self.tokens < tokens:
+                delay = (tokens - self.tokens) / self.rate
+                await asyncio.sleep(delay)
+                waited = delay
+                self._refill()
+            self.tokens -= tokens
+        return waited
@@ -0,0 +1,80 @@
+"""Phone Number Normalization
+
+Numbers reach us in two shapes. The Cloud API's `from`/`wa_id` (and
+everything stored from it) is always the full international number as
+bare digits, whatever the country, so it is taken as it arrives. Staff
+type numbers with spaces, dashes, a leading +, 00 or a trunk 0, or as a
+national number without a country code; only those are completed with
+DEFAULT_COUNTRY_CODE, and only when they are clearly national.
+
+A conversation's key is the E.164 number without the "+", which is the
+form WhatsApp uses for `wa_id`, so keys equal the `other_party` that
+inbound messages have always stored.
+"""
+import os
+import re
+
+DEFAULT_COUNTRY_CODE = os.getenv("DEFAULT_COUNTRY_CODE", "91")
+
+# Length of a national number in the default country (10 in India)
+NATIONAL_NUMBER_LENGTH = int(os.getenv("DEFAULT_NATIONAL_NUMBER_LENGTH", 10))
+
+E164_MAX_DIGITS = 15
+E164_MIN_DIGITS = 8
+
+_SEPARATORS = re.compile(r"[\s\-().]")
+
+
+class InvalidPhoneNumber(ValueError):
+    """Raised when a value cannot be read as a phone number"""
+
+
+def is_national(value: str) -> bool:
+    """Whether a staff-entered number is written in national format
+
+    A trunk 0, or bare digits of exactly the default country's national
+    length. A 10-digit foreign number must be typed with + or 00.
+    """
+    raw = _SEPARATORS.sub("", value or "")
+    if raw.startswith(("+", "00")):
+        return False
+    return raw.startswith("0") or len(raw) == NATIONAL_NUMBER_LENGTH
+
+
+def normalize_phone(value: str, default_country_code: str = DEFAULT_COUNTRY_CODE) -> str:
+    """E.164 form of a staff-entered number, e.g. "+919876543210"
+
+    Args:
+        value: Number as entered
+        default_country_code: Country code for numbers in national format
+    """
+    raw = _SEPARATORS.sub("", value or "")
+    if raw.startswith("+"):
+        digits = raw[1:]
+    elif raw.startswith("00"):
+        digits = raw[2:]
+    elif is_national(raw):
+        digits = default_country_code + raw.lstrip("0")
+    else:
+        digits = raw
+
+    if not digits.isdigit() or not E164_MIN_DIGITS <= len(digits) <= E164_MAX_DIGITS:
+        raise InvalidPhoneNumber(f"Invalid phone number: {value!r}")
+    return f"+{digits}"
+
+
+def conversation_key(value: str) -> str:
+    """Conversation key for a number that is already international
+
+    For wa_ids and stored numbers: separators, a leading + or 00 are
+    dropped and no country code is ever added. Values that don't parse
+    (legacy rows, test fixtures) fall back to their bare digits, so a key
+    can always be computed.
+    """
+    raw = _SEPARATORS.sub("", value or "")
+    if raw.startswith("00"):
+        raw = raw[2:]
+    digits = raw.lstrip("+")
+    if digits.isdigit():
+        return digits
+    return re.sub(r"\D", "", raw) or (value or "")
@@ -0,0 +1,242 @@
+"""Outbound Request Scheduler per Upstream
+
+Every call to an upstream API (Microsoft Graph, each WhatsApp business
+number) goes through that upstream's policy:
+
+- a concurrency cap per worker, queueing callers beyond it
+- token-bucket pacing to the upstream's share of a rate budget
+- Retry-After from a 429/503 pauses all of this worker's calls to it
+- jittered exponential retries on 429, 5xx and transport errors, for
+  idempotent methods only (429 is always safe to retry: nothing ran)
+- a circuit breaker that fails fast with UpstreamUnavailable while the
+  upstream keeps failing, instead of stacking up timeouts
+
+Callers get the final response back and interpret its status as before.
+"""
+import asyncio
+import logging
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+import httpx
+
+from monitoring.metrics import (
+    upstream_queue_depth,
+    upstream_inflight,
+    upstream_requests_total,
+    upstream_retries_total,
+    upstream_wait_seconds,
+    upstream_circuit_state,
+)
+from utils.circuit_breaker import CircuitBreaker, STATE_VALUES
+from utils.lifecycle import after_fork
+from utils.pacing import TokenBucket
+from utils.worker_sizing import worker_processes
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class UpstreamUnavailable(Exception):
+    """Raised without calling when an upstream's circuit is open"""
+
+    def __init__(self, upstream: str, retry_after: float):
+        """
+        Args:
+            upstream: Upstream name
+            retry_after: Seconds until the breaker allows a trial call
+        """
+        super().__init__(f"{upstream} is unavailable (circuit open, retry in {retry_after:.0f}s)")
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds from a Retry-After header (delta-seconds or HTTP date)"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+class Upstream:
+    """Scheduling policy and state for one upstream in this worker"""
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrency: int = 16,
+        rate: float = 0,
+        max_retries: int = 3,
+        base_backoff: float = 0.5,
+        max_backoff: float = 30.0,
+        max_retry_after: float = 120.0,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0
+    ):
+        """
+        Args:
+            name: Upstream name, used in logs and metrics
+            max_concurrency: In-flight calls per worker
+            rate: Calls per second for the whole container (0: unpaced)
+            max_retries: Retries after the first attempt
+            base_backoff: Seconds before the first retry
+            max_backoff: Upper bound on the delay between retries
+            max_retry_after: Longest Retry-After waited out in-line; longer ones return the response
+            failure_threshold: Consecutive failures before the circuit opens
+            reset_timeout: Seconds the circuit stays open before a trial call
+        """
+        self.name = name
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.max_retry_after = max_retry_after
+        self.pacer = TokenBucket(rate / worker_processes())
+        self.breaker = CircuitBreaker(name, failure_threshold=failure_threshold, reset_timeout=reset_timeout)
+        self.paused_until = 0.0
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._waiting = 0
+
+    async def request(
+        self,
+        client: httpx.AsyncClient,
+        method: str,
+        url: str,
+        idempotent: Optional[bool] = None,
+        retries: Optional[int] = None,
+        paced: bool = True,
+        **kwargs
+    ) -> httpx.Response:
+        """Send a request under this upstream's policy
+
+        Args:
+            client: HTTP client (pool) to send with
+            method: HTTP method
+            url: Request URL
+            idempotent: Whether a 5xx or transport error may be retried (default: by method)
+            retries: Override max_retries for this call (0: caller retries)
+            paced: Whether the call spends the rate budget (concurrency still applies)
+            **kwargs: Passed to httpx
+        """
+        method = method.upper()
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        retries = self.max_retries if retries is None else retries
+
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                upstream_requests_total.labels(upstream=self.name, outcome="rejected").inc()
+                self._export_state()
+                raise UpstreamUnavailable(self.name, self.breaker.retry_after())
+
+            try:
+                response = await self._send(client, method, url, paced, **kwargs)
+            except httpx.TransportError as e:
+                self.breaker.record_failure()
+                self._export_state()
+                upstream_requests_total.labels(upstream=self.name, outcome="error").inc()
+                # A connection that was never made sent nothing, so any method may retry
+                safe = idempotent or isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout))
+                if not safe or attempt >= retries:
+                    raise
+                await self._backoff(attempt, f"{type(e).__name__}")
+                attempt += 1
+                continue
+            except BaseException:
+                # Cancelled, or failed without an answer from the upstream: no
+                # outcome to record, but a half-open trial must not stay taken
+                self.breaker.release_trial()
+                self._export_state()
+                raise
+
+            status = response.status_code
+            if status not in RETRY_STATUSES:
+                self.breaker.record_success()
+                self._export_state()
+                upstream_requests_total.labels(upstream=self.name, outcome="ok").inc()
+                return response
+
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            if status == 429:
+                # Throttled, but up: it answered, so the circuit stays closed
+                self.breaker.record_success()
+                upstream_requests_total.labels(upstream=self.name, outcome="throttled").inc()
+            else:
+                self.breaker.record_failure()
+                upstream_requests_total.labels(upstream=self.name, outcome="error").inc()
+            self._export_state()
+
+            if retry_after:
+                self.paused_until = max(self.paused_until, time.monotonic() + min(retry_after, self.max_retry_after))
+
+            retryable = status == 429 or idempotent
+            if not retryable or attempt >= retries or (retry_after or 0) > self.max_retry_after:
+                return response
+            await response.aclose()
+            await self._backoff(attempt, str(status), retry_after)
+            attempt += 1
+
+    async def _send(self, client: httpx.AsyncClient, method: str, url: str, paced: bool, **kwargs) -> httpx.Response:
+        started = time.monotonic()
+        self._waiting += 1
+        upstream_queue_depth.labels(upstream=self.name).set(self._waiting)
+        try:
+            await self._slots.acquire()
+        finally:
+            self._waiting -= 1
+            upstream_queue_depth.labels(upstream=self.name).set(self._waiting)
+
+        try:
+            pause = self.paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+            if paced:
+                await self.pacer.acquire()
+            upstream_wait_seconds.labels(upstream=self.name).observe(time.monotonic() - started)
+
+            upstream_inflight.labels(upstream=self.name).inc()
+            try:
+                return await client.request(method, url, **kwargs)
+            finally:
+                upstream_inflight.labels(upstream=self.name).dec()
+        finally:
+            self._slots.release()
+
+    async def _backoff(self, attempt: int, reason: str, retry_after: Optional[float] = None) -> None:
+        # Full jitter, floored by any Retry-After
+        ceiling = min(self.max_backoff, self.base_backoff * 2 ** attempt)
+        delay = max(random.uniform(0, ceiling), retry_after or 0)
+        upstream_retries_total.labels(upstream=self.name, reason=reason).inc()
+        logger.info(f"Retrying {self.name} call in {delay:.2f}s after {reason}")
+        await asyncio.sleep(delay)
+
+    def _export_state(self) -> None:
+        upstream_circuit_state.labels(upstream=self.name).set(STATE_VALUES[self.breaker.state])
+
+
+_upstreams: Dict[str, Upstream] = {}
+
+
+def get_upstream(name: str, **policy) -> Upstream:
+    """This process's scheduler for an upstream, created with `policy` on first use"""
+    upstream = _upstreams.get(name)
+    if upstream is None:
+        upstream = _upstreams[name] = Upstream(name, **policy)
+    return upstream
+
+
+@after_fork
+def _forget_upstreams() -> None:
+    # Semaphores and pacing belong to the parent's event loop
+    _upstreams.clear()
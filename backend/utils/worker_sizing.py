@@ -0,0 +1,150 @@
+"""Worker and Connection Pool Sizing from the Container's Resources
+
+UvicornWorker runs an event loop per process, so one worker per CPU of
+quota is enough; the sync-worker rule (2 x cores + 1) oversubscribes
+cores and multiplies every per-worker pool and cache. The CPU quota is
+read from the cgroup (v2 `cpu.max`, v1 `cpu.cfs_quota_us`) because
+`os.cpu_count()` reports the host's cores inside a container.
+
+Connection budgets are totals for the whole container; each worker's
+MongoDB and outbound HTTP pools get an equal share. The MongoDB budget
+is split between the default and analytics read profiles.
+
+Only the standard library is imported: gunicorn.conf.py uses this
+before the application is loaded.
+"""
+import math
+import os
+from typing import Any, Dict, Optional
+
+CGROUP_ROOT = "/sys/fs/cgroup"
+
+# cgroup v1 reports "unlimited" memory as a huge page-aligned number
+UNLIMITED_MEMORY = 1 << 60
+
+
+def _read(path: str) -> Optional[str]:
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def cpu_quota(cgroup_root: str = CGROUP_ROOT) -> float:
+    """CPUs this process may use: cgroup quota, else affinity, else cpu_count"""
+    quota = None
+
+    cpu_max = _read(os.path.join(cgroup_root, "cpu.max"))
+    if cpu_max:
+        limit, _, period = cpu_max.partition(" ")
+        if limit != "max" and period:
+            quota = int(limit) / int(period)
+    else:
+        limit = _read(os.path.join(cgroup_root, "cpu", "cpu.cfs_quota_us"))
+        period = _read(os.path.join(cgroup_root, "cpu", "cpu.cfs_period_us"))
+        if limit and period and int(limit) > 0:
+            quota = int(limit) / int(period)
+
+    try:
+        available = len(os.sched_getaffinity(0))
+    except AttributeError:
+        available = os.cpu_count() or 1
+
+    return min(quota, available) if quota else float(available)
+
+
+def memory_limit(cgroup_root: str = CGROUP_ROOT) -> Optional[int]:
+    """Container memory limit in bytes, or None when unlimited"""
+    value = _read(os.path.join(cgroup_root, "memory.max"))
+    if value is None:
+        value = _read(os.path.join(cgroup_root, "memory", "memory.limit_in_bytes"))
+    if not value or value == "max":
+        return None
+    limit = int(value)
+    return limit if limit < UNLIMITED_MEMORY else None
+
+
+def plan_workers(
+    cpus: float,
+    memory_bytes: Optional[int],
+    workers_per_cpu: float = 1.0,
+    max_workers: int = 16,
+    worker_memory_mb: int = 512,
+    mongo_connection_budget: int = 100,
+    analytics_share: float = 0.2,
+    http_connection_budget: int = 200,
+    workers: Optional[int] = None
+) -> Dict[str, Any]:
+    """Worker count and per-worker pool sizes
+
+    Args:
+        cpus: CPU quota
+        memory_bytes: Memory limit (None when unlimited)
+        workers_per_cpu: Workers per CPU of quota
+        max_workers: Upper bound on workers
+        worker_memory_mb: Expected steady-state RSS per worker, to fit the memory limit
+        mongo_connection_budget: MongoDB connections for all workers together
+        analytics_share: Fraction of each worker's MongoDB connections for analytics reads
+        http_connection_budget: Outbound HTTP connections for all workers together
+        workers: Fixed worker count (skips CPU and memory sizing)
+    """
+    reason = "fixed"
+    if workers is None:
+        workers = max(1, math.ceil(cpus * workers_per_cpu))
+        reason = "cpu"
+        if memory_bytes:
+            # Leave room for the master and for workers being replaced
+            fits = int(memory_bytes * 0.8 // (worker_memory_mb * 1024 * 1024))
+            if fits < workers:
+                workers, reason = max(1, fits), "memory"
+        if workers > max_workers:
+            workers, reason = max_workers, "max_workers"
+
+    mongo_per_worker = max(2, mongo_connection_budget // workers)
+    analytics_pool = max(1, int(mongo_per_worker * analytics_share))
+    default_pool = max(1, mongo_per_worker - analytics_pool)
+
+    return {
+        "workers": workers,
+        "limited_by": reason,
+        "cpu_quota": round(cpus, 2),
+        "memory_limit_bytes": memory_bytes,
+        "mongo_max_pool_size": default_pool,
+        "mongo_min_pool_size": min(default_pool, max(1, default_pool // 5)),
+        "mongo_analytics_max_pool_size": analytics_pool,
+        "http_max_connections": max(4, http_connection_budget // workers)
+    }
+
+
+def plan_from_env() -> Dict[str, Any]:
+    """Plan for this container from GUNICORN_* and *_CONNECTION_BUDGET settings"""
+    fixed = os.getenv("GUNICORN_WORKERS", "auto")
+    return plan_workers(
+        cpus=cpu_quota(),
+        memory_bytes=memory_limit(),
+        workers_per_cpu=float(os.getenv("GUNICORN_WORKERS_PER_CPU", 1)),
+        max_workers=int(os.getenv("GUNICORN_MAX_WORKERS", 16)),
+        worker_memory_mb=int(os.getenv("GUNICORN_WORKER_MEMORY_MB", 512)),
+        mongo_connection_budget=int(os.getenv("MONGODB_CONNECTION_BUDGET", 100)),
+        analytics_share=float(os.getenv("MONGODB_ANALYTICS_POOL_SHARE", 0.2)),
+        http_connection_budget=int(os.getenv("HTTP_CONNECTION_BUDGET", 200)),
+        workers=None if fixed == "auto" else int(fixed)
+    )
+
+
+def apply_pool_sizes(plan: Dict[str, Any]) -> None:
+    """Export per-worker pool sizes to the environment read by the app
+
+    Pool sizes set explicitly in the environment win over the plan.
+    """
+    os.environ.setdefault("MONGODB_MAX_POOL_SIZE", str(plan["mongo_max_pool_size"]))
+    os.environ.setdefault("MONGODB_MIN_POOL_SIZE", str(plan["mongo_min_pool_size"]))
+    os.environ.setdefault("MONGODB_ANALYTICS_MAX_POOL_SIZE", str(plan["mongo_analytics_max_pool_size"]))
+    os.environ.setdefault("HTTP_MAX_CONNECTIONS", str(plan["http_max_connections"]))
+    os.environ.setdefault("WORKER_PROCESSES", str(plan["workers"]))
+
+
+def worker_processes() -> int:
+    """Workers sharing this container's rate budgets (1 outside gunicorn)"""
+    return max(1, int(os.getenv("WORKER_PROCESSES", 1)))
@@ -0,0 +1,56 @@
+"""Background Job Runner
+
+Runs the queued and periodic jobs in services/background_jobs.py in a
+process of its own, so media downloads, renditions, SharePoint uploads
+and archival never compete with API requests on the gunicorn workers:
+
+    python worker.py
+
+Run as many replicas as the job backlog needs, independently of the web
+tier, and set JOB_RUNNER_ENABLED=true on the web tier so it hands that
+work over. SIGTERM (or SIGINT) drains: no new jobs are claimed, running
+ones get JOB_DRAIN_TIMEOUT seconds to finish, and anything still running
+after that is picked up again once its lease expires. Prometheus metrics
+are served on JOB_RUNNER_METRICS_PORT.
+"""
+import asyncio
+import logging
+import os
+import signal
+
+from prometheus_client import start_http_server
+
+from database.connection import Database
+from services import background_jobs  # noqa: F401 (registers the job types)
+from services.jobs import job_queue
+from services.media_processor import media_processor
+from utils.http_client import close_http_client
+from utils.logging_config import setup_logging
+
+logger = logging.getLogger("worker")
+
+
+async def main() -> None:
+    """Run jobs until SIGTERM/SIGINT, then drain and shut down"""
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stopping.set)
+
+    await Database.connect_db()
+    await job_queue.start()
+    try:
+        await stopping.wait()
+        logger.info("Job runner draining")
+    finally:
+        await job_queue.stop()
+        await media_processor.stop()
+        await close_http_client()
+        await Database.close_db()
+    logger.info("Job runner stopped")
+
+
+if __name__ == "__main__":
+    setup_logging()
+    start_http_server(int(os.getenv("JOB_RUNNER_METRICS_PORT", 9101)))
+    asyncio.run(main())